@@ -0,0 +1,5 @@
+"""
+Database backups: `dump` writes them, `jobs` runs them off the request
+thread and applies retention. See BackupDatabaseAPIView and
+`manage.py backup_database`.
+"""
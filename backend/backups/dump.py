@@ -0,0 +1,338 @@
+"""
+Logical backups. Every table is streamed in primary key order, a page at a
+time, as JSON lines (one array per row) through gzip or zstd straight into
+storage. A manifest with each table's columns, row count and sha256 is
+written last, so a backup without one is incomplete.
+
+An incremental backup chains onto the previous backup of the latest full
+one. Tables with an updatedAt column only get the rows past the previous
+high-water mark id or updated since the previous backup started; append-only
+tables only get the rows past the mark. Both also list their current ids
+as ranges, so a restore can drop deleted rows. Derived tables are left to
+their rebuild commands, and all other tables are small enough to copy whole.
+
+On MySQL, tables are dumped by several connections at once. Each one starts
+a consistent snapshot while FLUSH TABLES WITH READ LOCK holds writes off,
+so they all read the database as of the same instant.
+"""
+import gzip
+import hashlib
+import io
+import json
+import queue
+import threading
+from datetime import datetime, timedelta
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.utils import timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PAGE_SIZE = 5000
+MANIFEST = 'manifest.json'
+EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+# How long workers get to open their snapshots while writes are held off
+SNAPSHOT_TIMEOUT = 60
+
+# How an incremental backup copies each table; tables not listed are copied whole
+FULL, CHANGES, REBUILD = 'full', 'changes', 'rebuild'
+APPEND_ONLY = [
+    'item.StockMovement', 'item.StockSnapshot', 'order.ExchangeRateHistory',
+    'order.Receipt', 'order.Receipt_orders', 'admin.LogEntry',
+]
+DERIVED = {
+    'customer.CustomerSearchToken': 'rebuild_search_index',
+    'user.UserSearchToken': 'rebuild_search_index',
+    'order.DailySales': 'rebuild_daily_sales',
+}
+# Rows written by transactions that were still open when the previous
+# backup started have older updatedAt values or ids than it saw; copying
+# a little before its marks catches them, and copying a row twice is harmless
+SINCE_MARGIN = timedelta(minutes=10)
+ID_MARGIN = 1000
+
+
+class BackupError(Exception):
+    pass
+
+
+def check_compression(compression):
+    if compression not in EXTENSIONS:
+        raise BackupError(f"Unknown compression {compression}, use one of {', '.join(EXTENSIONS)}")
+    if compression == 'zstd' and zstandard is None:
+        raise BackupError("zstd compression needs the zstandard package")
+
+
+def compressed_writer(raw, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+    return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+
+
+def compressed_reader(raw, compression):
+    """A buffered reader, so the rows can be read line by line."""
+    if compression == 'zstd':
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=False))
+    return gzip.GzipFile(fileobj=raw, mode='rb')
+
+
+# str() keeps dates as 'YYYY-MM-DD HH:MM:SS', which every backend reads back
+_encoder = json.JSONEncoder(default=str, ensure_ascii=False, separators=(',', ':'))
+
+
+def encode_rows(rows):
+    return ''.join(_encoder.encode(row) + '\n' for row in rows).encode()
+
+
+def read_pages(cursor, connection, table, key, where='', params=()):
+    """
+    Yields (columns, rows) pages of the rows of `table` matching `where`,
+    walking the primary key `key` when there is one.
+    """
+    quote = connection.ops.quote_name
+    select = f"SELECT * FROM {quote(table)}"
+    if key is None:
+        cursor.execute(f"{select} WHERE {where}" if where else select, params)
+        columns = [column[0] for column in cursor.description]
+        while rows := cursor.fetchmany(PAGE_SIZE):
+            yield columns, rows
+        return
+
+    after = None
+    while True:
+        conditions = [f"({where})"] if where else []
+        if after is not None:
+            conditions.append(f"{quote(key)} > %s")
+        filters = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        cursor.execute(
+            f"{select}{filters} ORDER BY {quote(key)} LIMIT %s",
+            [*params, *([] if after is None else [after]), PAGE_SIZE],
+        )
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield columns, rows
+        after = rows[-1][columns.index(key)]
+
+
+def pk_ranges(cursor, connection, table, key):
+    """The ids of `table` as [first, last] runs of consecutive ids, computed by the database."""
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f"SELECT MIN(k), MAX(k) FROM ("
+        f"SELECT {quote(key)} AS k, {quote(key)} - ROW_NUMBER() OVER (ORDER BY {quote(key)}) AS run "
+        f"FROM {quote(table)}) AS numbered GROUP BY run ORDER BY 1"
+    )
+    return [[first, last] for first, last in cursor.fetchall()]
+
+
+def dump_table(connection, storage, prefix, table, compression, changes=None):
+    """
+    Streams `table` into storage under `prefix`; returns its manifest entry.
+    `changes` is (updatedAt column or None, since, high-water id) to only
+    copy the rows changed since a previous backup.
+    """
+    file = f"{table}.jsonl.{EXTENSIONS[compression]}"
+    digest, count, columns, last = hashlib.sha256(), 0, None, None
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        primary_key = connection.introspection.get_primary_key_columns(cursor, table) or []
+        key = primary_key[0] if len(primary_key) == 1 else None
+
+        selections = [('', [])]
+        if changes is not None:
+            updated, since, high_water = changes
+            # Two ranges the indexes can walk, in id order, rather than an OR over the whole table
+            selections = [(f"{quote(key)} > %s", [high_water])]
+            if updated is not None:
+                since = connection.ops.adapt_datetimefield_value(since)
+                selections.insert(0, (f"{quote(updated)} >= %s AND {quote(key)} <= %s", [since, high_water]))
+
+        with storage.open(prefix + file, 'wb') as raw, compressed_writer(raw, compression) as out:
+            for where, params in selections:
+                for columns, rows in read_pages(cursor, connection, table, key, where, params):
+                    chunk = encode_rows(rows)
+                    digest.update(chunk)
+                    out.write(chunk)
+                    count += len(rows)
+                    if key is not None:
+                        last = rows[-1][columns.index(key)]
+        if columns is None:
+            # Empty tables still need their columns for a restore to check against
+            cursor.execute(f"SELECT * FROM {quote(table)} WHERE 1 = 0")
+            columns = [column[0] for column in cursor.description]
+
+        entry = {
+            'mode': FULL,
+            'file': file,
+            'columns': columns,
+            'primaryKey': key,
+            'rows': count,
+            'sha256': digest.hexdigest(),
+            'maxPk': last,
+            'totalRows': count,
+        }
+        if changes is not None:
+            ranges = pk_ranges(cursor, connection, table, key)
+            entry.update({
+                'mode': CHANGES,
+                'pkRanges': ranges,
+                'maxPk': ranges[-1][1] if ranges else None,
+                'totalRows': sum(high - low + 1 for low, high in ranges),
+            })
+    return entry
+
+
+def incremental_plan(parent):
+    """
+    {table: (updatedAt column or None, since, high-water id)} for the tables
+    copied by change, and {table: rebuild command} for the derived ones,
+    relative to the `parent` backup's manifest.
+    """
+    since = datetime.fromisoformat(parent['startedAt']) - SINCE_MARGIN
+    changes, rebuilds = {}, {}
+    for model in apps.get_models(include_auto_created=True):
+        table, label = model._meta.db_table, model._meta.label
+        if label in DERIVED:
+            rebuilds[table] = DERIVED[label]
+            continue
+        previous = parent['tables'].get(table)
+        fields = {field.name: field for field in model._meta.concrete_fields}
+        if previous is None or previous.get('mode') == REBUILD or previous['primaryKey'] is None:
+            continue
+        high_water = previous['maxPk'] or 0
+        if 'updatedAt' in fields:
+            changes[table] = (fields['updatedAt'].column, since, high_water)
+        elif label in APPEND_ONLY:
+            changes[table] = (None, since, max(high_water - ID_MARGIN, 0))
+    return changes, rebuilds
+
+
+def read_manifest(storage, prefix):
+    with storage.open(prefix + MANIFEST) as file:
+        return json.load(file)
+
+
+def start_snapshot(connection):
+    """Pin what `connection` reads to this instant, inside an atomic block."""
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+    # Elsewhere the atomic block's transaction already reads one snapshot
+
+
+def table_sizes(connection):
+    """Estimated rows per table, to start on the biggest ones first."""
+    if connection.vendor != 'mysql':
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+        )
+        return {name: rows or 0 for name, rows in cursor.fetchall()}
+
+
+def dump_parallel(connection, tables, workers, dump):
+    """
+    Runs `dump(connection, table)` for every table on `workers` connections
+    reading one snapshot. Returns ({table: result}, whether the snapshots
+    are provably the same, which needs the RELOAD privilege).
+    """
+    pending = queue.Queue()
+    sizes = table_sizes(connection)
+    for table in sorted(tables, key=lambda table: -sizes.get(table, 0)):
+        pending.put(table)
+    results, errors = {}, []
+    ready = threading.Barrier(workers + 1)
+
+    def work():
+        own = connections[connection.alias]
+        try:
+            with transaction.atomic(using=connection.alias):
+                start_snapshot(own)
+                ready.wait()
+                while not errors:
+                    try:
+                        table = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    results[table] = dump(own, table)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as error:
+            errors.append(error)
+            ready.abort()
+        finally:
+            own.close()
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("FLUSH TABLES WITH READ LOCK")
+            consistent = True
+        except DatabaseError:
+            consistent = False
+        threads = [threading.Thread(target=work, name=f'backup-dump-{n}', daemon=True) for n in range(workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            ready.wait(timeout=SNAPSHOT_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            if consistent:
+                cursor.execute("UNLOCK TABLES")
+
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    if len(results) != len(tables):
+        raise BackupError("Dump workers could not open their snapshots in time")
+    return results, consistent
+
+
+def dump_database(storage, prefix, compression='gzip', workers=1, using=DEFAULT_DB_ALIAS, parent=None):
+    """
+    Writes every table of the `using` database under `prefix`, then the
+    manifest, which is returned. With `parent`, the (name, manifest) of the
+    previous backup in a chain, only what changed since is written.
+    """
+    check_compression(compression)
+    connection = connections[using]
+    started = timezone.now()
+    tables = connection.introspection.table_names()
+    changes, rebuilds = incremental_plan(parent[1]) if parent else ({}, {})
+
+    def dump(own, table):
+        if table in rebuilds:
+            return {'mode': REBUILD, 'command': rebuilds[table]}
+        return dump_table(own, storage, prefix, table, compression, changes.get(table))
+
+    if connection.vendor == 'mysql' and workers > 1:
+        entries, consistent = dump_parallel(connection, tables, workers, dump)
+    else:
+        # One connection, so one snapshot; SQLite cannot share one across connections anyway
+        with transaction.atomic(using=using):
+            start_snapshot(connection)
+            entries = {table: dump(connection, table) for table in tables}
+        consistent = True
+
+    manifest = {
+        'kind': 'incremental' if parent else 'full',
+        # Every backup of a chain, oldest first, ending with this one, is needed to restore it
+        'chain': [*parent[1].get('chain', [parent[0]]), prefix] if parent else [prefix],
+        'vendor': connection.vendor,
+        'startedAt': started.isoformat(),
+        'finishedAt': timezone.now().isoformat(),
+        'compression': compression,
+        'consistent': consistent,
+        'tables': {table: entries[table] for table in tables},
+    }
+    with storage.open(prefix + MANIFEST, 'wb') as out:
+        out.write(json.dumps(manifest, indent=1, default=str).encode())
+    return manifest
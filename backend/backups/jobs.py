@@ -0,0 +1,122 @@
+"""
+Backup runs. Each one is a BackupDate row, created as running and updated
+when the dump ends, so the backup view can report on a run while a
+background thread does the work. Incremental runs chain onto the latest
+backup of the latest full one.
+"""
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from helpers.storage import storage_for
+from order.models import BackupDate
+from .dump import dump_database, read_manifest
+
+PREFIX = 'db_backups/'
+# A run still marked running after this long died with its worker
+STALE_AFTER = timedelta(hours=6)
+
+
+class BackupInProgress(Exception):
+    pass
+
+
+def backup_storage():
+    return storage_for(settings.BACKUP_STORAGE_DIR)
+
+
+def create_run(kind=BackupDate.FULL):
+    """A new running BackupDate, unless another run is still going."""
+    now = timezone.now()
+    with transaction.atomic():
+        BackupDate.objects.filter(status=BackupDate.RUNNING, created_at__lt=now - STALE_AFTER).update(
+            status=BackupDate.FAILED, finished_at=now, message="Interrupted before it finished"
+        )
+        running = BackupDate.objects.select_for_update().filter(status=BackupDate.RUNNING).first()
+        if running is not None:
+            raise BackupInProgress(f"Backup {running.pk} is still running")
+        return BackupDate.objects.create(status=BackupDate.RUNNING, kind=kind)
+
+
+def start_backup(kind=BackupDate.FULL):
+    """Create a run and start it in a background thread; returns the run to poll."""
+    run = create_run(kind)
+    thread = threading.Thread(target=_run_in_background, args=(run.pk,), name=f'backup-{run.pk}', daemon=True)
+    # The thread reads the run on its own connection, so only once it is committed
+    transaction.on_commit(thread.start)
+    return run
+
+
+def _run_in_background(run_id):
+    try:
+        run_backup(BackupDate.objects.get(pk=run_id))
+    finally:
+        connections.close_all()
+
+
+def chain_end():
+    """The latest successful backup chained onto the latest full one, None without a full one."""
+    successful = BackupDate.objects.filter(status=BackupDate.SUCCESS).exclude(name='')
+    base = successful.filter(kind=BackupDate.FULL).order_by('-created_at').first()
+    if base is None:
+        return None
+    return successful.filter(Q(pk=base.pk) | Q(base=base)).order_by('-created_at').first()
+
+
+def run_backup(run):
+    """Dump the database for `run`, record how it went and apply retention."""
+    storage = backup_storage()
+    # The id keeps runs started within the same second apart
+    run.name = f"{PREFIX}{timezone.localtime(run.created_at):%Y%m%d_%H%M%S}_{run.pk}/"
+    notes, parent = [], None
+    try:
+        if run.kind == BackupDate.INCREMENTAL:
+            previous = chain_end()
+            if previous is None:
+                run.kind = BackupDate.FULL
+                notes.append("There was no full backup to chain onto, so this one is full")
+            else:
+                run.base = previous.base or previous
+                parent = (previous.name, read_manifest(storage, previous.name))
+        manifest = dump_database(
+            storage, run.name, compression=settings.BACKUP_COMPRESSION, workers=settings.BACKUP_WORKERS,
+            parent=parent,
+        )
+    except Exception as error:
+        storage.delete(file.name for file in storage.list(run.name))
+        run.status, run.message = BackupDate.FAILED, str(error) or error.__class__.__name__
+    else:
+        run.status = BackupDate.SUCCESS
+        run.size = sum(file.size for file in storage.list(run.name))
+        if not manifest['consistent']:
+            notes.append("Tables were read from separate snapshots; FLUSH TABLES WITH READ LOCK needs the RELOAD privilege")
+        run.message = '. '.join(notes)
+    run.finished_at = timezone.now()
+    run.save()
+
+    if run.status == BackupDate.SUCCESS:
+        apply_retention(storage)
+    return run
+
+
+def apply_retention(storage, now=None):
+    """
+    Delete full backups beyond the newest BACKUP_KEEP_COUNT or older than
+    BACKUP_MAX_AGE_DAYS, with the incremental ones chained onto them. The
+    newest full backup is always kept.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=settings.BACKUP_MAX_AGE_DAYS)
+    successful = BackupDate.objects.filter(status=BackupDate.SUCCESS).exclude(name='')
+    fulls = successful.filter(kind=BackupDate.FULL).order_by('-created_at')
+    expired = [
+        backup for position, backup in enumerate(fulls)
+        if position > 0 and (position >= settings.BACKUP_KEEP_COUNT or backup.created_at < cutoff)
+    ]
+    expired += successful.filter(base__in=expired)
+    for backup in expired:
+        storage.delete(file.name for file in storage.list(backup.name))
+        backup.status = BackupDate.EXPIRED
+        backup.save(update_fields=['status'])
+    return expired
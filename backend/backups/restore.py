@@ -0,0 +1,294 @@
+"""
+Restores a backup chain (a full backup and the incremental ones after it)
+into a scratch database, then checks the result against the manifests.
+
+The schema comes from migrate. Secondary indexes are dropped before the
+load and rebuilt once every row is in, and foreign key checks are off
+meanwhile, so each table is a run of bulk inserts. Tables are loaded in
+parallel on MySQL. Every file's rows are hashed as they are read and must
+match its manifest entry. After the load, each table is checked as well:
+- tables whose last copy was whole are dumped again and must hash to the same
+  sha256
+- tables replayed from incremental backups must have the same ids, as
+  [first, last] ranges, and the same row count
+Foreign keys are checked across all tables.
+"""
+import hashlib
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management import call_command
+from django.db import connections, transaction
+from .dump import (
+    CHANGES, FULL, MANIFEST, PAGE_SIZE, REBUILD, compressed_reader, encode_rows, pk_ranges, read_manifest, read_pages,
+)
+
+# The scratch database keeps the migration records of its own schema
+SKIPPED_TABLES = {'django_migrations'}
+# Ids deleted per query when replaying an incremental backup
+DELETE_BATCH = 500
+
+
+class RestoreError(Exception):
+    pass
+
+
+def latest_backup(storage, prefix):
+    """The name of the newest backup under `prefix` with a manifest, None if there is none."""
+    names = [file.name[:-len(MANIFEST)] for file in storage.list(prefix) if file.name.endswith('/' + MANIFEST)]
+    return max(names, default=None)
+
+
+def load_chain(storage, name):
+    """[(prefix, manifest)] of every backup needed to restore `name`, oldest first."""
+    manifest = read_manifest(storage, name)
+    chain = manifest.get('chain', [name])
+    return [(prefix, manifest if prefix == name else read_manifest(storage, prefix)) for prefix in chain]
+
+
+def plan_tables(chain):
+    """
+    {table: [(prefix, compression, entry)]} to replay per table, starting
+    at its last whole copy, and {table: command} for the tables to rebuild.
+    """
+    steps, rebuilds = {}, {}
+    for prefix, manifest in chain:
+        for table, entry in manifest['tables'].items():
+            if table in SKIPPED_TABLES:
+                continue
+            mode = entry.get('mode', FULL)
+            if mode == REBUILD:
+                rebuilds[table] = entry['command']
+            elif mode == FULL:
+                steps[table] = [(prefix, manifest['compression'], entry)]
+            elif table in steps:
+                steps[table].append((prefix, manifest['compression'], entry))
+            else:
+                raise RestoreError(f"{prefix} has changes to {table}, but no earlier backup has all of it")
+    for table in rebuilds:
+        steps.pop(table, None)
+    return steps, rebuilds
+
+
+def read_rows(storage, prefix, compression, entry):
+    """Yields pages of the rows of an entry's file, then checks them against the entry."""
+    digest, count, page = hashlib.sha256(), 0, []
+    with storage.open(prefix + entry['file']) as raw, compressed_reader(raw, compression) as lines:
+        for line in lines:
+            digest.update(line)
+            page.append(json.loads(line))
+            if len(page) == PAGE_SIZE:
+                count += len(page)
+                yield page
+                page = []
+    if page:
+        count += len(page)
+        yield page
+    if count != entry['rows'] or digest.hexdigest() != entry['sha256']:
+        raise RestoreError(f"{prefix}{entry['file']} does not match its manifest")
+
+
+def deferred_indexes(connection, table):
+    """{name: constraint} of the indexes of `table` that can be built after the load."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    foreign_key_columns = {
+        constraint['columns'][0] for constraint in constraints.values() if constraint['foreign_key']
+    }
+    indexes = {}
+    for name, constraint in constraints.items():
+        if not constraint['index'] or constraint['primary_key'] or constraint['foreign_key']:
+            continue
+        if connection.vendor == 'mysql' and constraint['columns'][0] in foreign_key_columns:
+            # InnoDB will not drop the index a foreign key relies on
+            continue
+        indexes[name] = constraint
+    return indexes
+
+
+def create_index_sql(connection, table, name, constraint):
+    quote = connection.ops.quote_name
+    orders = constraint.get('orders') or [''] * len(constraint['columns'])
+    columns = ', '.join(f"{quote(column)} {order}".strip() for column, order in zip(constraint['columns'], orders))
+    unique = 'UNIQUE ' if constraint['unique'] else ''
+    return f"CREATE {unique}INDEX {quote(name)} ON {quote(table)} ({columns})"
+
+
+def delete_outside(cursor, connection, table, key, ranges):
+    """Delete the rows whose id is in none of `ranges`, i.e. deleted since the previous backup."""
+    quote = connection.ops.quote_name
+    if not ranges:
+        cursor.execute(f"DELETE FROM {quote(table)}")
+        return
+    gaps = [(f"{quote(key)} < %s", [ranges[0][0]]), (f"{quote(key)} > %s", [ranges[-1][1]])]
+    gaps += [
+        (f"({quote(key)} > %s AND {quote(key)} < %s)", [previous[1], following[0]])
+        for previous, following in zip(ranges, ranges[1:])
+    ]
+    for start in range(0, len(gaps), DELETE_BATCH):
+        batch = gaps[start:start + DELETE_BATCH]
+        cursor.execute(
+            f"DELETE FROM {quote(table)} WHERE {' OR '.join(condition for condition, _ in batch)}",
+            [param for _, params in batch for param in params],
+        )
+
+
+def replay(connection, storage, table, steps):
+    """Load `table` from its steps; returns the rows inserted."""
+    quote = connection.ops.quote_name
+    inserted = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {quote(table)}")
+        for prefix, compression, entry in steps:
+            columns, key = entry['columns'], entry['primaryKey']
+            insert = (
+                f"INSERT INTO {quote(table)} ({', '.join(quote(column) for column in columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))})"
+            )
+            if entry.get('mode') == CHANGES:
+                delete_outside(cursor, connection, table, key, entry['pkRanges'])
+            for rows in read_rows(storage, prefix, compression, entry):
+                with transaction.atomic(using=connection.alias):
+                    if entry.get('mode') == CHANGES:
+                        # Changed rows replace their previous version
+                        ids = [row[columns.index(key)] for row in rows]
+                        for start in range(0, len(ids), DELETE_BATCH):
+                            batch = ids[start:start + DELETE_BATCH]
+                            cursor.execute(
+                                f"DELETE FROM {quote(table)} WHERE {quote(key)} IN ({', '.join(['%s'] * len(batch))})",
+                                batch,
+                            )
+                    cursor.executemany(insert, rows)
+                inserted += len(rows)
+    return inserted
+
+
+def verify(connection, table, entry):
+    """Compare the restored `table` with the manifest entry of its last step; returns what was checked."""
+    key = entry['primaryKey']
+    with connection.cursor() as cursor:
+        if entry.get('mode') == CHANGES:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            count = cursor.fetchone()[0]
+            if count != entry['totalRows'] or pk_ranges(cursor, connection, table, key) != entry['pkRanges']:
+                raise RestoreError(f"{table} has {count} rows or different ids than its manifest")
+            return 'ids'
+
+        digest, count = hashlib.sha256(), 0
+        for _, rows in read_pages(cursor, connection, table, key):
+            digest.update(encode_rows(rows))
+            count += len(rows)
+        if count != entry['rows']:
+            raise RestoreError(f"{table} has {count} rows, its manifest {entry['rows']}")
+        if key is None:
+            # Without a key the rows come back in any order, so only their count can match
+            return 'rows'
+        if digest.hexdigest() != entry['sha256']:
+            raise RestoreError(f"{table} does not hash to the sha256 of its manifest")
+        return 'sha256'
+
+
+class Restore:
+    """
+    Restores the chain ending at `name` into the `using` database. run()
+    returns a report with the seconds each phase and table took; the
+    recovery time is everything but the verification.
+    """
+
+    def __init__(self, storage, name, using, workers=1, log=None):
+        self.storage, self.name, self.using = storage, name, using
+        self.workers = workers if connections[using].vendor == 'mysql' else 1
+        self.log = log or (lambda message: None)
+        self.report = {'backup': name, 'phases': {}, 'tables': {}}
+
+    def phase(self, name, work):
+        self.log(f"{name}...")
+        start = time.perf_counter()
+        result = work()
+        self.report['phases'][name] = round(time.perf_counter() - start, 2)
+        return result
+
+    def each_table(self, tables, work):
+        """Run `work(connection, table)` for every table on `workers` connections with checks deferred."""
+        def run(table):
+            connection = connections[self.using]
+            start = time.perf_counter()
+            result = work(connection, table)
+            return table, result, time.perf_counter() - start
+
+        def run_in_thread(table):
+            try:
+                connection = connections[self.using]
+                connection.disable_constraint_checking()
+                return run(table)
+            finally:
+                connections[self.using].close()
+
+        if self.workers == 1:
+            return [run(table) for table in tables]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(run_in_thread, tables))
+
+    def run(self):
+        started = time.perf_counter()
+        chain = self.phase('read manifests', lambda: load_chain(self.storage, self.name))
+        steps, rebuilds = plan_tables(chain)
+        connection = connections[self.using]
+
+        def prepare():
+            call_command('migrate', database=self.using, interactive=False, verbosity=0)
+            existing = set(connection.introspection.table_names())
+            missing = (set(steps) | set(rebuilds)) - existing
+            if missing:
+                raise RestoreError(f"The scratch database has no table {', '.join(sorted(missing))}")
+            with connection.cursor() as cursor:
+                for table, table_steps in steps.items():
+                    columns = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+                    unknown = {column for _, _, entry in table_steps for column in entry['columns']} - columns
+                    if unknown:
+                        raise RestoreError(f"{table} has no column {', '.join(sorted(unknown))}; is the code older than the backup?")
+            indexes = {table: deferred_indexes(connection, table) for table in steps}
+            drop = connection.SchemaEditorClass.sql_delete_index
+            with connection.cursor() as cursor:
+                for table, constraints in indexes.items():
+                    for name in constraints:
+                        cursor.execute(drop % {
+                            'table': connection.ops.quote_name(table), 'name': connection.ops.quote_name(name),
+                        })
+            return indexes
+        indexes = self.phase('prepare schema', prepare)
+
+        # Biggest first, so the last worker to finish is not stuck with a big table
+        order = sorted(steps, key=lambda table: -sum(entry['rows'] for _, _, entry in steps[table]))
+        connection.disable_constraint_checking()
+        try:
+            loaded = self.phase(
+                'load', lambda: self.each_table(order, lambda own, table: replay(own, self.storage, table, steps[table]))
+            )
+            for table, rows, seconds in loaded:
+                self.report['tables'][table] = {'rows': rows, 'load': round(seconds, 2)}
+
+            for command in sorted(set(rebuilds.values())):
+                self.phase(
+                    f"rebuild ({command})", lambda: call_command(command, database=self.using, stdout=io.StringIO())
+                )
+
+            def build_indexes(own, table):
+                with own.cursor() as cursor:
+                    for name, constraint in indexes[table].items():
+                        cursor.execute(create_index_sql(own, table, name, constraint))
+            for table, _, seconds in self.phase('indexes', lambda: self.each_table(order, build_indexes)):
+                self.report['tables'][table]['indexes'] = round(seconds, 2)
+        finally:
+            connection.enable_constraint_checking()
+        self.report['recoverySeconds'] = round(time.perf_counter() - started, 2)
+
+        checked = self.phase(
+            'verify', lambda: self.each_table(order, lambda own, table: verify(own, table, steps[table][-1][2]))
+        )
+        for table, check, _ in checked:
+            self.report['tables'][table]['verified'] = check
+        self.phase('foreign keys', lambda: connection.check_constraints(table_names=order))
+        self.report['rebuilt'] = sorted(rebuilds)
+        return self.report
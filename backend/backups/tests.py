@@ -0,0 +1,278 @@
+import gzip
+import hashlib
+import json
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITransactionTestCase
+from helpers.storage import LocalStorage
+from helpers.tests import BaseTestCase
+from customer.models import Customer
+from order.models import BackupDate, Order
+from user.models import User
+from .dump import CHANGES, FULL, MANIFEST, REBUILD, read_manifest
+from .jobs import PREFIX, apply_retention, create_run, run_backup
+from .restore import RestoreError, plan_tables
+
+
+class BackupTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            USE_GCS=False, BACKUP_STORAGE_DIR=self.directory.name, BACKUP_COMPRESSION='gzip',
+            BACKUP_WORKERS=1, BACKUP_KEEP_COUNT=3, BACKUP_MAX_AGE_DAYS=30,
+        )
+        self.settings_override.enable()
+        self.storage = LocalStorage(self.directory.name)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.directory.cleanup()
+        super().tearDown()
+
+
+class BackupTests(BackupTestMixin, BaseTestCase):
+    def read_table(self, run, manifest, table):
+        entry = manifest['tables'][table]
+        with self.storage.open(run.name + entry['file']) as raw, gzip.GzipFile(fileobj=raw) as lines:
+            return entry, lines.read()
+
+    def test_backup_streams_every_table_with_a_manifest(self):
+        Order.objects.create(
+            customer=self.customer, user=self.admin_user, item=self.item, quantity=2,
+            address=self.address, liraRate=89500, driver=self.driver,
+        )
+        run = run_backup(create_run())
+
+        self.assertEqual(run.status, BackupDate.SUCCESS, run.message)
+        self.assertTrue(run.name.startswith(PREFIX))
+        self.assertGreater(run.size, 0)
+        with self.storage.open(run.name + MANIFEST) as file:
+            manifest = json.load(file)
+        self.assertTrue(manifest['consistent'])
+
+        entry, data = self.read_table(run, manifest, Order._meta.db_table)
+        rows = [json.loads(line) for line in data.splitlines()]
+        self.assertEqual(entry['rows'], Order.objects.count())
+        self.assertEqual(len(rows), entry['rows'])
+        self.assertEqual(entry['sha256'], hashlib.sha256(data).hexdigest())
+        self.assertEqual(entry['maxPk'], Order.objects.order_by('-id').first().id)
+        self.assertEqual([row[entry['columns'].index('id')] for row in rows], sorted(Order.objects.values_list('id', flat=True)))
+
+        entry, data = self.read_table(run, manifest, 'order_receipt')
+        self.assertEqual((entry['rows'], data), (0, b''))
+        self.assertIn('fingerprint', entry['columns'])
+
+    def test_incremental_backup_copies_only_what_changed(self):
+        orders = [self.order] + [
+            Order.objects.create(
+                customer=self.customer, user=self.admin_user, item=self.item, quantity=1,
+                address=self.address, liraRate=89500, driver=self.driver,
+            )
+            for _ in range(3)
+        ]
+        # As if all of it predated the full backup by a while
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        for model in (Order, Customer):
+            model.objects.update(updatedAt=an_hour_ago)
+        full = run_backup(create_run())
+
+        self.customer.nickName = 'Jo'
+        self.customer.save()
+        orders[1].delete()
+        new_order = Order.objects.create(
+            customer=self.customer, user=self.admin_user, item=self.item, quantity=4,
+            address=self.address, liraRate=89500, driver=self.driver,
+        )
+        incremental = run_backup(create_run(BackupDate.INCREMENTAL))
+
+        self.assertEqual((incremental.status, incremental.kind), (BackupDate.SUCCESS, BackupDate.INCREMENTAL))
+        self.assertEqual(incremental.base, full)
+        manifest = read_manifest(self.storage, incremental.name)
+        self.assertEqual(manifest['chain'], [full.name, incremental.name])
+
+        entry, data = self.read_table(incremental, manifest, Order._meta.db_table)
+        self.assertEqual(entry['mode'], CHANGES)
+        self.assertEqual([json.loads(line)[entry['columns'].index('id')] for line in data.splitlines()], [new_order.id])
+        self.assertEqual(entry['totalRows'], Order.objects.count())
+        self.assertEqual(entry['pkRanges'], [[orders[0].id, orders[0].id], [orders[2].id, new_order.id]])
+
+        entry, data = self.read_table(incremental, manifest, Customer._meta.db_table)
+        self.assertEqual(entry['rows'], 1)
+        self.assertIn('"Jo"', data.decode())
+        self.assertEqual(manifest['tables']['order_dailysales'], {'mode': REBUILD, 'command': 'rebuild_daily_sales'})
+
+        # The next one chains onto this one
+        again = run_backup(create_run(BackupDate.INCREMENTAL))
+        self.assertEqual(read_manifest(self.storage, again.name)['chain'], [full.name, incremental.name, again.name])
+
+    def test_incremental_backup_without_a_full_one_is_full(self):
+        run = run_backup(create_run(BackupDate.INCREMENTAL))
+        self.assertEqual((run.status, run.kind), (BackupDate.SUCCESS, BackupDate.FULL))
+        self.assertTrue(run.message)
+
+    def test_failed_backup_is_recorded_and_cleaned_up(self):
+        with override_settings(BACKUP_COMPRESSION='lz4'):
+            run = run_backup(create_run())
+
+        self.assertEqual(run.status, BackupDate.FAILED)
+        self.assertIn('lz4', run.message)
+        self.assertEqual(list(self.storage.list(PREFIX)), [])
+
+    def test_retention_keeps_the_newest_by_count_and_age(self):
+        now = timezone.now()
+        ages = [0, 1, 2, 3, 40]
+        backups = []
+        for age in ages:
+            backup = BackupDate.objects.create(name=f"{PREFIX}{age}/")
+            BackupDate.objects.filter(pk=backup.pk).update(created_at=now - timedelta(days=age))
+            with self.storage.open(f"{backup.name}{MANIFEST}", 'wb') as file:
+                file.write(b'{}')
+            backups.append(backup)
+
+        expired = apply_retention(self.storage, now)
+
+        self.assertEqual({backup.pk for backup in expired}, {backups[3].pk, backups[4].pk})
+        self.assertEqual({file.name for file in self.storage.list(PREFIX)},
+                         {f"{PREFIX}{age}/{MANIFEST}" for age in ages[:3]})
+        self.assertEqual(BackupDate.objects.filter(status=BackupDate.EXPIRED).count(), 2)
+
+        # Incremental backups go with the full one they chain onto
+        chained = BackupDate.objects.create(name=f"{PREFIX}chained/", kind=BackupDate.INCREMENTAL, base=backups[2])
+        BackupDate.objects.filter(pk=backups[2].pk).update(created_at=now - timedelta(days=35))
+        self.assertEqual({backup.pk for backup in apply_retention(self.storage, now)}, {backups[2].pk, chained.pk})
+
+        # Even an old backup is kept while it is the only one
+        BackupDate.objects.filter(pk__in=[backup.pk for backup in backups[:2]]).update(status=BackupDate.FAILED)
+        BackupDate.objects.filter(pk=backups[4].pk).update(status=BackupDate.SUCCESS)
+        self.assertEqual(apply_retention(self.storage, now), [])
+
+    def test_only_one_backup_runs_at_a_time(self):
+        running = BackupDate.objects.create(status=BackupDate.RUNNING)
+        response = self.client.post(reverse('backup'), **self.auth_header)
+        self.assertEqual(response.status_code, 409)
+
+        # Unless the running one is long dead
+        BackupDate.objects.filter(pk=running.pk).update(created_at=timezone.now() - timedelta(days=1))
+        run = create_run()
+        running.refresh_from_db()
+        self.assertEqual(running.status, BackupDate.FAILED)
+        self.assertEqual(run.status, BackupDate.RUNNING)
+
+
+class BackupViewTests(BackupTestMixin, APITransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user(username='admin', password='adminpass', is_staff=True, is_superuser=True)
+        response = self.client.post(reverse('login'), {'username': 'admin', 'password': 'adminpass'}, format='json')
+        self.auth_header = {'HTTP_AUTHORIZATION': f"Bearer {response.data['access']}"}
+
+    def test_backup_runs_in_the_background_and_can_be_polled(self):
+        response = self.client.post(reverse('backup'), **self.auth_header)
+        self.assertEqual(response.status_code, 202)
+        run_id = response.data['backup']['id']
+
+        deadline = time.monotonic() + 30
+        while True:
+            response = self.client.get(reverse('backup'), {'id': run_id}, **self.auth_header)
+            if response.data['backup']['status'] != BackupDate.RUNNING or time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(response.data['backup']['status'], BackupDate.SUCCESS, response.data['backup']['message'])
+        response = self.client.get(reverse('backup'), **self.auth_header)
+        self.assertEqual(response.data['last_run']['id'], run_id)
+        self.assertIsNotNone(response.data['latest_backup'])
+
+
+class RestorePlanTests(SimpleTestCase):
+    def test_tables_replay_from_their_last_whole_copy(self):
+        full = {'compression': 'gzip', 'tables': {
+            'order_order': {'mode': FULL, 'rows': 10},
+            'order_dailysales': {'mode': FULL, 'rows': 3},
+            'django_migrations': {'mode': FULL, 'rows': 40},
+        }}
+        first = {'compression': 'gzip', 'tables': {
+            'order_order': {'mode': CHANGES, 'rows': 2},
+            'order_dailysales': {'mode': REBUILD, 'command': 'rebuild_daily_sales'},
+        }}
+        second = {'compression': 'zstd', 'tables': {'order_order': {'mode': FULL, 'rows': 12}}}
+
+        steps, rebuilds = plan_tables([('full/', full), ('first/', first)])
+        self.assertEqual([(prefix, entry['rows']) for prefix, _, entry in steps['order_order']], [('full/', 10), ('first/', 2)])
+        self.assertEqual(rebuilds, {'order_dailysales': 'rebuild_daily_sales'})
+        self.assertNotIn('order_dailysales', steps)
+        self.assertNotIn('django_migrations', steps)
+
+        steps, _ = plan_tables([('full/', full), ('first/', first), ('second/', second)])
+        self.assertEqual(steps['order_order'], [('second/', 'zstd', second['tables']['order_order'])])
+
+        with self.assertRaises(RestoreError):
+            plan_tables([('first/', first)])
+
+
+@skipUnless('restore' in settings.DATABASES, "needs a 'restore' scratch database alias")
+class RestoreTests(BackupTestMixin, BaseTestCase):
+    databases = {'default', 'restore'} & set(settings.DATABASES)
+
+    def order_rows(self, using):
+        return list(Order.objects.using(using).order_by('id').values_list('id', 'quantity', 'driverNotes', 'isActive'))
+
+    def test_full_and_incremental_backups_restore_to_the_same_rows(self):
+        Order.objects.update(updatedAt=timezone.now() - timedelta(hours=1))
+        run_backup(create_run())
+        self.order.driverNotes = 'Second floor'
+        self.order.save()
+        Order.objects.create(
+            customer=self.customer, user=self.admin_user, item=self.item, quantity=4,
+            address=self.address, liraRate=89500, driver=self.driver,
+        )
+        incremental = run_backup(create_run(BackupDate.INCREMENTAL))
+        report_path = f"{self.directory.name}/report.json"
+
+        output = StringIO()
+        call_command('restore_backup', '--report', report_path, stdout=output)
+
+        self.assertIn(f"Restored and verified {incremental.name}", output.getvalue())
+        self.assertEqual(self.order_rows('restore'), self.order_rows('default'))
+        self.assertEqual(
+            list(Customer.objects.using('restore').values_list('firstName', flat=True)), ['John']
+        )
+        with open(report_path) as file:
+            report = json.load(file)
+        self.assertEqual(report['tables'][Order._meta.db_table]['verified'], 'ids')
+        self.assertEqual(report['tables']['item_source']['verified'], 'sha256')
+        self.assertIn('order_dailysales', report['rebuilt'])
+        self.assertIn('load', report['phases'])
+
+    def test_a_tampered_backup_fails_verification(self):
+        run = run_backup(create_run())
+        file = run.name + read_manifest(self.storage, run.name)['tables']['item_item']['file']
+        with self.storage.open(file) as raw:
+            lines = gzip.decompress(raw.read()).splitlines(keepends=True)
+        with self.storage.open(file, 'wb') as raw:
+            raw.write(gzip.compress(b''.join(lines[:-1])))
+
+        # Rolled back, as a failed restore leaves the scratch database half loaded
+        with self.assertRaisesMessage(CommandError, 'does not match its manifest'), transaction.atomic(using='restore'):
+            call_command('restore_backup', run.name, stdout=StringIO())
+
+    def test_never_restores_over_the_primary(self):
+        with self.assertRaisesMessage(CommandError, 'primary'):
+            call_command('restore_backup', '--database', 'default', stdout=StringIO())
+
+    def test_never_restores_into_a_database_shared_with_another_alias(self):
+        # Such as a replica: the primary's database on another host
+        with patch.dict(settings.DATABASES['restore'], NAME=settings.DATABASES['default']['NAME'], HOST='replica'):
+            with self.assertRaisesMessage(CommandError, 'is also the database of default'):
+                call_command('restore_backup', stdout=StringIO())
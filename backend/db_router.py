@@ -0,0 +1,68 @@
+"""
+Primary/replica routing. Heavy read-only paths opt in with
+`.using(read_alias())`; everything else, and every write, uses the primary.
+
+Once a request writes, it is pinned to the primary, and so are that
+client's requests for the next PIN_SECONDS, so nobody reads a replica that
+has not caught up with their own write yet.
+"""
+import contextvars
+from django.conf import settings
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+PIN_COOKIE = 'pin_primary'
+PIN_SECONDS = 5
+
+_pinned = contextvars.ContextVar('pinned_to_primary', default=False)
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def read_alias():
+    """The database a read-only path should query."""
+    if REPLICA in settings.DATABASES and not is_pinned():
+        return REPLICA
+    return PRIMARY
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Related objects are read from wherever their parent came from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db and not is_pinned():
+            return instance._state.db
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class PrimaryPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned_by_cookie = PIN_COOKIE in request.COOKIES
+        token = _pinned.set(pinned_by_cookie)
+        try:
+            response = self.get_response(request)
+            if is_pinned() and not pinned_by_cookie:
+                response.set_cookie(PIN_COOKIE, '1', max_age=PIN_SECONDS, httponly=True, samesite='Lax')
+            return response
+        finally:
+            _pinned.reset(token)
@@ -0,0 +1,115 @@
+"""
+MySQL backend that keeps connections in a per-process pool instead of
+opening one per request. Configure it with ENGINE 'backend.mysql_pool' and
+an optional POOL dict next to OPTIONS:
+
+    'POOL': {'MAX_SIZE': 10, 'MAX_IDLE': 300, 'TIMEOUT': 10}
+
+Django still "closes" the connection at the end of every request
+(CONN_MAX_AGE stays 0); closing hands it back to the pool.
+"""
+import os
+import threading
+from django.db.backends.mysql import base as mysql
+from .pool import ConnectionPool
+
+Database = mysql.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_stats():
+    """Metrics of this process's pools, by database alias."""
+    return {alias: pool.stats() for alias, pool in _pools.items()}
+
+
+def is_healthy(connection):
+    try:
+        connection.ping()
+    except Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(mysql.DatabaseWrapper):
+    def get_pool(self, conn_params):
+        with _pools_lock:
+            pool = _pools.get(self.alias)
+            if pool is not None and pool.pid == os.getpid() and pool.params != conn_params:
+                # The alias now points at another server, database or user: never reuse the old sockets
+                pool.close_all()
+                pool = None
+            # A forked worker must not share its parent's sockets
+            if pool is None or pool.pid != os.getpid():
+                options = self.settings_dict.get('POOL') or {}
+                pool = ConnectionPool(
+                    connect=lambda: mysql.DatabaseWrapper.get_new_connection(self, conn_params),
+                    is_healthy=is_healthy,
+                    max_size=options.get('MAX_SIZE', 10),
+                    max_idle=options.get('MAX_IDLE', 300),
+                    timeout=options.get('TIMEOUT', 10),
+                )
+                pool.params = conn_params
+                _pools[self.alias] = pool
+            return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        connection = pool.checkout()
+        # Checked back in to the pool it came from, which may since have been replaced
+        connection.pool = pool
+        return connection
+
+    def init_connection_state(self):
+        # Session settings survive on a pooled connection, only set them once
+        if getattr(self.connection, 'pool_initialized', False):
+            return
+        super().init_connection_state()
+        self.connection.pool_initialized = True
+
+    def disable_constraint_checking(self):
+        # foreign_key_checks is a session variable, which init_connection_state
+        # does not reset on a pooled connection
+        disabled = super().disable_constraint_checking()
+        self.connection.session_altered = True
+        return disabled
+
+    def enable_constraint_checking(self):
+        super().enable_constraint_checking()
+        self.connection.session_altered = False
+
+    def _set_autocommit(self, autocommit):
+        # Reading the flag is local; only a change needs a round trip
+        if self.connection.get_autocommit() != autocommit:
+            super()._set_autocommit(autocommit)
+
+    def _close(self):
+        connection = self.connection
+        if connection is None:
+            return
+        pool = getattr(connection, 'pool', None)
+
+        if pool is None or pool.pid != os.getpid():
+            return super()._close()
+        if pool is not _pools.get(self.alias) or getattr(connection, 'session_altered', False):
+            # From a pool replaced since, or with session settings the next user would inherit
+            pool.discard(connection)
+            return
+        if self.in_atomic_block:
+            # Django keeps a connection closed mid-transaction around: never share it
+            pool.discard(connection)
+            return
+
+        try:
+            if not connection.get_autocommit():
+                connection.rollback()
+                connection.autocommit(self.settings_dict['AUTOCOMMIT'])
+        except Database.Error:
+            pool.discard(connection)
+            return
+
+        if self.errors_occurred and not is_healthy(connection):
+            pool.discard(connection)
+            return
+        pool.checkin(connection)
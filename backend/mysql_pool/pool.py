@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of raw DB-API connections for one process.
+
+    `connect` opens a new connection and `is_healthy` checks one before it is
+    handed out. Connections idle for longer than `max_idle` seconds are closed
+    rather than reused, so the server's wait_timeout never hits a pooled one.
+    """
+
+    def __init__(self, connect, is_healthy, max_size=10, max_idle=300, timeout=10):
+        self.connect = connect
+        self.is_healthy = is_healthy
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.pid = os.getpid()
+
+        self.idle = deque()
+        self.size = 0
+        self.condition = threading.Condition()
+        self.metrics = {
+            'checkouts': 0, 'waits': 0, 'wait_time': 0.0, 'timeouts': 0,
+            'created': 0, 'evicted': 0, 'unhealthy': 0, 'discarded': 0,
+        }
+
+    def checkout(self):
+        """Return a healthy connection, opening one if the pool is not full."""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        while True:
+            with self.condition:
+                self.evict_idle()
+                if self.idle:
+                    # Most recently used first, the least likely to be stale
+                    connection, _ = self.idle.pop()
+                elif self.size < self.max_size:
+                    self.size += 1
+                    connection = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics['timeouts'] += 1
+                        raise PoolTimeout(f"No database connection free after {self.timeout}s")
+                    if not waited:
+                        waited = True
+                        self.metrics['waits'] += 1
+                    started = time.monotonic()
+                    self.condition.wait(remaining)
+                    self.metrics['wait_time'] += time.monotonic() - started
+                    continue
+
+            # Network round trips happen outside the lock
+            if connection is None:
+                try:
+                    connection = self.connect()
+                except Exception:
+                    self.release_slot()
+                    raise
+                self.count('created')
+            elif not self.is_healthy(connection):
+                self.count('unhealthy')
+                self.discard(connection)
+                continue
+
+            self.count('checkouts')
+            return connection
+
+    def checkin(self, connection):
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, connection):
+        """Close a connection that must not be reused and free its slot."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self.count('discarded')
+        self.release_slot()
+
+    def evict_idle(self):
+        # Called with the lock held; the oldest connections sit at the left
+        now = time.monotonic()
+        while self.idle and now - self.idle[0][1] > self.max_idle:
+            connection, _ = self.idle.popleft()
+            try:
+                connection.close()
+            except Exception:
+                pass
+            self.size -= 1
+            self.metrics['evicted'] += 1
+
+    def release_slot(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def count(self, metric):
+        with self.condition:
+            self.metrics[metric] += 1
+
+    def stats(self):
+        with self.condition:
+            return {
+                **self.metrics,
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'max_size': self.max_size,
+            }
+
+    def close_all(self):
+        with self.condition:
+            while self.idle:
+                connection, _ = self.idle.pop()
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+                self.size -= 1
@@ -0,0 +1,69 @@
+import threading
+import time
+from django.test import SimpleTestCase
+from .pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            connection = FakeConnection()
+            self.opened.append(connection)
+            return connection
+
+        return ConnectionPool(connect, lambda connection: connection.healthy, **kwargs)
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool()
+        for _ in range(5):
+            pool.checkin(pool.checkout())
+
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['checkouts'], 5)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_pool_is_bounded_and_waits_for_a_free_connection(self):
+        pool = self.make_pool(max_size=2, timeout=2)
+        first, second = pool.checkout(), pool.checkout()
+
+        threading.Timer(0.05, pool.checkin, [first]).start()
+        self.assertIs(pool.checkout(), first)
+        self.assertEqual(pool.stats()['waits'], 1)
+
+        pool.timeout = 0.05
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()['size'], 2)
+
+    def test_unhealthy_connections_are_replaced(self):
+        pool = self.make_pool()
+        connection = pool.checkout()
+        pool.checkin(connection)
+        connection.healthy = False
+
+        replacement = pool.checkout()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['unhealthy'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_idle_connections_are_evicted(self):
+        pool = self.make_pool(max_idle=0.01)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        time.sleep(0.02)
+
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['evicted'], 1)
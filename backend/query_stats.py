@@ -0,0 +1,257 @@
+"""
+Per-request SQL instrumentation.
+
+QueryStatsMiddleware times every statement a request runs, on every
+database alias, and reports the totals in a Server-Timing header. A
+statement shape (fingerprint) repeated within one request is the N+1
+signal. The GraphQL view also returns the numbers in `extensions.sql`.
+
+Each worker aggregates the requests it served per endpoint and minute and
+merges them into the shared cache every FLUSH_SECONDS, one key per minute.
+offenders() sums the minutes of the last WINDOW_SECONDS, so the report is a
+sliding window: a request drops out of it an hour after it was served.
+"""
+import contextvars
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.core.cache import cache
+from django.db import connections
+
+SLOWEST_KEPT = 5
+DUPLICATES_KEPT = 5
+TOP_N = 20
+WINDOW_SECONDS = 60 * 60
+BUCKET_SECONDS = 60
+# Endpoints kept per minute; a minute rarely sees more
+BUCKET_KEPT = 200
+FLUSH_SECONDS = 10
+REPORT_KEY = 'query-stats:offenders'
+
+_current = contextvars.ContextVar('query_profile', default=None)
+
+_PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """`sql` with IN lists of any length collapsed, so batched loads of different sizes match."""
+    return _WHITESPACE.sub(' ', _PLACEHOLDER_LIST.sub('%s, ...', sql)).strip()
+
+
+def current_profile():
+    """The QueryProfile of the request being served, if any."""
+    return _current.get()
+
+
+class QueryProfile:
+    """Counts, times and fingerprints the statements of one request."""
+
+    def __init__(self):
+        self.label = None
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(context['connection'].alias, sql, time.perf_counter() - start)
+
+    def add(self, alias, sql, duration):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(sql)] += 1
+        # Statements are kept with their placeholders, never their parameters
+        entry = (duration, self.count, alias, sql)
+        if len(self._slowest) < SLOWEST_KEPT:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+    def duplicates(self):
+        """Statement shapes run more than once, most repeated first."""
+        return [
+            {'fingerprint': sql, 'count': count}
+            for sql, count in self.fingerprints.most_common(DUPLICATES_KEPT)
+            if count > 1
+        ]
+
+    def slowest(self):
+        return [
+            {'ms': round(duration * 1000, 2), 'alias': alias, 'sql': sql}
+            for duration, _, alias, sql in sorted(self._slowest, reverse=True)
+        ]
+
+    def summary(self, detailed=False):
+        summary = {
+            'queries': self.count,
+            'ms': self.duration_ms,
+            'duplicated': sum(count - 1 for count in self.fingerprints.values()),
+        }
+        if detailed:
+            summary['duplicates'] = self.duplicates()
+            summary['slowest'] = self.slowest()
+        return summary
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.duration_ms};desc="{self.count} queries", '
+            f'db-dup;desc="{self.summary()["duplicated"]} duplicated"'
+        )
+
+
+def bucket_of(timestamp):
+    return int(timestamp // BUCKET_SECONDS)
+
+
+def bucket_key(bucket):
+    return f'{REPORT_KEY}:{bucket}'
+
+
+def window_keys(now=None):
+    """Cache keys of the minutes within the last WINDOW_SECONDS."""
+    current = bucket_of(now or time.time())
+    return [bucket_key(bucket) for bucket in range(current - WINDOW_SECONDS // BUCKET_SECONDS + 1, current + 1)]
+
+
+class OffenderStats:
+    """Per-endpoint, per-minute totals of one worker, merged into the shared report periodically."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushed_at = time.monotonic()
+
+    def record(self, label, profile):
+        now = time.time()
+        with self.lock:
+            entry = self.pending.setdefault((bucket_of(now), label), new_entry(label))
+            add_request(entry, profile, now)
+            due = time.monotonic() - self.flushed_at >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return
+
+        by_bucket = {}
+        for (bucket, label), entry in pending.items():
+            by_bucket.setdefault(bucket, {})[label] = entry
+        keys = {bucket: bucket_key(bucket) for bucket in by_bucket}
+        # Concurrent flushes from other workers may be lost, so the report is approximate
+        reports = cache.get_many(keys.values())
+        for bucket, entries in by_bucket.items():
+            report = reports.get(keys[bucket]) or {}
+            for label, entry in entries.items():
+                report[label] = merge_entries(report.get(label), entry)
+            # A minute is read for WINDOW_SECONDS after it ends at most
+            cache.set(keys[bucket], top(report, BUCKET_KEPT), WINDOW_SECONDS + BUCKET_SECONDS)
+
+    def clear(self):
+        with self.lock:
+            self.pending = {}
+        cache.delete_many(window_keys())
+
+
+def new_entry(label):
+    return {
+        'endpoint': label, 'requests': 0, 'queries': 0, 'ms': 0.0, 'maxQueries': 0,
+        'lastSeen': 0, 'worst': None,
+    }
+
+
+def add_request(entry, profile, now):
+    entry['requests'] += 1
+    entry['queries'] += profile.count
+    entry['ms'] = round(entry['ms'] + profile.duration_ms, 2)
+    entry['lastSeen'] = now
+    if profile.count >= entry['maxQueries']:
+        entry['maxQueries'] = profile.count
+        entry['worst'] = profile.summary(detailed=True)
+
+
+def merge_entries(old, new):
+    if old is None:
+        return new
+    merged = dict(old)
+    for field in ('requests', 'queries'):
+        merged[field] += new[field]
+    merged['ms'] = round(old['ms'] + new['ms'], 2)
+    merged['lastSeen'] = max(old['lastSeen'], new['lastSeen'])
+    if new['maxQueries'] >= old['maxQueries']:
+        merged['maxQueries'] = new['maxQueries']
+        merged['worst'] = new['worst']
+    return merged
+
+
+def top(report, count):
+    """The `count` endpoints of `report` with the most database time."""
+    costliest = sorted(report.values(), key=lambda entry: entry['ms'], reverse=True)
+    return {entry['endpoint']: entry for entry in costliest[:count]}
+
+
+stats = OffenderStats()
+
+
+def offenders():
+    """Endpoints by total database time over the last WINDOW_SECONDS, costliest first."""
+    stats.flush()
+    report = {}
+    for minute in cache.get_many(window_keys()).values():
+        for label, entry in minute.items():
+            report[label] = merge_entries(report.get(label), entry)
+    report = top(report, TOP_N)
+    return [
+        {**entry, 'avgQueries': round(entry['queries'] / entry['requests'], 1)}
+        for entry in report.values()
+    ]
+
+
+def endpoint(request, profile=None):
+    """
+    What a request is reported under: its GraphQL operation, else its URL
+    pattern rather than its path, so /api/order/1/ and /api/order/2/ add up.
+    """
+    route = getattr(request.resolver_match, 'route', None)
+    label = profile.label if profile is not None else None
+    return f"{request.method} {label or route or request.path}"
+
+
+class QueryStatsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        timing = profile.server_timing()
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        if profile.count:
+            stats.record(endpoint(request, profile), profile)
+        return response
@@ -13,7 +13,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import tempfile
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 from google.oauth2 import service_account
 
 load_dotenv()
@@ -59,8 +61,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.query_stats.QueryStatsMiddleware',
+    'backend.traffic.TrafficCaptureMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'backend.db_router.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,7 +83,7 @@ SIMPLE_JWT = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -87,12 +92,50 @@ REST_FRAMEWORK = {
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # django.db.backends.mysql with a per-worker connection pool
+        'ENGINE': 'backend.mysql_pool',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '3306'),
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_SIZE', '10')),
+            # Below MySQL's wait_timeout, so the server never drops a pooled connection
+            'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE', '300')),
+            'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        },
+    }
+}
+
+# Optional read replica for reports and searches, see backend/db_router.py
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        # Tests read the primary's test database through this alias rather than create another
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Scratch database `manage.py restore_backup` restores backups into, on the primary's server by default
+if os.getenv('DB_RESTORE_NAME'):
+    DATABASES['restore'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_RESTORE_NAME'),
+        'HOST': os.getenv('DB_RESTORE_HOST', DATABASES['default']['HOST']),
+    }
+
+DATABASE_ROUTERS = ['backend.db_router.PrimaryReplicaRouter']
+
+# Shared by every worker process, so an invalidation in one reaches the others.
+# Point CACHE_BACKEND/CACHE_LOCATION at e.g. Redis when running on several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'allo-gaz-cache')),
     }
 }
 
@@ -213,10 +256,36 @@ CORS_ALLOW_CREDENTIALS = True
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'x-graphql-trace')
+
 GRAPHENE = {
-    "SCHEMA": "gaz_graphql.schema.schema"
+    "SCHEMA": "gaz_graphql.schema.schema",
+    "MIDDLEWARE": [
+        "gaz_graphql.tracing.TracingMiddleware",
+        "gaz_graphql.loaders.LoaderMiddleware",
+    ],
 }
 
+# Share of GraphQL requests whose per-field trace is appended to GRAPHQL_TRACE_LOG.
+# A superuser gets the trace of any request back by sending X-GraphQL-Trace: 1.
+GRAPHQL_TRACE_SAMPLE_RATE = float(os.getenv('GRAPHQL_TRACE_SAMPLE_RATE', '0.01'))
+GRAPHQL_TRACE_LOG = os.getenv('GRAPHQL_TRACE_LOG', os.path.join(tempfile.gettempdir(), 'allo-gaz-graphql-traces.jsonl'))
+
+# Record sanitized API and GraphQL requests for `manage.py replay_traffic`, see backend/traffic.py
+TRAFFIC_CAPTURE = os.getenv('TRAFFIC_CAPTURE', 'False') == 'True'
+TRAFFIC_CAPTURE_LOG = os.getenv('TRAFFIC_CAPTURE_LOG', os.path.join(tempfile.gettempdir(), 'allo-gaz-traffic.jsonl'))
+
+# Database backups, see backend/backups. They go to the GCS bucket when USE_GCS
+# is on, else under BACKUP_STORAGE_DIR. BACKUP_COMPRESSION is gzip or zstd,
+# which needs the zstandard package.
+BACKUP_STORAGE_DIR = os.getenv('BACKUP_STORAGE_DIR', os.path.join(BASE_DIR, 'backups'))
+BACKUP_COMPRESSION = os.getenv('BACKUP_COMPRESSION', 'gzip')
+# Connections dumping tables at once, on MySQL
+BACKUP_WORKERS = int(os.getenv('BACKUP_WORKERS', '4'))
+# Full backups kept, each with the incremental ones chained onto it
+BACKUP_KEEP_COUNT = int(os.getenv('BACKUP_KEEP_COUNT', '7'))
+BACKUP_MAX_AGE_DAYS = int(os.getenv('BACKUP_MAX_AGE_DAYS', '30'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,132 @@
+"""
+Opt-in traffic capture. With TRAFFIC_CAPTURE on, every API and GraphQL
+request is appended to TRAFFIC_CAPTURE_LOG as one JSON line, which
+`manage.py replay_traffic` can drive against another build.
+
+Headers are never recorded, so neither are tokens or cookies. Values under
+a secret-looking key (password, token, ...) are replaced by REDACTED
+wherever they appear in query strings, JSON bodies and GraphQL variables,
+and such requests are marked as not replayable.
+"""
+import json
+import re
+import threading
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from .query_stats import current_profile, endpoint
+
+CAPTURED_PREFIXES = ('/api/', '/graphql/')
+SECRET_WORDS = {'password', 'passwd', 'token', 'secret', 'access', 'refresh', 'authorization', 'otp', 'key', 'signature'}
+REDACTED = '[REDACTED]'
+
+# Secret arguments written inline in a GraphQL document, e.g. password: "..."
+_INLINE_SECRET = re.compile(r'\b(\w*(?:password|token|secret)\w*)(\s*:\s*)"(?:[^"\\]|\\.)*"', re.IGNORECASE)
+_WORDS = re.compile(r'[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])')
+
+_write_lock = threading.Lock()
+
+
+def is_secret(key):
+    """True for keys like password, new_password, accessToken or apiKey, but not keyset."""
+    return any(word.lower() in SECRET_WORDS for word in _WORDS.findall(str(key)))
+
+
+def sanitize(value):
+    """`value` with secrets redacted, and whether anything was."""
+    if isinstance(value, dict):
+        clean, redacted = {}, False
+        for key, item in value.items():
+            if is_secret(key):
+                clean[key], redacted = REDACTED, True
+            else:
+                clean[key], inner = sanitize(item)
+                redacted = redacted or inner
+        return clean, redacted
+    if isinstance(value, list):
+        items = [sanitize(item) for item in value]
+        return [item for item, _ in items], any(redacted for _, redacted in items)
+    return value, False
+
+
+def sanitize_document(query):
+    if not isinstance(query, str):
+        return query, False
+    clean, count = _INLINE_SECRET.subn(lambda match: f'{match.group(1)}{match.group(2)}"{REDACTED}"', query)
+    return clean, bool(count)
+
+
+def capture(request):
+    """The replayable part of `request`, sanitized."""
+    params, redacted = sanitize({key: values for key, values in request.GET.lists()})
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'query': urlencode(params, doseq=True),
+        'body': None,
+    }
+
+    if request.content_type != 'application/json':
+        # Multipart uploads (address and item images) are not kept, or even read
+        has_body = int(request.META.get('CONTENT_LENGTH') or 0) > 0
+        record['replayable'] = not (redacted or has_body)
+        return record
+
+    try:
+        body = json.loads(request.body) if request.body else None
+    except ValueError:
+        body = None
+
+    if request.path.startswith('/graphql/') and isinstance(body, dict):
+        document, inline = sanitize_document(body.get('query'))
+        variables, hidden = sanitize(body.get('variables') or {})
+        record['graphql'] = {
+            'operationName': body.get('operationName'),
+            'query': document,
+            'variables': variables,
+            'extensions': body.get('extensions'),
+        }
+        redacted = redacted or inline or hidden
+    else:
+        record['body'], hidden = sanitize(body)
+        redacted = redacted or hidden
+
+    record['replayable'] = not redacted
+    return record
+
+
+def write(record):
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        with open(settings.TRAFFIC_CAPTURE_LOG, 'a') as log:
+            log.write(line + '\n')
+
+
+class TrafficCaptureMiddleware:
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith(CAPTURED_PREFIXES):
+            return self.get_response(request)
+
+        # Read before the view consumes the body
+        record = capture(request)
+        at = time.time()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        profile = current_profile()
+        write({
+            'at': at,
+            'endpoint': endpoint(request, profile),
+            **record,
+            'status': response.status_code,
+            'ms': round(elapsed, 2),
+            'queries': profile.count if profile is not None else None,
+        })
+        return response
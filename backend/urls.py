@@ -21,13 +21,14 @@ from django.urls import path, include, re_path
 from django.views.decorators.csrf import csrf_exempt
 from order.views import ExchangeRateView
 from helpers.views import DRFJWTGraphQLView
-from .views import ReactAppView, BackupDatabaseAPIView
+from .views import ReactAppView, BackupDatabaseAPIView, QueryStatsView
 import os
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/backup/', BackupDatabaseAPIView.as_view(), name='backup'),
+    path('api/query-stats/', QueryStatsView.as_view(), name='query-stats'),
     path('api/user/', include('user.urls')),
     path('api/order/', include('order.urls')),
     path('api/item/', include('item.urls')),
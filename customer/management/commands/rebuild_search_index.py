@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from customer.models import Customer, CustomerSearchToken
+from customer.signals import search_fields as customer_search_fields
+from user.models import User, UserSearchToken
+from user.signals import search_fields as user_search_fields
+from helpers.search import build_tokens
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the customer and employee search token tables from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Token rows inserted per query')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        batch_size, database = options['batch_size'], options['database']
+
+        targets = [
+            (Customer, CustomerSearchToken, 'customer', customer_search_fields),
+            (User, UserSearchToken, 'user', user_search_fields),
+        ]
+
+        for model, token_model, owner_field, fields in targets:
+            with transaction.atomic(using=database):
+                token_model.objects.using(database).all().delete()
+
+                tokens = []
+                created = 0
+                for owner in model.objects.using(database).iterator(chunk_size=2000):
+                    tokens += build_tokens(token_model, owner_field, owner, fields(owner))
+                    if len(tokens) >= batch_size:
+                        token_model.objects.using(database).bulk_create(tokens)
+                        created += len(tokens)
+                        tokens = []
+                token_model.objects.using(database).bulk_create(tokens)
+                created += len(tokens)
+
+            self.stdout.write(self.style.SUCCESS(f'Indexed {model.__name__}: {created} tokens'))
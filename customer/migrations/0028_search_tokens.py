@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+from helpers.search import build_tokens
+
+
+def backfill_tokens(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Customer = apps.get_model('customer', 'Customer')
+    CustomerSearchToken = apps.get_model('customer', 'CustomerSearchToken')
+
+    tokens = []
+    for customer in Customer.objects.using(db).only('id', 'firstName', 'middleName', 'lastName').iterator(chunk_size=2000):
+        tokens += build_tokens(CustomerSearchToken, 'customer', customer, {
+            'firstName': customer.firstName,
+            'middleName': customer.middleName,
+            'lastName': customer.lastName,
+        })
+        if len(tokens) >= 10000:
+            CustomerSearchToken.objects.using(db).bulk_create(tokens)
+            tokens = []
+    CustomerSearchToken.objects.using(db).bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0027_alter_customer_middlename'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('token', models.CharField(max_length=3)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='customer.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['field', 'token', 'customer'], name='customer_cu_field_52da8e_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:28
+
+from django.db import migrations, models
+from helpers.phone import normalize_phone
+
+
+def backfill_digits(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Address = apps.get_model('customer', 'Address')
+    PhoneNumber = apps.get_model('customer', 'PhoneNumber')
+
+    addresses = list(Address.objects.using(db).exclude(landline='').exclude(landline__isnull=True).only('id', 'landline'))
+    for address in addresses:
+        address.landlineDigits = normalize_phone(address.landline)
+    Address.objects.using(db).bulk_update(addresses, ['landlineDigits'], batch_size=2000)
+
+    numbers = list(PhoneNumber.objects.using(db).only('id', 'mobile'))
+    for number in numbers:
+        number.mobileDigits = normalize_phone(number.mobile)
+    PhoneNumber.objects.using(db).bulk_update(numbers, ['mobileDigits'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0028_search_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='landlineDigits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='phonenumber',
+            name='mobileDigits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_digits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:29
+
+from django.db import migrations, models
+from helpers.phone import reverse_digits
+
+
+def backfill_reversed(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Address = apps.get_model('customer', 'Address')
+    PhoneNumber = apps.get_model('customer', 'PhoneNumber')
+
+    addresses = list(Address.objects.using(db).exclude(landlineDigits='').only('id', 'landlineDigits'))
+    for address in addresses:
+        address.landlineDigitsReversed = reverse_digits(address.landlineDigits)
+    Address.objects.using(db).bulk_update(addresses, ['landlineDigitsReversed'], batch_size=2000)
+
+    numbers = list(PhoneNumber.objects.using(db).exclude(mobileDigits='').only('id', 'mobileDigits'))
+    for number in numbers:
+        number.mobileDigitsReversed = reverse_digits(number.mobileDigits)
+    PhoneNumber.objects.using(db).bulk_update(numbers, ['mobileDigitsReversed'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0029_phone_digits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='landlineDigitsReversed',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='phonenumber',
+            name='mobileDigitsReversed',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_reversed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0030_phone_digits_reversed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='phonenumber',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -14,6 +14,7 @@ class Customer(models.Model):
     nickName = models.CharField(max_length=50, null=False, blank=True, default='')
     discount = models.FloatField(default=0)
     createdAt = models.DateTimeField(auto_now_add=True)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
     isActive = models.BooleanField(default=True, db_index=True)
     residenceZgharta = models.BooleanField(default=False)
     residenceEhden = models.BooleanField(default=False)
@@ -28,6 +29,9 @@ class Address(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='addresses', db_index=True)
     email = models.CharField(max_length=70, db_index=True, null=True, blank=True, default='')
     landline = models.CharField(max_length=40, null=True, blank=True, default='', db_index=True)
+    # E.164 digits of landline, filled on save for caller ID and partial number search
+    landlineDigits = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False)
+    landlineDigitsReversed = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False)
     notes = models.TextField(null=True, default="")
     link = models.CharField(max_length=50, null=True, blank=True, default='')
     region = models.CharField(max_length=100, null=False, default="")
@@ -36,6 +40,7 @@ class Address(models.Model):
     floor = models.CharField(max_length=50, null=True, blank=True, default='')
     image = models.ImageField(upload_to='addresses', null=True, blank=True)
     isActive = models.BooleanField(default=True)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Address {self.id}: {self.region} {self.street} {self.building} {self.floor}"
@@ -43,7 +48,22 @@ class Address(models.Model):
 class PhoneNumber(models.Model):
     address = models.ForeignKey(Address, on_delete=models.CASCADE, related_name='mobile_numbers', db_index=True)
     mobile = models.CharField(max_length=40, null=False, blank=False, default='' , validators=[phone_regex], db_index=True)
+    # E.164 digits of mobile, filled on save for caller ID and partial number search
+    mobileDigits = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False)
+    mobileDigitsReversed = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False)
     priority = models.IntegerField()
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
-        return f"Phone: {self.mobile}"
\ No newline at end of file
+        return f"Phone: {self.mobile}"
+
+class CustomerSearchToken(models.Model):
+    """Trigram index over customer names, kept in sync by customer.signals."""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='search_tokens')
+    field = models.CharField(max_length=20)
+    token = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['field', 'token', 'customer']),
+        ]
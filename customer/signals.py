@@ -0,0 +1,30 @@
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+from helpers.search import index_tokens
+from helpers.phone import normalize_phone, reverse_digits
+from .models import Customer, CustomerSearchToken, Address, PhoneNumber
+
+SEARCH_FIELDS = ('firstName', 'middleName', 'lastName')
+
+
+def search_fields(customer):
+    return {field: getattr(customer, field) for field in SEARCH_FIELDS}
+
+
+@receiver(post_save, sender=Customer)
+def index_customer(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_tokens(CustomerSearchToken, 'customer', instance, search_fields(instance))
+
+
+@receiver(pre_save, sender=Address)
+def normalize_landline(sender, instance, **kwargs):
+    instance.landlineDigits = normalize_phone(instance.landline)
+    instance.landlineDigitsReversed = reverse_digits(instance.landlineDigits)
+
+
+@receiver(pre_save, sender=PhoneNumber)
+def normalize_mobile(sender, instance, **kwargs):
+    instance.mobileDigits = normalize_phone(instance.mobile)
+    instance.mobileDigitsReversed = reverse_digits(instance.mobileDigits)
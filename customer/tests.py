@@ -198,4 +198,35 @@ class PhoneNumberTestCase(BaseTestCase):
         url = reverse('edit-phone-number', args=[pn.id])
 
         response = self.client.delete(url, **self.auth_header)
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+class CallerIdTestCase(BaseTestCase):
+    def test_lookup_by_mobile_in_any_format(self):
+        PhoneNumber.objects.create(address=self.address, mobile='+96170123456', priority=1)
+        url = reverse('caller-id')
+
+        for phone in ['+96170123456', '0096170123456', '70123456', '070 123 456']:
+            response = self.client.get(url, {'phone': phone}, **self.auth_header)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['phone'], '96170123456')
+            self.assertEqual(len(response.data['matches']), 1)
+
+        match = response.data['matches'][0]
+        self.assertEqual(match['customer']['id'], self.customer.id)
+        self.assertEqual(match['addresses'][0]['id'], self.address.id)
+        self.assertEqual(match['recentOrders'][0]['id'], self.order.id)
+
+    def test_lookup_by_landline(self):
+        self.address.landline = '06 123 456'
+        self.address.save()
+
+        response = self.client.get(reverse('caller-id'), {'phone': '+9616123456'}, **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['matches'][0]['addresses'][0]['landline'], '06 123 456')
+
+    def test_unknown_and_missing_phone(self):
+        response = self.client.get(reverse('caller-id'), {'phone': '+96171999999'}, **self.auth_header)
+        self.assertEqual(response.data['matches'], [])
+
+        response = self.client.get(reverse('caller-id'), **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import CustomerDetailView, AddressDetailView, PhoneNumberDetailView
+from .views import CustomerDetailView, AddressDetailView, PhoneNumberDetailView, CallerIdView
 
 urlpatterns = [
     path('', CustomerDetailView.as_view(), name='customer-list'),
     path('<int:pk>/', CustomerDetailView.as_view(), name='customer-detail'),
+    path('caller-id/', CallerIdView.as_view(), name='caller-id'),
     path('address/', AddressDetailView.as_view(), name='add-address'),
     path('address/<int:pk>/', AddressDetailView.as_view(), name='edit-address'),
     path('address/phone-number/', PhoneNumberDetailView.as_view(), name='add-phone-number'),
@@ -4,7 +4,12 @@ from .serializers import CustomerSerializer, AddressSerializer, PhoneNumberSeria
 from rest_framework.permissions import IsAdminUser
 from rest_framework.exceptions import AuthenticationFailed, NotFound
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework import status
+from django.db.models import Prefetch
+from helpers.phone import normalize_phone
+from order.models import Order
+from order.serializers import OrderSerializer
 
 class CustomerDetailView(BaseView):
     permission_classes = [IsAdminUser]
@@ -35,4 +40,55 @@ class PhoneNumberDetailView(BaseView):
     permission_classes = [IsAdminUser]
 
     Serializer = PhoneNumberSerializer
-    Model = PhoneNumber
\ No newline at end of file
+    Model = PhoneNumber
+
+class CallerIdView(APIView):
+    """
+    Looks a customer up from an incoming phone number. Mobiles and landlines
+    are matched on their normalized digits, so every step is an index lookup.
+    """
+    permission_classes = [IsAdminUser]
+    recent_orders = 5
+
+    def get(self, request):
+        digits = normalize_phone(request.query_params.get('phone', ''))
+        if not digits:
+            return Response({"error": "phone query parameter is required (e.g. ?phone=+96170123456)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        address_ids = set(
+            PhoneNumber.objects.filter(mobileDigits=digits).values_list('address_id', flat=True)
+        )
+        address_ids.update(
+            Address.objects.filter(landlineDigits=digits).values_list('id', flat=True)
+        )
+
+        addresses = (
+            Address.objects
+            .filter(id__in=address_ids)
+            .select_related('customer')
+            .prefetch_related(Prefetch('mobile_numbers', queryset=PhoneNumber.objects.order_by('priority')))
+            .order_by('customer_id', 'id')
+        )
+
+        matches = {}
+        for address in addresses:
+            match = matches.setdefault(address.customer_id, {
+                "customer": CustomerSerializer(address.customer).data,
+                "addresses": [],
+                "recentOrders": [],
+            })
+            address_data = AddressSerializer(address, context={'request': request}).data
+            address_data['mobile_numbers'] = PhoneNumberSerializer(address.mobile_numbers.all(), many=True).data
+            match["addresses"].append(address_data)
+
+        for customer_id, match in matches.items():
+            orders = (
+                Order.objects
+                .filter(customer_id=customer_id, isActive=True)
+                .select_related('item')
+                .order_by('-orderedAt')[:self.recent_orders]
+            )
+            match["recentOrders"] = OrderSerializer(orders, many=True, context={'request': request}).data
+
+        return Response({"phone": digits, "matches": list(matches.values())}, status=status.HTTP_200_OK)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class GazGraphQL(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gaz_graphql'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,118 @@
+from collections import defaultdict
+from django.db.models import Model, QuerySet
+
+
+class RelationLoader:
+    """
+    Loads a reverse foreign key relation (e.g. Customer.addresses) for every
+    parent of the same model seen so far in the request, in one IN (...) query.
+    """
+
+    def __init__(self, registry, model, related_name):
+        self.registry = registry
+        self.model = model
+        self.related_name = related_name
+
+        relation = model._meta.get_field(related_name)
+        self.related_model = relation.related_model
+        self.fk_name = relation.field.name
+        self.fk_attname = relation.field.attname
+
+        self.cache = {}
+
+    def load(self, parent):
+        if parent.pk not in self.cache:
+            self.registry.track([parent])
+            self.fetch({pk for pk in self.registry.seen(self.model) if pk not in self.cache})
+
+        return self.cache[parent.pk]
+
+    def fetch(self, pks):
+        parents = self.registry.instances[self.model]
+
+        # Respect an explicit prefetch_related() done by the root resolver
+        missing = set()
+        for pk in pks:
+            prefetched = getattr(parents.get(pk), '_prefetched_objects_cache', {})
+            if self.related_name in prefetched:
+                self.cache[pk] = list(prefetched[self.related_name])
+                self.registry.track(self.cache[pk])
+            else:
+                missing.add(pk)
+
+        if not missing:
+            return
+
+        # The instance hint keeps children on the parents' database, e.g. a replica
+        manager = self.related_model._default_manager.db_manager(hints={'instance': parents[next(iter(missing))]})
+        children = manager.filter(**{f'{self.fk_name}__in': missing})
+
+        grouped = defaultdict(list)
+        for child in children:
+            grouped[getattr(child, self.fk_attname)].append(child)
+
+        for pk in missing:
+            self.cache[pk] = grouped[pk]
+
+        # Children become parents for the next level of the query
+        self.registry.track(children)
+
+
+class LoaderRegistry:
+    """
+    Per-request set of relation loaders, attached to the GraphQL context by
+    DRFJWTGraphQLView.get_context.
+    """
+
+    def __init__(self):
+        self.loaders = {}
+        self.instances = defaultdict(dict)
+
+    def track(self, objects):
+        for obj in objects:
+            if isinstance(obj, Model):
+                self.instances[type(obj)][obj.pk] = obj
+
+    def seen(self, model):
+        return self.instances[model].keys()
+
+    def get(self, model, related_name):
+        key = (model, related_name)
+        if key not in self.loaders:
+            self.loaders[key] = RelationLoader(self, model, related_name)
+        return self.loaders[key]
+
+    def load(self, parent, related_name):
+        return self.get(type(parent), related_name).load(parent)
+
+
+def load_related(info, parent, related_name):
+    """
+    Resolve a reverse relation through the request's loaders, falling back to
+    a plain query when the context has none (e.g. schema.execute in a shell).
+    """
+    registry = getattr(info.context, 'loaders', None)
+    if registry is None:
+        return getattr(parent, related_name).all()
+    return registry.load(parent, related_name)
+
+
+class LoaderMiddleware:
+    """
+    Graphene middleware that records every list of model instances returned by
+    a resolver, so the first nested relation lookup can batch over all of them.
+    """
+
+    def resolve(self, next, root, info, **args):
+        result = next(root, info, **args)
+
+        registry = getattr(info.context, 'loaders', None)
+        if registry is None:
+            return result
+
+        if isinstance(result, QuerySet):
+            result = list(result)
+        if isinstance(result, (list, tuple)):
+            registry.track(result)
+
+        return result
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from gaz_graphql.response_cache import stats
+
+
+class Command(BaseCommand):
+    help = "Shows hit and miss counters of the GraphQL response cache"
+
+    def handle(self, *args, **options):
+        for field, counters in stats().items():
+            total = counters['hits'] + counters['misses']
+            ratio = counters['hits'] / total if total else 0
+            self.stdout.write(f"{field:<16} hits {counters['hits']:>8}  misses {counters['misses']:>8}  hit rate {ratio:.0%}")
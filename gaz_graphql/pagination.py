@@ -0,0 +1,60 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(order):
+    """Opaque cursor for an order's position in (orderedAt, id) order."""
+    raw = f"{order.orderedAt.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        ordered_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        ordered_at = parse_datetime(ordered_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise Exception("Invalid cursor")
+
+    if ordered_at is None:
+        raise Exception("Invalid cursor")
+    return ordered_at, pk
+
+
+def keyset_page(queryset, page_size, after=None, before=None):
+    """
+    Page `queryset` newest first on (orderedAt, id) without COUNT or OFFSET.
+    Every page is a single index range scan no matter how deep it is.
+    """
+    if before:
+        ordered_at, pk = decode_cursor(before)
+        queryset = queryset.filter(
+            Q(orderedAt__gt=ordered_at) | Q(id__gt=pk), orderedAt__gte=ordered_at
+        ).order_by('orderedAt', 'id')
+    else:
+        if after:
+            ordered_at, pk = decode_cursor(after)
+            queryset = queryset.filter(
+                Q(orderedAt__lt=ordered_at) | Q(id__lt=pk), orderedAt__lte=ordered_at
+            )
+        queryset = queryset.order_by('-orderedAt', '-id')
+
+    # Fetch one extra row to know whether another page exists
+    orders = list(queryset[:page_size + 1])
+    has_more = len(orders) > page_size
+    orders = orders[:page_size]
+
+    if before:
+        orders.reverse()
+        has_next_page, has_previous_page = True, has_more
+    else:
+        has_next_page, has_previous_page = has_more, bool(after)
+
+    return {
+        'orders': orders,
+        'has_next_page': has_next_page,
+        'has_previous_page': has_previous_page,
+        'start_cursor': encode_cursor(orders[0]) if orders else None,
+        'end_cursor': encode_cursor(orders[-1]) if orders else None,
+    }
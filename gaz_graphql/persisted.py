@@ -0,0 +1,82 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from graphql import GraphQLError, parse, validate
+
+# Distinct documents kept parsed and validated; the frontend sends a few dozen
+DOCUMENT_CACHE_SIZE = 128
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def persisted_hash(data, request):
+    """The sha256Hash of an Apollo-style persistedQuery extension, if any."""
+    extensions = request.GET.get('extensions') or data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    if not isinstance(extensions, dict):
+        return None
+    persisted = extensions.get('persistedQuery') or {}
+    return persisted.get('sha256Hash') if isinstance(persisted, dict) else None
+
+
+class DocumentCache:
+    """
+    LRU of parsed and validated documents keyed by the sha256 of their text,
+    so a repeated query skips both steps. Only documents that validated are
+    kept, which lets a hash alone stand in for the query text.
+    """
+
+    def __init__(self, size=DOCUMENT_CACHE_SIZE):
+        self.size = size
+        self.documents = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def query_for(self, sha256):
+        """Text of a known document, or None if the client must send it."""
+        with self.lock:
+            entry = self.documents.get(sha256)
+            return entry[0] if entry else None
+
+    def get(self, schema, query, validation_rules=None, max_errors=None):
+        """Return (document, errors) for `query`, parsing and validating it once."""
+        key = query_hash(query)
+        with self.lock:
+            entry = self.documents.get(key)
+            if entry:
+                self.documents.move_to_end(key)
+                self.hits += 1
+                return entry[1], []
+            self.misses += 1
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            return None, [error]
+
+        errors = validate(schema, document, validation_rules, max_errors)
+        if errors:
+            return None, errors
+
+        with self.lock:
+            self.documents[key] = (query, document)
+            self.documents.move_to_end(key)
+            while len(self.documents) > self.size:
+                self.documents.popitem(last=False)
+        return document, []
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+            self.hits = self.misses = 0
+
+
+documents = DocumentCache()
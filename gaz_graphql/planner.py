@@ -0,0 +1,113 @@
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_camel_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, get_named_type
+
+
+def plan_queryset(queryset, info, path=(), required=()):
+    """
+    Apply select_related/prefetch_related/only() to `queryset` based on the
+    fields the client selected under the current field.
+
+    `path` walks from the current field down to the list of model instances,
+    e.g. ('orders',) for OrderPaginationResult.orders. `required` lists
+    columns the resolver itself reads, whatever the client selected.
+    """
+    graphql_type = get_named_type(info.return_type)
+    nodes = list(info.field_nodes)
+
+    for name in path:
+        nodes = collect_fields(info, nodes).get(name, [])
+        graphql_type = get_named_type(graphql_type.fields[name].type)
+
+    if not nodes:
+        return queryset
+
+    return apply_plan(queryset, info, graphql_type, nodes, required)
+
+
+def apply_plan(queryset, info, graphql_type, nodes, required=()):
+    only, select, prefetch = set(required), set(), []
+    walk(info, graphql_type, nodes, queryset.model, '', only, select, prefetch)
+
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset.only(*sorted(only))
+
+
+def collect_fields(info, nodes):
+    """Group the sub-selections of `nodes` by field name, expanding fragments."""
+    fields = {}
+
+    def visit(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                visit(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                visit(info.fragments[selection.name.value].selection_set)
+
+    for node in nodes:
+        visit(node.selection_set)
+    return fields
+
+
+def model_field_names(graphene_type):
+    """
+    Map GraphQL field names to model field names. Types can point custom
+    fields at the model field they read through a `planner_sources` dict;
+    a None source means the field only needs the primary key.
+    """
+    sources = getattr(graphene_type, 'planner_sources', {})
+    names = {}
+    for name, field in graphene_type._meta.fields.items():
+        names[getattr(field, 'name', None) or to_camel_case(name)] = sources.get(name, name)
+    return names
+
+
+def walk(info, graphql_type, nodes, model, prefix, only, select, prefetch):
+    graphene_type = getattr(graphql_type, 'graphene_type', None)
+    names = model_field_names(graphene_type) if graphene_type else {}
+    model_fields = {f.name: f for f in model._meta.get_fields()}
+
+    only.add(prefix + model._meta.pk.name)
+
+    for graphql_name, sub_nodes in collect_fields(info, nodes).items():
+        if graphql_name == '__typename':
+            continue
+
+        if graphql_name not in names:
+            # Unknown field: load every column rather than risk a lazy query per row
+            only.update(prefix + f.name for f in model._meta.concrete_fields)
+            continue
+
+        field_name = names[graphql_name]
+        if field_name is None:
+            continue
+
+        field = model_fields.get(field_name)
+        if field is None:
+            only.update(prefix + f.name for f in model._meta.concrete_fields)
+            continue
+
+        sub_type = get_named_type(graphql_type.fields[graphql_name].type)
+
+        if field.is_relation and (field.many_to_one or field.one_to_one) and field.concrete:
+            only.add(prefix + field.name)
+            select.add(prefix + field.name)
+            walk(info, sub_type, sub_nodes, field.related_model, f'{prefix}{field.name}__', only, select, prefetch)
+        elif field.is_relation and field.one_to_many:
+            # The back-reference column is needed to attach children to parents
+            child = apply_plan(
+                field.related_model._default_manager.all(), info, sub_type, sub_nodes,
+                required=[field.field.name]
+            )
+            prefetch.append(Prefetch(prefix + field_name, queryset=child))
+        elif field.is_relation:
+            prefetch.append(prefix + field_name)
+        else:
+            only.add(prefix + field.name)
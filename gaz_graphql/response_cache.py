@@ -0,0 +1,139 @@
+import hashlib
+import json
+from django.core.cache import cache
+from graphql import FieldNode, FragmentDefinitionNode, FragmentSpreadNode, InlineFragmentNode, OperationType, get_named_type
+from helpers.cache import model_version
+from item.models import Item, Source
+from user.models import User
+
+# Root fields whose responses are cached, and the models they are built from.
+# A write to any of these models invalidates the field's entries, see
+# gaz_graphql.signals and helpers.cache.invalidate_model.
+CACHED_FIELDS = {
+    'allItems': (Item, Source),
+    'itemById': (Item, Source),
+    'driversSearch': (User,),
+    'userById': (User,),
+}
+TIMEOUT = 60 * 60
+KEY_PREFIX = 'graphql-response'
+
+
+def permission_level(user):
+    if not user or not user.is_authenticated:
+        return 'anonymous'
+    if user.is_superuser:
+        return 'superuser'
+    if user.is_staff:
+        return 'staff'
+    return 'user'
+
+
+def selected_models(schema, document, operation):
+    """
+    Every Django model the operation's selection reaches, or None when it
+    selects something other than fields (e.g. a fragment at the root).
+    """
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    models = set()
+
+    def visit(graphql_type, selection_set):
+        graphene_type = getattr(graphql_type, 'graphene_type', None)
+        model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+        if model is not None:
+            models.add(model)
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if selection.name.value == '__typename':
+                    continue
+                field = graphql_type.fields[selection.name.value]
+                visit(get_named_type(field.type), selection.selection_set)
+            elif isinstance(selection, InlineFragmentNode):
+                visit(graphql_type, selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                visit(graphql_type, fragments[selection.name.value].selection_set)
+
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, FieldNode):
+            return None
+        field = schema.query_type.fields[selection.name.value]
+        visit(get_named_type(field.type), selection.selection_set)
+    return models
+
+
+def cache_key(request, schema, document, operation, query, variables):
+    """
+    Key of the cached response to `operation`, or None when it cannot be
+    cached: a mutation, a root field that did not opt in, or a selection
+    reaching a model the field is not invalidated by (e.g. an item's orders).
+    """
+    if operation is None or operation.operation != OperationType.QUERY:
+        return None
+
+    fields = []
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, FieldNode) or selection.name.value not in CACHED_FIELDS:
+            return None
+        fields.append(selection.name.value)
+
+    dependencies = {model for field in fields for model in CACHED_FIELDS[field]}
+    models = selected_models(schema, document, operation)
+    if models is None or not models <= dependencies:
+        return None
+
+    raw = json.dumps([
+        fields,
+        hashlib.sha256(query.encode()).hexdigest(),
+        operation.name.value if operation.name else None,
+        variables or {},
+        permission_level(getattr(request, 'user', None)),
+        # Image URLs are built from the request's host
+        request.build_absolute_uri('/'),
+        sorted(model_version(model) for model in dependencies),
+    ], sort_keys=True, default=str)
+    return f"{KEY_PREFIX}:{'+'.join(fields)}:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+def fields_of(key):
+    return key.split(':')[1].split('+')
+
+
+def lookup(key):
+    data = cache.get(key)
+    for field in fields_of(key):
+        count(field, 'hits' if data is not None else 'misses')
+    return data
+
+
+def store(key, data):
+    cache.set(key, data, TIMEOUT)
+
+
+def count(field, outcome):
+    counter = f'{KEY_PREFIX}:{outcome}:{field}'
+    cache.add(counter, 0, None)
+    try:
+        cache.incr(counter)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(counter, 1, None)
+
+
+def stats():
+    """Hit and miss counters per cached field, shared by every worker (approximate on the file backend)."""
+    fields = list(CACHED_FIELDS)
+    keys = [f'{KEY_PREFIX}:{outcome}:{field}' for field in fields for outcome in ('hits', 'misses')]
+    counters = cache.get_many(keys)
+    return {
+        field: {
+            outcome: counters.get(f'{KEY_PREFIX}:{outcome}:{field}', 0)
+            for outcome in ('hits', 'misses')
+        }
+        for field in fields
+    }
@@ -4,15 +4,22 @@ from datetime import timedelta
 from datetime import datetime as dt_datetime, timedelta, time as dt_time, timezone as dt_timezone
 from django.utils import timezone
 from django.db.models.functions import Cast
-from django.db.models import Q, F, Sum, CharField, Case, When, FloatField, ExpressionWrapper
+from django.db.models import F, CharField, Exists, OuterRef
 from django.core.paginator import Paginator, EmptyPage
 from django.utils.timezone import make_aware
 from graphene_django import DjangoObjectType
-from user.models import User
+from user.models import User, UserSearchToken
 from order.models import Order
 from item.models import Item, Source
-from customer.models import Customer, Address, PhoneNumber
+from customer.models import Customer, Address, PhoneNumber, CustomerSearchToken
 from helpers.util import login_required_resolver
+from helpers.search import filter_by_tokens, rank_by_terms
+from helpers.phone import partial_phone_q
+from .loaders import load_related
+from .planner import plan_queryset
+from .pagination import keyset_page
+from order.rollups import total_profit
+from backend.db_router import read_alias
 from urllib.parse import urlparse, urlunparse
 
 class UserType(DjangoObjectType):
@@ -20,15 +27,19 @@ class UserType(DjangoObjectType):
         model = User
         fields = ('id', 'username', 'first_name', 'middle_name', 'email', 'last_name', 'phone_number', 'is_driver', 'is_staff', 'is_active', 'is_superuser', 'region')
 
+    planner_sources = {'orders': 'orders_made'}
+
     orders = graphene.List(lambda: OrderType)
 
     def resolve_orders(self, info):
-        return self.orders_made.all()
+        return load_related(info, self, 'orders_made')
 class AddressType(DjangoObjectType):
     class Meta:
         model = Address
         fields = '__all__'
     
+    planner_sources = {'image_url': 'image'}
+
     image_url = graphene.String()
 
     def resolve_image_url(self, info):
@@ -47,12 +58,12 @@ class AddressType(DjangoObjectType):
     orders = graphene.List(lambda: OrderType)
 
     def resolve_orders(self, info):
-        return self.orders.all()
+        return load_related(info, self, 'orders')
     
     mobile_numbers = graphene.List(lambda: PhoneNumberType)
 
     def resolve_mobile_numbers(self, info):
-        return self.mobile_numbers.all()
+        return load_related(info, self, 'mobile_numbers')
 
 class OrderType(DjangoObjectType):
     class Meta:
@@ -62,6 +73,10 @@ class OrderType(DjangoObjectType):
 class OrderPaginationType(graphene.ObjectType):
     orders = graphene.List(OrderType)
     total_pages = graphene.Int()
+    has_next_page = graphene.Boolean()
+    has_previous_page = graphene.Boolean()
+    start_cursor = graphene.String()
+    end_cursor = graphene.String()
 
 
 class CustomerType(DjangoObjectType):
@@ -69,15 +84,17 @@ class CustomerType(DjangoObjectType):
         model = Customer
         fields = '__all__'
 
+    planner_sources = {'orders_paginated': None}
+
     addresses = graphene.List(lambda: AddressType)
 
     def resolve_addresses(self, info):
-        return self.addresses.all()
+        return load_related(info, self, 'addresses')
 
     orders = graphene.List(lambda: OrderType)
 
     def resolve_orders(self, info):
-        return self.orders.all()
+        return load_related(info, self, 'orders')
     
     orders_paginated = graphene.Field(
         OrderPaginationType,
@@ -85,9 +102,12 @@ class CustomerType(DjangoObjectType):
         end_date=graphene.Date(required=False),
         page=graphene.Int(required=False, default_value=1),
         page_size=graphene.Int(required=False, default_value=10),
+        keyset=graphene.Boolean(required=False, default_value=False),
+        after=graphene.String(required=False),
+        before=graphene.String(required=False),
     )
 
-    def resolve_orders_paginated(self, info, start_date=None, end_date=None, page=1, page_size=10):
+    def resolve_orders_paginated(self, info, start_date=None, end_date=None, page=1, page_size=10, keyset=False, after=None, before=None):
         qs = self.orders.filter(isActive=True)
 
         if start_date:
@@ -110,6 +130,10 @@ class CustomerType(DjangoObjectType):
 
             qs = qs.filter(orderedAt__range=(utc_start, utc_end))
 
+        # Cursor mode: no COUNT(*) and no OFFSET scan, so totalPages stays null
+        if keyset or after or before:
+            return OrderPaginationType(**keyset_page(qs, page_size, after, before))
+
         paginator = Paginator(qs, page_size)
         try:
             page_obj = paginator.page(page)
@@ -142,6 +166,8 @@ class ItemType(DjangoObjectType):
         model = Item
         fields = "__all__"
 
+    planner_sources = {'image_url': 'image'}
+
     image_url = graphene.String()
 
     def resolve_image_url(self, info):
@@ -160,17 +186,21 @@ class ItemType(DjangoObjectType):
     orders = graphene.List(lambda: OrderType)
 
     def resolve_orders(self, info):
-        return self.orders.all()
+        return load_related(info, self, 'orders')
     
     sources = graphene.List(lambda: SourceType)
 
     def resolve_sources(self, info):
-        return self.sources.all()
+        return load_related(info, self, 'sources')
 
 class OrderPaginationResult(graphene.ObjectType):
     orders = graphene.List(OrderType)
     address = graphene.Field(AddressType)
     total_pages = graphene.Int()
+    has_next_page = graphene.Boolean()
+    has_previous_page = graphene.Boolean()
+    start_cursor = graphene.String()
+    end_cursor = graphene.String()
 
 class ItemSearchResult(graphene.ObjectType):
     items = graphene.List(ItemType)
@@ -227,7 +257,10 @@ class Query(graphene.ObjectType):
         end_date=graphene.Date(),
         address_id=graphene.Int(),
         page=graphene.Int(default_value=1),
-        page_size=graphene.Int(default_value=10)
+        page_size=graphene.Int(default_value=10),
+        keyset=graphene.Boolean(default_value=False),
+        after=graphene.String(),
+        before=graphene.String()
     )
 
     drivers_search = graphene.List(
@@ -242,53 +275,12 @@ class Query(graphene.ObjectType):
         if region is not None:
             queryset = queryset.filter(region__icontains=region)
 
-        return queryset
+        return plan_queryset(queryset, info)
 
     @login_required_resolver
     def resolve_total_profit(self, info, start_date, end_date=None, address_id=None):
-        # Convert start_date and end_date to aware UTC datetime range
-        local_start = timezone.make_aware(dt_datetime.combine(start_date, dt_time.min))
-        if end_date:
-            local_end = timezone.make_aware(dt_datetime.combine(end_date, dt_time.max))
-        else:
-            local_end = local_start + timedelta(days=1)
-
-        # Convert to UTC timezone
-        utc_start = local_start.astimezone(dt_timezone.utc)
-        utc_end = local_end.astimezone(dt_timezone.utc)
-
-        if address_id:
-            try:
-                address = Address.objects.get(id=address_id)
-                orders = address.orders.filter(
-                    orderedAt__range=(utc_start, utc_end),
-                    isActive=True,
-                    deliveredAt__isnull=False
-                )
-            except Address.DoesNotExist:
-                return 0.0
-        else:
-            orders = Order.objects.filter(
-                orderedAt__range=(utc_start, utc_end),
-                isActive=True,
-                deliveredAt__isnull=False
-            )
-
-        orders_with_profit = orders.annotate(
-            gross_profit=(F('item__price') - F('item__buyPrice')) * F('quantity'),
-            discount_value=Case(
-                When(discount__gt=1000,
-                    then=ExpressionWrapper(F('discount') / F('liraRate'), output_field=FloatField())),
-                default=ExpressionWrapper((F('discount') * 1000) / F('liraRate'), output_field=FloatField()),
-                output_field=FloatField(),
-            )
-        ).annotate(
-            profit=F('gross_profit') - F('discount_value')
-        )
-
-        total_profit = orders_with_profit.aggregate(total_profit=Sum('profit'))['total_profit'] or 0.0
-
-        return round(total_profit, 2)
+        # Read from the daily rollups instead of re-aggregating every order
+        return total_profit(start_date, end_date, address_id, using=read_alias())
 
     @login_required_resolver
     def resolve_paginated_orders(
@@ -298,7 +290,10 @@ class Query(graphene.ObjectType):
         end_date=None,
         address_id=None,
         page=1,
-        page_size=10
+        page_size=10,
+        keyset=False,
+        after=None,
+        before=None
     ):
         # Get Django's local timezone
         local_tz = timezone.get_current_timezone()
@@ -317,18 +312,15 @@ class Query(graphene.ObjectType):
         utc_start = local_start.astimezone(dt_timezone.utc)
         utc_end = local_end.astimezone(dt_timezone.utc)
 
-        print(
-            f"Filtering from {utc_start.isoformat()} to {utc_end.isoformat()} => "
-            f"{Order.objects.filter(orderedAt__range=(utc_start, utc_end)).count()} orders"
-        )
-
         address = None
+        db = read_alias()
 
         # Base queryset
         if address_id:
             try:
-                address = Address.objects.get(id=address_id)
-                orders = address.orders.filter(
+                address = plan_queryset(Address.objects.using(db), info, ('address',)).get(id=address_id)
+                orders = Order.objects.using(db).filter(
+                    address_id=address.id,
                     orderedAt__range=(utc_start, utc_end),
                     isActive=True
                 )
@@ -339,13 +331,17 @@ class Query(graphene.ObjectType):
                     total_pages=0
                 )
         else:
-            orders = Order.objects.filter(
+            orders = Order.objects.using(db).filter(
                 orderedAt__range=(utc_start, utc_end),
                 isActive=True
             )
 
-        # Optimize related object loading
-        orders = orders.select_related('item')
+        # Load only the columns and relations the client selected
+        orders = plan_queryset(orders, info, ('orders',), required=('orderedAt',))
+
+        # Cursor mode pages on (orderedAt, id) instead of COUNT + OFFSET
+        if keyset or after or before:
+            return OrderPaginationResult(address=address, **keyset_page(orders, page_size, after, before))
 
         # Ensure consistent ordering before pagination
         orders = orders.order_by('-orderedAt')
@@ -360,8 +356,7 @@ class Query(graphene.ObjectType):
                 address=address,
                 total_pages=paginator.num_pages
             )
-        
-        print(f"ORDERS COUNT {orders.count()}")
+
 
         return OrderPaginationResult(
             orders=paginated_orders.object_list,
@@ -374,6 +369,7 @@ class Query(graphene.ObjectType):
             queryset = Item.objects.filter(stockQuantity__lte=F('limit'))
         else:
             queryset = Item.objects.all()
+        queryset = plan_queryset(queryset, info, ('items',))
         paginator = Paginator(queryset, number_of_results)
 
         # Check if page exists, if not return an empty result
@@ -393,14 +389,14 @@ class Query(graphene.ObjectType):
     @login_required_resolver
     def resolve_customer_by_id(self, info, id):
         try:
-            return Customer.objects.get(id=id)
+            return plan_queryset(Customer.objects.all(), info).get(id=id)
         except Customer.DoesNotExist:
             return None
     
     @login_required_resolver
     def resolve_address_by_id(self, info, id):
         try:
-            return Address.objects.get(id=id)
+            return plan_queryset(Address.objects.all(), info).get(id=id)
         except Address.DoesNotExist:
             return None
     
@@ -408,54 +404,54 @@ class Query(graphene.ObjectType):
     @login_required_resolver
     def resolve_user_by_id(self, info, id):
         try:
-            return User.objects.get(id=id)
+            return plan_queryset(User.objects.all(), info).get(id=id)
         except User.DoesNotExist:
             return None
         
     @login_required_resolver
     def resolve_item_by_id(self, info, id):
         try:
-            return Item.objects.get(id=id)
+            return plan_queryset(Item.objects.all(), info).get(id=id)
         except Item.DoesNotExist:
             return None
 
     @login_required_resolver   
     def resolve_order_by_id(self, info, id):
         try:
-            return Order.objects.get(id=id)
+            return plan_queryset(Order.objects.all(), info).get(id=id)
         except Order.DoesNotExist:
             return None
     
     @login_required_resolver
     def resolve_employees_search(self, info, username, firstname, email, mobile, lastname, middlename, page, number_of_results, order_by, order_direction, is_active):
         user = info.context.user
-        # Initial name-based filter
-        queryset = User.objects.filter(
-            first_name__icontains=firstname,
-            middle_name__icontains=middlename,
-            last_name__icontains=lastname,
-            is_active=is_active
-        ).exclude(id=user.id)
-
-        if username:
-            queryset = queryset.filter(username__icontains=username)
-
-        if mobile:
-            queryset = queryset.filter(phone_number__icontains=mobile)
-
-        if email:
-            queryset = queryset.filter(email__icontains=email)
+        queryset = User.objects.filter(is_active=is_active).exclude(id=user.id)
+
+        # Every term is matched through the trigram index, see helpers.search
+        terms = {
+            'username': username,
+            'first_name': firstname,
+            'middle_name': middlename,
+            'last_name': lastname,
+            'email': email,
+            'phone_number': mobile,
+        }
+        queryset = filter_by_tokens(queryset, UserSearchToken, 'user', terms)
 
         # Handle ordering logic
         if order_by == "name":
             queryset = queryset.order_by("first_name", "last_name", "middle_name")
         elif order_by == "createdAt":
             queryset = queryset.order_by("date_joined")  # Adjust field name if necessary
+        else:
+            queryset = rank_by_terms(queryset, terms)
 
         # If order_direction is -1, reverse the order
         if order_direction == -1:
             queryset = queryset.reverse()
 
+        queryset = plan_queryset(queryset, info, ('employees',))
+
         # Paginate the queryset
         paginator = Paginator(queryset, number_of_results)
         
@@ -473,27 +469,30 @@ class Query(graphene.ObjectType):
 
     @login_required_resolver
     def resolve_customers_search(self, info, id, firstname, email, mobile, lastname, middlename, page, number_of_results, order_by, order_direction, is_active):
-        # Initial name-based filter
-        queryset = Customer.objects.filter(
-            firstName__icontains=firstname,
-            middleName__icontains=middlename,
-            lastName__icontains=lastname,
-            isActive=is_active
-        )
+        # Searches are read-only, the replica can serve them
+        queryset = Customer.objects.using(read_alias()).filter(isActive=is_active)
 
-        queryset = queryset.prefetch_related(
-            'addresses__mobile_numbers'
-        )
+        # Name terms go through the trigram index, see helpers.search
+        terms = {'firstName': firstname, 'middleName': middlename, 'lastName': lastname}
+        queryset = filter_by_tokens(queryset, CustomerSearchToken, 'customer', terms)
 
+        # EXISTS instead of joins so a customer with several matching numbers is returned once;
+        # numbers match on their last digits or their normalized start, both index range scans
         if mobile:
             queryset = queryset.filter(
-                Q(addresses__mobile_numbers__mobile__icontains=mobile) |
-                Q(addresses__landline__icontains=mobile)
+                Exists(PhoneNumber.objects.filter(
+                    partial_phone_q('mobileDigits', 'mobileDigitsReversed', mobile),
+                    address__customer=OuterRef('pk')
+                )) |
+                Exists(Address.objects.filter(
+                    partial_phone_q('landlineDigits', 'landlineDigitsReversed', mobile),
+                    customer=OuterRef('pk')
+                ))
             )
 
         if email:
             queryset = queryset.filter(
-                addresses__email__icontains=email
+                Exists(Address.objects.filter(customer=OuterRef('pk'), email__icontains=email))
             )
 
         if id:
@@ -506,11 +505,15 @@ class Query(graphene.ObjectType):
             queryset = queryset.order_by("createdAt")  # Adjust field name if necessary
         elif order_by == "id":
             queryset = queryset.order_by("id")
+        else:
+            queryset = rank_by_terms(queryset, terms)
 
         # If order_direction is -1, reverse the order
         if order_direction == -1:
             queryset = queryset.reverse()
 
+        queryset = plan_queryset(queryset, info, ('customers',))
+
         # Paginate the queryset
         paginator = Paginator(queryset, number_of_results)
         
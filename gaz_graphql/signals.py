@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from helpers.cache import invalidate_model
+from item.models import Item, Source
+from user.models import User
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Source)
+@receiver(post_save, sender=User)
+def invalidate_cached_responses(sender, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Logins only touch last_login, which no cached response shows
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_model(sender)
+
+
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Source)
+@receiver(post_delete, sender=User)
+def invalidate_deleted_responses(sender, **kwargs):
+    invalidate_model(sender)
@@ -123,3 +123,447 @@
 #         response = self.graphql(query)
 #         assert response.status_code == 200
 #         assert "customers" in response.json()["data"]["customersSearch"]
+
+
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from customer.models import Customer, CustomerSearchToken, Address, PhoneNumber
+from order.models import Order
+from helpers.tests import GraphQLTestCase
+from .persisted import documents
+from . import response_cache
+from item.stock import take_stock
+from backend import query_stats
+from django.test import override_settings
+from django.core.cache import cache
+import json
+import tempfile
+import hashlib
+import time
+
+
+class RelationLoaderTests(GraphQLTestCase):
+    query = """
+    query {
+        customersSearch(
+            id: "", firstname: "", lastname: "", middlename: "", mobile: "", email: "",
+            page: 1, numberOfResults: 50, orderBy: "id", orderDirection: 1, isActive: true
+        ) {
+            customers { id orders { id } addresses { id orders { id } } }
+        }
+    }
+    """
+
+    def add_customer(self, name):
+        customer = Customer.objects.create(firstName=name, lastName="Test")
+        address = Address.objects.create(customer=customer, region="Zgharta")
+        PhoneNumber.objects.create(address=address, mobile="+96170000000", priority=1)
+        Order.objects.create(
+            customer=customer, user=self.admin_user, item=self.item, quantity=1,
+            address=address, liraRate=89000, driver=self.driver
+        )
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.graphql(self.query)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("errors", response.json())
+        return len(ctx.captured_queries), response.json()["data"]["customersSearch"]["customers"]
+
+    def test_nested_relations_are_batched(self):
+        # The first request also loads the authenticated user
+        self.count_queries()
+        few_queries, few_customers = self.count_queries()
+
+        for i in range(5):
+            self.add_customer(f"Customer {i}")
+
+        many_queries, many_customers = self.count_queries()
+
+        self.assertEqual(len(many_customers), len(few_customers) + 5)
+        self.assertEqual(many_queries, few_queries)
+        for customer in many_customers:
+            self.assertEqual(len(customer["orders"]), 1)
+
+
+class QueryPlannerTests(GraphQLTestCase):
+    def test_paginated_orders_loads_selected_columns_and_relations(self):
+        query = """
+        query ($startDate: Date!) {
+            paginatedOrders(startDate: $startDate) {
+                orders { id quantity item { name } customer { firstName } driver { username } }
+                totalPages
+            }
+        }
+        """
+        start_date = timezone.localdate(self.order.orderedAt).isoformat()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.graphql(query, {"startDate": start_date})
+
+        orders = response.json()["data"]["paginatedOrders"]["orders"]
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(orders[0]["item"]["name"], self.item2.name)
+        self.assertEqual(orders[0]["customer"]["firstName"], self.customer.firstName)
+        self.assertEqual(orders[0]["driver"]["username"], self.driver.username)
+
+        order_queries = [q["sql"] for q in ctx.captured_queries if 'FROM "order_order"' in q["sql"] and "COUNT" not in q["sql"]]
+        self.assertEqual(len(order_queries), 1)
+        self.assertIn("JOIN", order_queries[0])
+        self.assertNotIn("customerNotes", order_queries[0])
+        self.assertNotIn("buyPrice", order_queries[0])
+
+    def test_customer_by_id_prefetches_nested_relations(self):
+        PhoneNumber.objects.create(address=self.address, mobile="+96170000000", priority=1)
+        query = """
+        query ($id: Int!) {
+            customerById(id: $id) { firstName addresses { region mobileNumbers { mobile } } }
+        }
+        """
+
+        response = self.graphql(query, {"id": self.customer.id})
+
+        customer = response.json()["data"]["customerById"]
+        self.assertEqual(customer["addresses"][0]["region"], "Zgharta")
+        self.assertEqual(customer["addresses"][0]["mobileNumbers"][0]["mobile"], "+96170000000")
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    query = """
+    query ($startDate: Date!, $after: String, $before: String) {
+        paginatedOrders(startDate: $startDate, pageSize: 2, keyset: true, after: $after, before: $before) {
+            orders { id }
+            totalPages
+            hasNextPage
+            hasPreviousPage
+            startCursor
+            endCursor
+        }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(4):
+            Order.objects.create(
+                customer=self.customer, user=self.admin_user, item=self.item, quantity=1,
+                address=self.address, liraRate=89000, driver=self.driver
+            )
+        self.start_date = timezone.localdate(self.order.orderedAt).isoformat()
+
+    def page(self, **cursors):
+        response = self.graphql(self.query, {"startDate": self.start_date, **cursors})
+        return response.json()["data"]["paginatedOrders"]
+
+    def test_pages_forward_and_back_without_overlap(self):
+        expected = [str(pk) for pk in Order.objects.order_by('-orderedAt', '-id').values_list('id', flat=True)]
+
+        first = self.page()
+        second = self.page(after=first["endCursor"])
+        third = self.page(after=second["endCursor"])
+
+        seen = [o["id"] for page in (first, second, third) for o in page["orders"]]
+        self.assertEqual(seen, expected)
+        self.assertIsNone(first["totalPages"])
+        self.assertTrue(first["hasNextPage"])
+        self.assertFalse(first["hasPreviousPage"])
+        self.assertFalse(third["hasNextPage"])
+
+        back = self.page(before=third["startCursor"])
+        self.assertEqual(back["orders"], second["orders"])
+        self.assertTrue(back["hasPreviousPage"])
+
+    def test_invalid_cursor(self):
+        response = self.graphql(self.query, {"startDate": self.start_date, "after": "not-a-cursor"})
+        self.assertIn("errors", response.json())
+
+
+class SearchIndexTests(GraphQLTestCase):
+    customers_query = """
+    query ($firstname: String!, $lastname: String!, $mobile: String!) {
+        customersSearch(
+            id: "", firstname: $firstname, lastname: $lastname, middlename: "", mobile: $mobile, email: "",
+            page: 1, numberOfResults: 10, orderBy: "", orderDirection: 1, isActive: true
+        ) {
+            customers { id firstName }
+            totalPages
+        }
+    }
+    """
+
+    employees_query = """
+    query ($firstname: String!, $email: String!) {
+        employeesSearch(
+            username: "", firstname: $firstname, lastname: "", middlename: "", mobile: "", email: $email,
+            page: 1, numberOfResults: 10, orderBy: "", orderDirection: 1, isActive: true
+        ) {
+            employees { id username }
+        }
+    }
+    """
+
+    def search_customers(self, firstname="", lastname="", mobile=""):
+        response = self.graphql(self.customers_query, {"firstname": firstname, "lastname": lastname, "mobile": mobile})
+        return [c["firstName"] for c in response.json()["data"]["customersSearch"]["customers"]]
+
+    def test_substring_matches_are_ranked(self):
+        Customer.objects.create(firstName="Johnny", lastName="Doe")
+        Customer.objects.create(firstName="Jack", lastName="Doe")
+
+        self.assertEqual(self.search_customers(firstname="john"), ["John", "Johnny"])
+        self.assertEqual(self.search_customers(firstname="ohn", lastname="doe"), ["John", "Johnny"])
+        self.assertEqual(self.search_customers(firstname="ja"), ["Jack"])
+
+    def test_gram_matching_several_tokens_still_matches(self):
+        irene = Customer.objects.create(firstName="Irene Irené", lastName="Haddad")
+        # What MySQL's accent-insensitive collation does: 'ene' also matches the 'ené' token
+        CustomerSearchToken.objects.filter(customer=irene, token="ené").update(token="ene")
+
+        self.assertEqual(self.search_customers(firstname="irene"), ["Irene Irené"])
+
+    def test_renamed_customer_is_reindexed(self):
+        self.customer.firstName = "Georges"
+        self.customer.save()
+
+        self.assertEqual(self.search_customers(firstname="john"), [])
+        self.assertEqual(self.search_customers(firstname="eorg"), ["Georges"])
+
+    def test_phone_match_returns_each_customer_once(self):
+        PhoneNumber.objects.create(address=self.address, mobile="+96170123456", priority=1)
+        PhoneNumber.objects.create(address=self.address, mobile="+96170123457", priority=2)
+
+        self.assertEqual(self.search_customers(mobile="70123"), ["John"])
+
+    def test_employee_search(self):
+        self.driver.first_name = "Elie"
+        self.driver.email = "elie@example.com"
+        self.driver.save()
+
+        response = self.graphql(self.employees_query, {"firstname": "eli", "email": "example"})
+        employees = response.json()["data"]["employeesSearch"]["employees"]
+        self.assertEqual([e["username"] for e in employees], ["driver"])
+
+    def test_partial_phone_matches_last_digits(self):
+        PhoneNumber.objects.create(address=self.address, mobile="+96170123456", priority=1)
+        other = Customer.objects.create(firstName="Landline", lastName="Owner")
+        Address.objects.create(customer=other, region="Tripoli", landline="06 998 877")
+
+        self.assertEqual(self.search_customers(mobile="3456"), ["John"])
+        self.assertEqual(self.search_customers(mobile="8877"), ["Landline"])
+        self.assertEqual(self.search_customers(mobile="06998"), ["Landline"])
+        self.assertEqual(self.search_customers(mobile="9999"), [])
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    query = "query ($id: Int!) { itemById(id: $id) { id name } }"
+
+    def setUp(self):
+        super().setUp()
+        documents.clear()
+
+    def post(self, body):
+        return self.client.post("/graphql/", data=body, content_type="application/json", **self.auth_header)
+
+    def persisted(self, sha256):
+        return {"persistedQuery": {"version": 1, "sha256Hash": sha256}}
+
+    def test_hash_alone_runs_a_known_document(self):
+        sha256 = hashlib.sha256(self.query.encode()).hexdigest()
+        variables = {"id": self.item.id}
+
+        response = self.post({"variables": variables, "extensions": self.persisted(sha256)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["message"], "PersistedQueryNotFound")
+
+        response = self.post({"query": self.query, "variables": variables, "extensions": self.persisted(sha256)})
+        self.assertEqual(response.json()["data"]["itemById"]["name"], "item 1")
+
+        response = self.post({"variables": variables, "extensions": self.persisted(sha256)})
+        self.assertEqual(response.json()["data"]["itemById"]["name"], "item 1")
+        self.assertEqual((documents.hits, documents.misses), (1, 1))
+
+    def test_plain_queries_are_validated_once(self):
+        for _ in range(3):
+            response = self.graphql(self.query, {"id": self.item.id})
+            self.assertEqual(response.json()["data"]["itemById"]["id"], str(self.item.id))
+        self.assertEqual((documents.hits, documents.misses), (2, 1))
+
+    def test_mismatched_or_invalid_documents_are_rejected(self):
+        response = self.post({"query": self.query, "extensions": self.persisted("0" * 64)})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.graphql("query { noSuchField }")
+        self.assertIn("errors", response.json())
+        self.assertEqual(len(documents.documents), 0)
+
+
+class ResponseCacheTests(GraphQLTestCase):
+    item_query = "query ($id: Int!) { itemById(id: $id) { id name stockQuantity } }"
+
+    def item_name(self):
+        response = self.graphql(self.item_query, {"id": self.item.id})
+        return response.json()["data"]["itemById"]
+
+    def test_repeated_field_is_served_from_cache(self):
+        before = response_cache.stats()["itemById"]
+        self.assertEqual(self.item_name()["name"], "item 1")
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.item_name()["name"], "item 1")
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        after = response_cache.stats()["itemById"]
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+
+    def test_writes_invalidate_cached_responses(self):
+        self.item_name()
+
+        self.item.name = "renamed"
+        self.item.save()
+        self.assertEqual(self.item_name()["name"], "renamed")
+
+        # Stock moves through a queryset update, which sends no signal
+        take_stock(self.item, 3)
+        self.assertEqual(self.item_name()["stockQuantity"], 7)
+
+    def test_selections_outside_the_field_models_are_not_cached(self):
+        query = "query ($id: Int!) { itemById(id: $id) { id orders { id quantity } } }"
+        self.graphql(query, {"id": self.item2.id})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.graphql(query, {"id": self.item2.id})
+        self.assertGreater(len(ctx.captured_queries), 0)
+        self.assertEqual(len(response.json()["data"]["itemById"]["orders"]), 1)
+
+
+class QueryStatsTests(GraphQLTestCase):
+    query = """
+    query Orders($startDate: Date!) {
+        paginatedOrders(startDate: $startDate) { orders { id } totalPages }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        query_stats.stats.clear()
+        self.start_date = timezone.localdate(self.order.orderedAt).isoformat()
+
+    def test_response_reports_its_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.graphql(self.query, {"startDate": self.start_date})
+
+        sql = response.json()["extensions"]["sql"]
+        self.assertEqual(sql["queries"], len(ctx.captured_queries))
+        self.assertEqual(len(sql["slowest"]), min(len(ctx.captured_queries), query_stats.SLOWEST_KEPT))
+        self.assertTrue(response["Server-Timing"].startswith("db;dur="))
+        self.assertIn(f'desc="{sql["queries"]} queries"', response["Server-Timing"])
+        # Paging counts the orders once, nothing else does
+        self.assertEqual(len([q for q in ctx.captured_queries if "COUNT" in q["sql"]]), 1)
+
+    def test_statements_and_fingerprints_are_for_superusers(self):
+        token = self.client.post(
+            reverse('login'), {'username': 'staff', 'password': 'staff_password'}, format='json'
+        ).data['access']
+        self.auth_header = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+        sql = self.graphql(self.query, {"startDate": self.start_date}).json()["extensions"]["sql"]
+        self.assertIn("queries", sql)
+        self.assertNotIn("slowest", sql)
+        self.assertNotIn("duplicates", sql)
+
+    def test_repeated_statements_are_fingerprinted(self):
+        for _ in range(3):
+            Order.objects.create(
+                customer=self.customer, user=self.admin_user, item=self.item, quantity=1,
+                address=self.address, liraRate=89000, driver=self.driver
+            )
+        profile = query_stats.QueryProfile()
+        with connection.execute_wrapper(profile):
+            # One customer query per order: the N+1 shape
+            names = [order.customer.firstName for order in Order.objects.all()]
+
+        duplicates = profile.duplicates()
+        self.assertEqual(duplicates[0]["count"], len(names))
+        self.assertIn('FROM "customer_customer"', duplicates[0]["fingerprint"])
+        # IN lists of different lengths share a fingerprint
+        self.assertEqual(
+            query_stats.fingerprint('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            query_stats.fingerprint('SELECT 1 WHERE id IN (%s,  %s)'),
+        )
+
+    def test_offenders_report(self):
+        self.graphql(self.query, {"startDate": self.start_date})
+        self.graphql(self.query, {"startDate": self.start_date})
+
+        response = self.client.get(reverse('query-stats'), **self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        report = {entry["endpoint"]: entry for entry in response.data["offenders"]}
+        entry = report["POST graphql query Orders"]
+        self.assertEqual(entry["requests"], 2)
+        self.assertGreater(entry["maxQueries"], 0)
+        self.assertIn("slowest", entry["worst"])
+
+        token = self.client.post(
+            reverse('login'), {'username': 'staff', 'password': 'staff_password'}, format='json'
+        ).data['access']
+        response = self.client.get(reverse('query-stats'), HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_offenders_cover_a_sliding_window(self):
+        def minute(ago, requests):
+            entry = {**query_stats.new_entry("GET api/items/"), "requests": requests, "queries": requests, "ms": requests}
+            bucket = query_stats.bucket_of(time.time() - ago)
+            cache.set(query_stats.bucket_key(bucket), {entry["endpoint"]: entry}, query_stats.WINDOW_SECONDS)
+
+        minute(ago=query_stats.WINDOW_SECONDS + 120, requests=100)
+        minute(ago=30 * 60, requests=3)
+        minute(ago=0, requests=2)
+
+        entry, = query_stats.offenders()
+        self.assertEqual((entry["requests"], entry["ms"]), (5, 5))
+
+
+@override_settings(GRAPHQL_TRACE_SAMPLE_RATE=0)
+class TracingTests(GraphQLTestCase):
+    query = "query Item($id: Int!) { itemById(id: $id) { name orders { id customer { firstName } } } }"
+
+    def traced(self, **headers):
+        return self.client.post(
+            "/graphql/", data={"query": self.query, "variables": {"id": self.item2.id}},
+            content_type="application/json", **headers
+        ).json()
+
+    def test_trace_header_returns_per_field_costs(self):
+        response = self.traced(HTTP_X_GRAPHQL_TRACE="1", **self.auth_header)
+        tracing = response["extensions"]["tracing"]
+        fields = {field["path"]: field for field in tracing["fields"]}
+
+        self.assertEqual(tracing["operation"], "graphql query Item")
+        # The root resolver prefetches the selected relations, so it issues all the SQL
+        self.assertEqual(fields["itemById"]["queries"], 2)
+        self.assertEqual(sum(field["queries"] for field in tracing["fields"]), 2)
+        orders = fields["itemById.orders"]
+        self.assertEqual(orders["parentType"], "ItemType")
+        self.assertEqual(orders["queries"], 0)
+        self.assertEqual(fields["itemById.orders.customer.firstName"]["calls"], 1)
+
+    def test_header_is_ignored_for_other_users(self):
+        token = self.client.post(
+            reverse('login'), {'username': 'staff', 'password': 'staff_password'}, format='json'
+        ).data['access']
+        response = self.traced(HTTP_X_GRAPHQL_TRACE="1", HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertNotIn("tracing", response["extensions"])
+
+    def test_sampled_traces_are_logged(self):
+        with tempfile.NamedTemporaryFile(suffix=".jsonl") as log:
+            with override_settings(GRAPHQL_TRACE_SAMPLE_RATE=1, GRAPHQL_TRACE_LOG=log.name):
+                response = self.traced(**self.auth_header)
+            self.assertNotIn("tracing", response["extensions"])
+
+            traces = [json.loads(line) for line in open(log.name)]
+        self.assertEqual(len(traces), 1)
+        self.assertEqual(traces[0]["operation"], "graphql query Item")
+        self.assertIn("itemById.orders", [field["path"] for field in traces[0]["fields"]])
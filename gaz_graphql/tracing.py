@@ -0,0 +1,112 @@
+import json
+import random
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+from backend.query_stats import current_profile
+
+# Sent by a superuser's client to get the trace back in extensions.tracing
+TRACE_HEADER = 'HTTP_X_GRAPHQL_TRACE'
+
+_log_lock = threading.Lock()
+
+
+class Tracer:
+    """
+    Time and SQL spent in each field of one operation. Fields are keyed by
+    their path without list indices, so the orders of 50 customers add up to
+    a single `customersSearch.customers.orders` entry.
+    """
+
+    def __init__(self, exposed):
+        self.exposed = exposed
+        self.operation = None
+        self.started = time.perf_counter()
+        self.fields = {}
+
+    def record(self, info, duration, queries, sql_duration):
+        path = '.'.join(key for key in info.path.as_list() if isinstance(key, str))
+        entry = self.fields.get(path)
+        if entry is None:
+            entry = self.fields[path] = {
+                'path': path,
+                'parentType': info.parent_type.name,
+                'fieldName': info.field_name,
+                'calls': 0,
+                'duration': 0.0,
+                'queries': 0,
+                'sqlDuration': 0.0,
+            }
+        entry['calls'] += 1
+        entry['duration'] += duration
+        entry['queries'] += queries
+        entry['sqlDuration'] += sql_duration
+
+    def result(self):
+        """The trace, costliest fields first."""
+        fields = sorted(self.fields.values(), key=lambda entry: entry['duration'], reverse=True)
+        return {
+            'operation': self.operation,
+            'ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'fields': [
+                {
+                    'path': entry['path'],
+                    'parentType': entry['parentType'],
+                    'fieldName': entry['fieldName'],
+                    'calls': entry['calls'],
+                    'ms': round(entry['duration'] * 1000, 2),
+                    'queries': entry['queries'],
+                    'sqlMs': round(entry['sqlDuration'] * 1000, 2),
+                }
+                for entry in fields
+            ],
+        }
+
+
+def tracer_for(request):
+    """
+    A Tracer when this request should be traced, else None: always when a
+    superuser sends the trace header (or DEBUG is on), otherwise for a
+    GRAPHQL_TRACE_SAMPLE_RATE share of requests, which are only logged.
+    """
+    if request.META.get(TRACE_HEADER):
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user and user.is_superuser):
+            return Tracer(exposed=True)
+
+    if random.random() < settings.GRAPHQL_TRACE_SAMPLE_RATE:
+        return Tracer(exposed=False)
+    return None
+
+
+def log_trace(tracer):
+    """Append a sampled trace to GRAPHQL_TRACE_LOG, one JSON object per line."""
+    line = json.dumps({'at': timezone.now().isoformat(), **tracer.result()})
+    with _log_lock:
+        with open(settings.GRAPHQL_TRACE_LOG, 'a') as log:
+            log.write(line + '\n')
+
+
+class TracingMiddleware:
+    """
+    Graphene middleware timing every resolver of a traced request. Resolvers
+    run one at a time, so the queries the request's QueryProfile counted
+    during a call were issued by that field.
+    """
+
+    def resolve(self, next, root, info, **args):
+        tracer = getattr(info.context, 'tracer', None)
+        if tracer is None:
+            return next(root, info, **args)
+
+        profile = current_profile()
+        queries, sql_duration = (profile.count, profile.duration) if profile else (0, 0.0)
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            duration = time.perf_counter() - start
+            if profile:
+                queries, sql_duration = profile.count - queries, profile.duration - sql_duration
+            tracer.record(info, duration, queries, sql_duration)
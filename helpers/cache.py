@@ -0,0 +1,38 @@
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+
+
+def shared_version(key):
+    """
+    Current version stamp of `key` in the shared cache. Processes compare it
+    with the stamp they loaded a value under to know whether it is stale.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Mark every copy loaded under the previous stamp of `key` as stale."""
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def model_version_key(model):
+    return f'model-version:{model._meta.label_lower}'
+
+
+def model_version(model):
+    """Stamp that changes whenever a row of `model` is written, see invalidate_model."""
+    return shared_version(model_version_key(model))
+
+
+def invalidate_model(model):
+    """
+    Mark everything cached from `model` as stale. Called from signals, and
+    directly after queryset updates, which send none.
+    """
+    bump_version(model_version_key(model))
+    transaction.on_commit(lambda: bump_version(model_version_key(model)))
@@ -0,0 +1,100 @@
+import json
+import re
+import statistics
+import time
+import urllib.error
+import urllib.request
+from django.test import Client
+from user.models import User
+from user.serializers import CustomTokenObtainPairSerializer
+
+# Set by backend.query_stats.QueryStatsMiddleware on every response
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def superuser_token(username=None):
+    """An access token for `username`, or the first active superuser. None if there is no such superuser."""
+    users = User.objects.filter(is_superuser=True, is_active=True)
+    user = users.filter(username=username).first() if username else users.order_by('id').first()
+    if user is None:
+        return None
+    return str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+
+
+class LoadClient:
+    """
+    Sends requests as one authenticated user, either in process through
+    Django's test client or to a running server at `base_url`. The in
+    process client is not thread safe; use one per thread.
+    """
+
+    def __init__(self, token, base_url=None):
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.client = None if base_url else Client(raise_request_exception=False)
+
+    def send(self, method, path, body=None):
+        """Returns (status, milliseconds, queries run or None). JSON bodies only."""
+        start = time.perf_counter()
+        if self.base_url:
+            status, timing = self.send_http(method, path, body)
+        else:
+            data = json.dumps(body) if body is not None else ''
+            response = self.client.generic(method, path, data, content_type='application/json', headers=self.headers)
+            status, timing = response.status_code, response.headers.get('Server-Timing', '')
+        elapsed = (time.perf_counter() - start) * 1000
+
+        queries = QUERIES.search(timing or '')
+        return status, elapsed, int(queries.group(1)) if queries else None
+
+    def send_http(self, method, path, body):
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(body).encode() if body is not None else None, method=method,
+            headers={**self.headers, 'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get('Server-Timing', '')
+        except urllib.error.URLError:
+            return 0, ''
+
+
+def percentile(sorted_values, share):
+    index = min(len(sorted_values) - 1, int(round(share * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(results):
+    """Latency percentiles of the successful (status, ms, queries) results, plus error and query counts."""
+    timings = sorted(elapsed for status, elapsed, _ in results if 200 <= status < 400)
+    queries = [count for status, _, count in results if count is not None]
+    summary = {
+        'ok': len(timings),
+        'errors': len(results) - len(timings),
+        'queries': round(statistics.mean(queries), 1) if queries else None,
+    }
+    if timings:
+        summary.update({
+            'p50': percentile(timings, 0.50),
+            'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99),
+            'max': timings[-1],
+        })
+    return summary
+
+
+def header(title):
+    return f"{title:<40}{'ok':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'queries':>9}"
+
+
+def summary_line(name, summary):
+    queries = '-' if summary['queries'] is None else f"{summary['queries']:.1f}"
+    if not summary['ok']:
+        return f"{name:<40}{0:>6}{summary['errors']:>8}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{queries:>9}"
+    return (
+        f"{name:<40}{summary['ok']:>6}{summary['errors']:>8}"
+        f"{summary['p50']:>10.1f}{summary['p95']:>10.1f}{summary['p99']:>10.1f}{summary['max']:>10.1f}{queries:>9}"
+    )
@@ -0,0 +1,55 @@
+import re
+from django.db.models import Q
+
+# Numbers typed without a country code are Lebanese
+DEFAULT_COUNTRY_CODE = '961'
+LOCAL_NUMBER_LENGTH = 8
+
+
+def normalize_phone(number):
+    """
+    Reduce a phone number to its E.164 digits without the '+'.
+
+    '+961 70 123 456', '0096170123456', '70/123456' and '070123456' all become
+    '96170123456', so a caller ID can be matched with a plain equality lookup.
+    """
+    if not number:
+        return ''
+
+    number = number.strip()
+    international = number.startswith('+') or number.startswith('00')
+    digits = re.sub(r'\D', '', number)
+
+    if number.startswith('00'):
+        digits = digits[2:]
+    elif not international:
+        # Drop the national trunk prefix and add the default country code
+        digits = digits.lstrip('0')
+        if digits and len(digits) <= LOCAL_NUMBER_LENGTH:
+            digits = DEFAULT_COUNTRY_CODE + digits
+
+    return digits
+
+
+def reverse_digits(digits):
+    """Reversed digits, so a 'number ends with' search becomes a prefix search."""
+    return digits[::-1]
+
+
+def partial_phone_q(digits_field, reversed_field, term):
+    """
+    Match numbers that end with the typed digits, or start with them once
+    normalized. Both are prefix LIKEs, which an index range scan can serve,
+    unlike the leading-wildcard icontains it replaces.
+    """
+    digits = re.sub(r'\D', '', term or '')
+    if not digits:
+        # Nothing a phone number could match
+        return Q(pk__in=[])
+
+    # istartswith rather than startswith: on MySQL the latter is LIKE BINARY,
+    # which does not use the column's index
+    return (
+        Q(**{f'{reversed_field}__istartswith': reverse_digits(digits)}) |
+        Q(**{f'{digits_field}__istartswith': normalize_phone(term)})
+    )
@@ -0,0 +1,79 @@
+from django.db.models import Count, Q, Case, When, Value, IntegerField
+
+TOKEN_SIZE = 3
+
+
+def trigrams(text):
+    """Case-folded 3-character windows of `text`."""
+    text = (text or '').casefold()
+    return {text[i:i + TOKEN_SIZE] for i in range(len(text) - TOKEN_SIZE + 1)}
+
+
+def build_tokens(token_model, owner_field, owner, fields):
+    """
+    Token rows for `owner`, one per distinct trigram of each indexed field.
+    `fields` maps the field key stored on the token to the text to index.
+    """
+    return [
+        token_model(**{owner_field: owner}, field=field, token=token)
+        for field, text in fields.items()
+        for token in trigrams(text)
+    ]
+
+
+def index_tokens(token_model, owner_field, owner, fields):
+    """Replace the search tokens of a single owner, e.g. from a post_save signal."""
+    token_model.objects.filter(**{owner_field: owner}).delete()
+    token_model.objects.bulk_create(build_tokens(token_model, owner_field, owner, fields))
+
+
+def filter_by_tokens(queryset, token_model, owner_field, terms):
+    """
+    Restrict `queryset` to rows whose fields contain every term.
+
+    Terms of at least TOKEN_SIZE characters are first narrowed through the
+    token table, which only needs index lookups; the icontains filters then
+    run on that small candidate set to drop trigram false positives. Shorter
+    terms cannot use the index and fall back to a plain icontains.
+    """
+    terms = {field: text for field, text in terms.items() if text}
+
+    grams = Q()
+    wanted = 0
+    for field, text in terms.items():
+        field_grams = trigrams(text)
+        if field_grams:
+            grams |= Q(field=field, token__in=field_grams)
+            wanted += len(field_grams)
+
+    if wanted:
+        owner_ids = (
+            token_model.objects
+            .filter(grams)
+            .values(owner_field)
+            .annotate(hits=Count('id'))
+            # At least: under an accent-insensitive collation one searched gram can match
+            # several token rows ('ene' and 'ené'); the icontains pass drops what slips through
+            .filter(hits__gte=wanted)
+            .values(owner_field)
+        )
+        queryset = queryset.filter(pk__in=owner_ids)
+
+    for field, text in terms.items():
+        queryset = queryset.filter(**{f'{field}__icontains': text})
+
+    return queryset
+
+
+def rank_by_terms(queryset, terms):
+    """Order exact matches first, then prefix matches, then the rest."""
+    score = Value(0)
+    for field, text in terms.items():
+        if text:
+            score = score + Case(
+                When(**{f'{field}__iexact': text}, then=Value(2)),
+                When(**{f'{field}__istartswith': text}, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+    return queryset.annotate(rank=score).order_by('-rank', 'pk')
@@ -0,0 +1,146 @@
+"""
+Storage for files too big to hold in memory, such as database backups: a
+GCS bucket when USE_GCS is on, a local directory otherwise and in tests.
+Both read and write in chunks, so nothing is staged on disk before an
+upload.
+"""
+import io
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from google.api_core.exceptions import GoogleAPICallError, NotFound
+from google.cloud import storage
+
+StoredFile = namedtuple('StoredFile', 'name size updated')
+
+# Upload chunk size; GCS wants a multiple of 256 KiB
+CHUNK_SIZE = 8 * 1024 * 1024
+# Blob deletes in flight at once from one GCSStorage
+DELETE_THREADS = 16
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, name):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"{name} is outside {self.root}")
+        return path
+
+    def open(self, name, mode='rb'):
+        if mode == 'rb':
+            return open(self.path(name), 'rb')
+        if mode == 'wb':
+            return _LocalWriter(self.path(name))
+        raise ValueError(f"Unsupported mode {mode}")
+
+    def list(self, prefix=''):
+        """Files whose name starts with `prefix`, in name order."""
+        found = []
+        for directory, _, files in os.walk(self.root):
+            for file in files:
+                path = os.path.join(directory, file)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if name.startswith(prefix) and not name.endswith(_LocalWriter.SUFFIX):
+                    stat = os.stat(path)
+                    found.append(StoredFile(name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, dt_timezone.utc)))
+        return iter(sorted(found))
+
+    def delete(self, names):
+        """Delete `names`; returns those that are gone, including any that already were."""
+        deleted = []
+        for name in names:
+            path = self.path(name)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            deleted.append(name)
+            # Drop directories left empty, as a bucket has none
+            directory = os.path.dirname(path)
+            while directory != self.root:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+        return deleted
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+
+class _LocalWriter(io.FileIO):
+    """Writes next to `path` and moves there on close, so readers never see a partial file."""
+    SUFFIX = '.part'
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.final_path = path
+        super().__init__(path + self.SUFFIX, 'wb')
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            os.replace(self.name, self.final_path)
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            super().close()
+            os.remove(self.name)
+        return False
+
+
+class GCSStorage:
+    def __init__(self, bucket_name, client=None):
+        client = client or storage.Client(credentials=getattr(settings, 'GS_CREDENTIALS', None))
+        self.bucket = client.bucket(bucket_name)
+
+    def open(self, name, mode='rb'):
+        blob = self.bucket.blob(name)
+        if mode == 'rb':
+            return blob.open('rb', chunk_size=CHUNK_SIZE)
+        if mode == 'wb':
+            # A resumable upload sent CHUNK_SIZE at a time; a failed chunk is retried, not the whole file
+            return blob.open('wb', chunk_size=CHUNK_SIZE, ignore_flush=True)
+        raise ValueError(f"Unsupported mode {mode}")
+
+    def list(self, prefix=''):
+        """Files whose name starts with `prefix`, fetched a page at a time."""
+        for blob in self.bucket.list_blobs(prefix=prefix, page_size=1000):
+            yield StoredFile(blob.name, blob.size, blob.updated)
+
+    def delete(self, names):
+        """
+        Delete `names`; returns those that are gone, including any that
+        already were. Names whose delete failed (403, 429, 5xx...) are left out.
+        """
+        def delete_one(name):
+            try:
+                self.bucket.delete_blob(name)
+            except NotFound:
+                pass
+            except GoogleAPICallError:
+                return None
+            return name
+
+        # One request per blob, so each failure is known; a batch request
+        # only reports its outcomes through private attributes
+        with ThreadPoolExecutor(max_workers=DELETE_THREADS) as pool:
+            return [name for name in pool.map(delete_one, names) if name is not None]
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists()
+
+
+def storage_for(local_root):
+    """The GCS bucket when USE_GCS is on, else a LocalStorage under `local_root`."""
+    if settings.USE_GCS:
+        return GCSStorage(settings.GS_BUCKET_NAME)
+    return LocalStorage(local_root)
@@ -6,10 +6,21 @@ from order.models import Order, ExchangeRate
 from user.models import User
 from customer.models import Customer, Address
 from helpers.util import create_dummy_image
+from unittest.mock import patch
 
 
 class BaseTestCase(APITestCase):
+    # A replica mirrors the test database over another connection, which cannot
+    # see the rows of a test's transaction, so reads stay on the primary unless
+    # a test commits its rows for the replica (see order.tests.ReplicaRoutingTests)
+    read_replica = False
+
     def setUp(self):
+        if not self.read_replica:
+            primary_only = patch('backend.db_router.is_pinned', return_value=True)
+            primary_only.start()
+            self.addCleanup(primary_only.stop)
+
         # Create an admin user
         self.admin_user = User.objects.create_user(
             username='admin', password='adminpass', is_staff=True, is_superuser=True
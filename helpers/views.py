@@ -2,9 +2,18 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from user.authentication import CachedJWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from graphene_django.views import GraphQLView
+from django.conf import settings
+from django.http.response import HttpResponseBadRequest
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, get_operation_ast
+from gaz_graphql.loaders import LoaderRegistry
+from gaz_graphql.persisted import documents, persisted_hash, query_hash
+from gaz_graphql import response_cache
+from gaz_graphql.tracing import tracer_for, log_trace
+from backend.query_stats import current_profile
 
 class BaseView(APIView):
     Serializer = None
@@ -65,10 +74,9 @@ class BaseView(APIView):
 
 
 class DRFJWTGraphQLView(GraphQLView):
-    def get_context(self, request):
-        context = super().get_context(request)
-        jwt_auth = JWTAuthentication()
-        
+    def authenticate(self, request):
+        jwt_auth = CachedJWTAuthentication()
+
         try:
             user_auth_tuple = jwt_auth.authenticate(request)
             if user_auth_tuple is not None:
@@ -77,5 +85,102 @@ class DRFJWTGraphQLView(GraphQLView):
                 request.user = None
         except AuthenticationFailed:
             pass
-        
+
+    def get_context(self, request):
+        context = super().get_context(request)
+
+        # Fresh loaders per request so batched relations never leak across users
+        context.loaders = LoaderRegistry()
+        context.tracer = tracer_for(request)
+        if context.tracer is not None:
+            context.tracer.operation = getattr(request, 'graphql_label', None)
+
         return context
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+
+        # Persisted queries: the client may send only the hash of a document
+        # the server has seen, and sends the full text when told it is unknown
+        sha256 = persisted_hash(data, request)
+        if sha256:
+            if query and query_hash(query) != sha256:
+                raise HttpError(HttpResponseBadRequest(), "provided sha does not match query")
+            query = query or documents.query_for(sha256)
+            if not query:
+                raise HttpError(HttpResponseBadRequest(), "PersistedQueryNotFound")
+
+        return query, variables, operation_name, id
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """
+        GraphQLView.execute_graphql_request, with validation served from the
+        document cache, the operation labelled for query stats and tracing,
+        and opt-in fields answered from the response cache.
+        """
+        self.authenticate(request)
+        if not query:
+            return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+
+        schema = self.schema.graphql_schema
+        document, errors = documents.get(
+            schema, query, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS
+        )
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+        # The view is built per request and the document already passed these
+        # rules, so graphene only parses it again
+        self.validation_rules = ()
+
+        operation_ast = get_operation_ast(document, operation_name)
+        request.graphql_label = self.operation_label(operation_ast)
+        profile = current_profile()
+        if profile is not None:
+            profile.label = request.graphql_label
+
+        cache_key = response_cache.cache_key(request, schema, document, operation_ast, query, variables)
+        if cache_key:
+            cached = response_cache.lookup(cache_key)
+            if cached is not None:
+                return ExecutionResult(data=cached)
+
+        result = super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        if cache_key and result is not None and not result.errors:
+            response_cache.store(cache_key, result.data)
+        return result
+
+    def operation_label(self, operation_ast):
+        """Name GraphQL requests per operation rather than all under /graphql/."""
+        if operation_ast is None:
+            return None
+        name = operation_ast.name.value if operation_ast.name else '+'.join(
+            selection.name.value for selection in operation_ast.selection_set.selections
+            if hasattr(selection, 'name')
+        )
+        return f"graphql {operation_ast.operation.value} {name}"
+
+    def get_response(self, request, data, show_graphiql=False):
+        result, status_code = super().get_response(request, data, show_graphiql)
+
+        tracer = getattr(request, 'tracer', None)
+        if tracer is not None and not tracer.exposed:
+            log_trace(tracer)
+        return result, status_code
+
+    def json_encode(self, request, d, pretty=False):
+        extensions = dict(d.get('extensions', {}))
+
+        profile = current_profile()
+        if profile is not None:
+            # Statements and fingerprints reveal the schema, so only superusers see them
+            user = getattr(request, 'user', None)
+            detailed = settings.DEBUG or bool(user and user.is_superuser)
+            extensions['sql'] = profile.summary(detailed)
+
+        tracer = getattr(request, 'tracer', None)
+        if tracer is not None and tracer.exposed:
+            extensions['tracing'] = tracer.result()
+
+        if extensions:
+            d = {**d, 'extensions': extensions}
+        return super().json_encode(request, d, pretty)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from item.stock import snapshot_stock
+
+
+class Command(BaseCommand):
+    help = "Records a stock snapshot of every item. Run periodically (e.g. nightly) to bound point-in-time queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Snapshot rows inserted per query')
+
+    def handle(self, *args, **options):
+        created = snapshot_stock(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recorded {created} stock snapshots'))
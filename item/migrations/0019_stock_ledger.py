@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def snapshot_existing_stock(apps, schema_editor):
+    # The ledger starts empty, so point-in-time queries start from this snapshot
+    db = schema_editor.connection.alias
+    Item = apps.get_model('item', 'Item')
+    StockSnapshot = apps.get_model('item', 'StockSnapshot')
+    taken_at = django.utils.timezone.now()
+    StockSnapshot.objects.using(db).bulk_create([
+        StockSnapshot(item_id=pk, takenAt=taken_at, stockQuantity=quantity, buyPrice=buy_price)
+        for pk, quantity, buy_price in Item.objects.using(db).values_list('pk', 'stockQuantity', 'buyPrice')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('item', '0018_alter_item_stockquantity'),
+        ('order', '0019_receipt_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('order', 'Order'), ('cancel', 'Cancel'), ('restock', 'Restock'), ('adjust', 'Manual adjustment')], max_length=10)),
+                ('quantity', models.IntegerField()),
+                ('createdAt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='item.item')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='order.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'createdAt'], name='item_stockm_item_id_469f61_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('takenAt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('stockQuantity', models.IntegerField()),
+                ('buyPrice', models.FloatField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='item.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'takenAt'], name='item_stocks_item_id_9fe694_idx')],
+            },
+        ),
+        migrations.RunPython(snapshot_existing_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('item', '0019_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('item', '0020_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='lastMovementId',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
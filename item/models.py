@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 # Create your models here.
 class Item(models.Model):
@@ -13,6 +14,7 @@ class Item(models.Model):
     isActive = models.BooleanField(default=True, db_index=True)
     buyPrice = models.FloatField(blank=False, null=False, validators=[MinValueValidator(0.01)], db_index=True)
     tva = models.BooleanField(default=False, db_index=True)
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         indexes = [
@@ -38,4 +40,48 @@ class Source(models.Model):
         
     def __str__(self):
         return f"Source: {self.name} for {self.item.name}: ${self.price}"
-    
\ No newline at end of file
+
+
+class StockMovement(models.Model):
+    """Append-only ledger of every change to Item.stockQuantity, see item.stock."""
+    ORDER = 'order'
+    CANCEL = 'cancel'
+    RESTOCK = 'restock'
+    ADJUST = 'adjust'
+    KIND_CHOICES = [
+        (ORDER, 'Order'),
+        (CANCEL, 'Cancel'),
+        (RESTOCK, 'Restock'),
+        (ADJUST, 'Manual adjustment'),
+    ]
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='movements')
+    order = models.ForeignKey('order.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Signed: negative when units leave the stock
+    quantity = models.IntegerField()
+    createdAt = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'createdAt']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity:+d} {self.item.name}"
+
+
+class StockSnapshot(models.Model):
+    """Stock and buy price of an item at a point in time, taken by the snapshot_stock command."""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='snapshots')
+    takenAt = models.DateTimeField(default=timezone.now)
+    stockQuantity = models.IntegerField()
+    buyPrice = models.FloatField()
+    # Highest StockMovement id already counted in stockQuantity; null on
+    # snapshots from before it was recorded, which fall back to takenAt
+    lastMovementId = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'takenAt']),
+        ]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Item, Source
+from django.db import transaction
+from .models import Item, Source, StockMovement
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from helpers.serializers import BaseSerializer
 
@@ -45,7 +46,7 @@ class ItemSerializer(serializers.ModelSerializer):
         print(f"I GOT STOCK AS {stock_quantity}")
 
         if user and user.is_superuser:
-            if int(stock_quantity) < 0:
+            if stock_quantity is not None and int(stock_quantity) < 0:
                 raise ValidationError({
                     'stockQuantity': "Ensure the stock quantity is more than zero!"
                 })
@@ -70,7 +71,25 @@ class ItemSerializer(serializers.ModelSerializer):
             if 'buyPrice' in validated_data and validated_data['buyPrice'] != instance.buyPrice:
                 raise PermissionDenied("Only superusers can modify the buy price.")
 
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            # Lock the row so the ledger records the change from the stock orders left behind
+            current = Item.objects.select_for_update().values_list('stockQuantity', flat=True).get(pk=instance.pk)
+            # The view read `instance` before the lock; orders taken since must not be written over
+            instance.stockQuantity = current
+            item = super().update(instance, validated_data)
+
+            change = item.stockQuantity - current if 'stockQuantity' in validated_data else 0
+            if change:
+                kind = StockMovement.RESTOCK if change > 0 else StockMovement.ADJUST
+                StockMovement.objects.create(item=item, kind=kind, quantity=change)
+        return item
+
+    @transaction.atomic
+    def create(self, validated_data):
+        item = super().create(validated_data)
+        if item.stockQuantity:
+            StockMovement.objects.create(item=item, kind=StockMovement.RESTOCK, quantity=item.stockQuantity)
+        return item
 
 class SourceSerializer(serializers.ModelSerializer):
     class Meta:
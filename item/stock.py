@@ -0,0 +1,143 @@
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum, OuterRef, Subquery
+from django.utils import timezone
+from rest_framework import serializers
+from helpers.cache import invalidate_model
+from .models import Item, StockMovement, StockSnapshot
+
+
+def take_stock(item, quantity, kind=StockMovement.ORDER, order=None):
+    """
+    Remove `quantity` units with a single conditional UPDATE, so concurrent
+    orders can neither lose an update nor oversell. Raises a ValidationError
+    when the item does not have enough units left.
+
+    Returns the unsaved ledger entry for the change (None when nothing
+    moved); callers write theirs together with record_movements.
+    """
+    if quantity <= 0:
+        return give_back_stock(item, -quantity, kind, order)
+
+    updated = (
+        Item.objects
+        .filter(pk=item.pk, stockQuantity__gte=quantity)
+        .update(stockQuantity=F('stockQuantity') - quantity, updatedAt=timezone.now())
+    )
+
+    item.refresh_from_db(fields=['stockQuantity'])
+    if not updated:
+        raise serializers.ValidationError(
+            {'quantity': f"Only {item.stockQuantity} units available in stock."}
+        )
+    # A queryset update sends no post_save
+    invalidate_model(Item)
+    return StockMovement(item=item, order=order, kind=kind, quantity=-quantity)
+
+
+def give_back_stock(item, quantity, kind=StockMovement.CANCEL, order=None):
+    """Return `quantity` units, e.g. when an order is cancelled or reduced."""
+    if quantity == 0:
+        return None
+
+    Item.objects.filter(pk=item.pk).update(stockQuantity=F('stockQuantity') + quantity, updatedAt=timezone.now())
+    item.refresh_from_db(fields=['stockQuantity'])
+    invalidate_model(Item)
+    return StockMovement(item=item, order=order, kind=kind, quantity=quantity)
+
+
+def record_movements(movements, order=None):
+    """Write the ledger entries of one operation in a single INSERT."""
+    movements = [movement for movement in movements if movement is not None]
+    if order is not None:
+        for movement in movements:
+            movement.order = order
+    StockMovement.objects.bulk_create(movements)
+    return movements
+
+
+def snapshot_stock(batch_size=500):
+    """
+    Record the current stock and buy price of every item. Point-in-time
+    queries start from the latest snapshot, so they only scan the ledger
+    entries written since.
+
+    Stock only moves with the item row locked, so holding every row lock
+    waits out the operations in flight and keeps new ones from starting:
+    the quantities read and the ledger up to the highest id describe the
+    same moment.
+    """
+    with transaction.atomic():
+        rows = list(Item.objects.select_for_update().values_list('pk', 'stockQuantity', 'buyPrice'))
+        last_movement = StockMovement.objects.aggregate(last=Max('id'))['last'] or 0
+        taken_at = timezone.now()
+        snapshots = [
+            StockSnapshot(
+                item_id=pk, takenAt=taken_at, stockQuantity=quantity, buyPrice=buy_price,
+                lastMovementId=last_movement,
+            )
+            for pk, quantity, buy_price in rows
+        ]
+        StockSnapshot.objects.bulk_create(snapshots, batch_size=batch_size)
+    return len(snapshots)
+
+
+def inventory_at(when, items=None):
+    """
+    Stock and valuation (quantity * buy price) of each item at `when`.
+
+    Starts from each item's latest snapshot taken at or before `when` and adds
+    the ledger entries in between. An item with no such snapshot is replayed
+    from the start of its ledger, which is exact for items created after the
+    ledger was introduced (older items got a snapshot when it was).
+    """
+    items = items if items is not None else Item.objects.all()
+
+    latest = (
+        StockSnapshot.objects
+        .filter(item=OuterRef('pk'), takenAt__lte=when)
+        .order_by('-takenAt', '-id')
+        .values('id')[:1]
+    )
+    rows = list(
+        items
+        .annotate(snapshot_id=Subquery(latest))
+        .values('pk', 'name', 'buyPrice', 'snapshot_id')
+        .order_by('name', 'pk')
+    )
+
+    snapshots = StockSnapshot.objects.in_bulk([row['snapshot_id'] for row in rows if row['snapshot_id']])
+
+    # One range per item; entries are matched to a snapshot by id, as a
+    # movement's createdAt is stamped before its transaction commits
+    ranges = Q(pk__in=[])
+    for row in rows:
+        snapshot = snapshots.get(row['snapshot_id'])
+        if snapshot and snapshot.lastMovementId is not None:
+            ranges |= Q(item_id=row['pk'], pk__gt=snapshot.lastMovementId)
+        elif snapshot:
+            ranges |= Q(item_id=row['pk'], createdAt__gt=snapshot.takenAt)
+        else:
+            ranges |= Q(item_id=row['pk'])
+
+    moved = dict(
+        StockMovement.objects
+        .filter(ranges, createdAt__lte=when)
+        .values('item_id')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+        .values_list('item_id', 'total')
+    )
+
+    inventory = []
+    for row in rows:
+        snapshot = snapshots.get(row['snapshot_id'])
+        quantity = (snapshot.stockQuantity if snapshot else 0) + (moved.get(row['pk']) or 0)
+        buy_price = snapshot.buyPrice if snapshot else row['buyPrice']
+        inventory.append({
+            'item': row['pk'],
+            'name': row['name'],
+            'stockQuantity': quantity,
+            'buyPrice': buy_price,
+            'value': round(quantity * buy_price, 2),
+        })
+    return inventory
@@ -1,7 +1,17 @@
 from django.urls import reverse
 from rest_framework import status
-from .models import Item, Source
+from .models import Item, Source, StockMovement, StockSnapshot
 from helpers.tests import BaseTestCase,  GraphQLTestCase
+import threading
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from unittest import skipIf
+from rest_framework.exceptions import ValidationError
+from .serializers import ItemSerializer
+from .stock import take_stock, record_movements, snapshot_stock, inventory_at
+from types import SimpleNamespace
+from datetime import timedelta
+from django.utils import timezone
 
 class ItemTestCase(BaseTestCase):
     def test_create_item(self):
@@ -146,4 +156,139 @@ class SourceTestCase(BaseTestCase):
 #         response = self.graphql(query)
 #         self.assertEqual(response.status_code, status.HTTP_200_OK)
     
-    
\ No newline at end of file
+    
+
+class StockLedgerTestCase(BaseTestCase):
+    def order_data(self, quantity):
+        return {
+            "customer": self.customer.id,
+            "item": self.item.id,
+            "quantity": quantity,
+            "address": self.address.id,
+            "liraRate": 89000,
+            "driver": self.driver.id
+        }
+
+    def test_order_lifecycle_is_recorded(self):
+        response = self.client.post(reverse('add-order'), self.order_data(3), format='json', **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order_id = response.data['id']
+
+        url = reverse('edit-order', args=[order_id])
+        response = self.client.put(url, self.order_data(5), format='json', **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.delete(url, **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        movements = list(StockMovement.objects.filter(item=self.item).order_by('id').values_list('kind', 'quantity', 'order_id'))
+        self.assertEqual(movements, [
+            (StockMovement.ORDER, -3, order_id),
+            (StockMovement.ORDER, -2, order_id),
+            (StockMovement.CANCEL, 5, order_id),
+        ])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.stockQuantity, 10)
+
+    def test_item_form_records_restock_and_adjustment(self):
+        url = reverse('edit-item', args=[self.item.id])
+        data = {"name": "item 1", "stockQuantity": 25, "price": 5, "type": "type 1", "buyPrice": 2}
+        self.client.put(url, data, format='json', **self.auth_header)
+        data["stockQuantity"] = 20
+        self.client.put(url, data, format='json', **self.auth_header)
+
+        movements = list(StockMovement.objects.filter(item=self.item).order_by('id').values_list('kind', 'quantity'))
+        self.assertEqual(movements, [(StockMovement.RESTOCK, 15), (StockMovement.ADJUST, -5)])
+
+    def test_edit_without_stock_keeps_concurrent_orders(self):
+        loaded = Item.objects.get(pk=self.item.pk)
+        # An order placed between the view loading the item and saving it
+        record_movements([take_stock(Item.objects.get(pk=self.item.pk), 3)])
+
+        serializer = ItemSerializer(
+            loaded, data={"name": "item 1", "price": 6, "type": "type 1", "buyPrice": 2},
+            context={'request': SimpleNamespace(user=self.admin_user)},
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.stockQuantity, self.item.price), (7, 6))
+        movements = list(StockMovement.objects.filter(item=self.item).values_list('kind', 'quantity'))
+        self.assertEqual(movements, [(StockMovement.ORDER, -3)])
+
+    def test_inventory_at_replays_from_latest_snapshot(self):
+        start = timezone.now() - timedelta(days=10)
+        StockSnapshot.objects.create(item=self.item, takenAt=start, stockQuantity=10, buyPrice=2)
+        StockSnapshot.objects.create(item=self.item, takenAt=start + timedelta(days=5), stockQuantity=4, buyPrice=3)
+        for day, quantity in [(1, -2), (3, -4), (6, 6), (8, -1)]:
+            StockMovement.objects.create(
+                item=self.item, kind=StockMovement.ORDER, quantity=quantity, createdAt=start + timedelta(days=day)
+            )
+
+        def stock(when):
+            return {row['item']: row for row in inventory_at(when)}[self.item.id]
+
+        self.assertEqual(stock(start + timedelta(days=2))['stockQuantity'], 8)
+        self.assertEqual(stock(start + timedelta(days=4))['stockQuantity'], 4)
+        at_seven = stock(start + timedelta(days=7))
+        self.assertEqual(at_seven['stockQuantity'], 10)
+        self.assertEqual(at_seven['value'], 30)
+        self.assertEqual(stock(start + timedelta(days=9))['stockQuantity'], 9)
+
+    def test_movement_stamped_before_snapshot_is_replayed(self):
+        snapshot_stock()
+        # Stamped before the snapshot (waiting on the row lock, or by a
+        # server with a slower clock) but only applied after it
+        late = take_stock(self.item, 3)
+        late.createdAt = timezone.now() - timedelta(minutes=1)
+        record_movements([late])
+
+        self.item.refresh_from_db()
+        row = {row['item']: row for row in inventory_at(timezone.now())}[self.item.id]
+        self.assertEqual(row['stockQuantity'], self.item.stockQuantity)
+
+    def test_snapshot_then_stock_at_view(self):
+        snapshot_stock()
+        take_stock(self.item, 4).save()
+
+        response = self.client.get(reverse('stock-at'), {'at': timezone.now().isoformat()}, **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row['item']: row for row in response.data['items']}
+        self.assertEqual(rows[self.item.id]['stockQuantity'], 6)
+        self.assertEqual(rows[self.item2.id]['stockQuantity'], 15)
+        self.assertEqual(response.data['totalValue'], 42)
+
+        response = self.client.get(reverse('stock-at'), {'at': 'yesterday'}, **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+@skipIf(connection.vendor == 'sqlite', "SQLite's in-memory test database serialises writers with table locks")
+class StockConcurrencyTestCase(TransactionTestCase):
+    writers = 32
+
+    def test_parallel_orders_do_not_lose_updates(self):
+        item = Item.objects.create(name='cylinder', stockQuantity=20, price=10, buyPrice=5)
+        barrier = threading.Barrier(self.writers)
+        results = []
+
+        def writer():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    take_stock(Item.objects.get(pk=item.pk), 1)
+                results.append(True)
+            except ValidationError:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        item.refresh_from_db()
+        self.assertEqual(results.count(True), 20)
+        self.assertEqual(results.count(False), self.writers - 20)
+        self.assertEqual(item.stockQuantity, 0)
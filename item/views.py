@@ -1,5 +1,12 @@
+from datetime import datetime
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from .serializers import ItemSerializer, SourceSerializer
 from .models import Item, Source
+from .stock import inventory_at
 from helpers.views import BaseView
 from rest_framework.permissions import IsAdminUser
 from helpers.permissions import IsSuperUser
@@ -15,4 +22,35 @@ class SourceDetailView(BaseView):
     permission_classes = [IsSuperUser]
 
     Serializer = SourceSerializer
-    Model = Source
\ No newline at end of file
+    Model = Source
+
+
+class StockAtView(APIView):
+    """Stock and valuation of every item at a point in time: ?at=YYYY-MM-DD or an ISO datetime."""
+    permission_classes = [IsSuperUser]
+
+    def get(self, request):
+        at = request.query_params.get('at')
+        if not at:
+            return Response({"error": "at is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            when = parse_datetime(at)
+            if when is None:
+                day = parse_date(at)
+                # A bare date means the stock as the day started
+                when = datetime.combine(day, datetime.min.time()) if day else None
+        except ValueError:
+            when = None
+        if when is None:
+            return Response({"error": "Invalid date format."}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+
+        items = inventory_at(when)
+        return Response({
+            "at": when.isoformat(),
+            "items": items,
+            "totalValue": round(sum(item['value'] for item in items), 2),
+        })
+
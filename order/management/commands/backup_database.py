@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from backend.backups.jobs import BackupInProgress, create_run, run_backup
+from order.models import BackupDate
+
+
+class Command(BaseCommand):
+    help = (
+        "Backs the database up in the foreground, e.g. from cron, the same way "
+        "POST /api/backup/ does in the background, and applies retention"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only copy what changed since the latest backup of the latest full one')
+
+    def handle(self, *args, **options):
+        try:
+            run = create_run(BackupDate.INCREMENTAL if options['incremental'] else BackupDate.FULL)
+        except BackupInProgress as error:
+            raise CommandError(str(error))
+
+        run = run_backup(run)
+        if run.status != BackupDate.SUCCESS:
+            raise CommandError(f"Backup {run.pk} failed: {run.message}")
+        seconds = (run.finished_at - run.created_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(f"{run.get_kind_display()} backup to {run.name}: {run.size / 2**20:.1f} MiB in {seconds:.1f}s"))
+        if run.message:
+            self.stdout.write(self.style.WARNING(run.message))
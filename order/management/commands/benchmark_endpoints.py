@@ -0,0 +1,150 @@
+import random
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from customer.models import Address, Customer, PhoneNumber
+from helpers.load import LoadClient, header, summarize, summary_line, superuser_token
+from order.models import Order
+
+PAGINATED_ORDERS = """
+query ($startDate: Date!, $endDate: Date, $addressId: Int, $keyset: Boolean) {
+    paginatedOrders(startDate: $startDate, endDate: $endDate, addressId: $addressId, keyset: $keyset, pageSize: 10) {
+        orders { id quantity discount orderedAt deliveredAt item { name } customer { firstName lastName } driver { username } }
+        totalPages
+    }
+}
+"""
+CUSTOMERS_SEARCH = """
+query ($firstname: String!, $mobile: String!) {
+    customersSearch(
+        id: "", firstname: $firstname, lastname: "", middlename: "", mobile: $mobile, email: "",
+        page: 1, numberOfResults: 20, orderBy: "id", orderDirection: 1, isActive: true
+    ) {
+        customers { id firstName lastName addresses { id region mobileNumbers { mobile } } }
+        totalPages
+    }
+}
+"""
+CUSTOMER_BY_ID = """
+query ($id: Int!) {
+    customerById(id: $id) { firstName lastName addresses { region street orders { id quantity orderedAt } } }
+}
+"""
+ALL_ITEMS = "query { allItems(page: 1, numberOfResults: 20, low: false) { items { id name stockQuantity } totalPages } }"
+TOTAL_PROFIT = "query ($startDate: Date!, $endDate: Date) { totalProfit(startDate: $startDate, endDate: $endDate) }"
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the main REST and GraphQL endpoints with parameters sampled from the "
+        "database and reports p50/p95/p99 latency and queries per request. Runs in "
+        "process by default, or against a running server with --base-url"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per scenario first')
+        parser.add_argument('--only', default='', help='Comma separated scenario names')
+        parser.add_argument('--username', help='Superuser to authenticate as, defaults to the first one')
+        parser.add_argument('--base-url', help='e.g. http://localhost:8000 to benchmark a running server')
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel clients, with --base-url only')
+        parser.add_argument('--seed', type=int, default=961)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] > 1 and not options['base_url']:
+            raise CommandError("--concurrency needs --base-url; in process requests run one at a time")
+
+        token = superuser_token(options['username'])
+        if token is None:
+            raise CommandError("A superuser is needed, create one or pass --username")
+
+        self.random = random.Random(options['seed'])
+        self.samples = self.load_samples()
+        self.clients = threading.local()
+        self.token, self.base_url = token, options['base_url']
+
+        scenarios = self.scenarios()
+        if options['only']:
+            wanted = options['only'].split(',')
+            unknown = set(wanted) - set(scenarios)
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}. Known: {', '.join(scenarios)}")
+            scenarios = {name: scenarios[name] for name in wanted}
+
+        self.stdout.write(header('scenario'))
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for name, build in scenarios.items():
+                for _ in range(options['warmup']):
+                    self.send(*build())
+                requests = [build() for _ in range(options['requests'])]
+                if options['concurrency'] > 1:
+                    results = list(pool.map(lambda request: self.send(*request), requests))
+                else:
+                    results = [self.send(*request) for request in requests]
+                summary = summarize(results)
+                line = summary_line(name, summary)
+                self.stdout.write(line if summary['ok'] else self.style.ERROR(line))
+
+    def load_samples(self):
+        """A few hundred real keys to vary the requests by, so caches do not serve them all."""
+        def sample(model, field, count=200):
+            bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+            if bounds['low'] is None:
+                return []
+            pks = [self.random.randint(bounds['low'], bounds['high']) for _ in range(count)]
+            return list(model.objects.filter(pk__in=pks).values_list(field, flat=True))
+
+        first_order = Order.objects.aggregate(first=Min('orderedAt'))['first'] or timezone.now()
+        days = max((timezone.now() - first_order).days, 1)
+        return {
+            'customer': sample(Customer, 'id') or [0],
+            'firstName': sample(Customer, 'firstName') or ['a'],
+            'address': sample(Address, 'id') or [0],
+            'mobile': sample(PhoneNumber, 'mobile') or ['+96170000000'],
+            'day': [timezone.localdate(first_order) + timedelta(days=self.random.randrange(days)) for _ in range(200)],
+        }
+
+    def pick(self, key):
+        return self.random.choice(self.samples[key])
+
+    def scenarios(self):
+        def graphql(query, **variables):
+            return 'POST', '/graphql/', {'query': query, 'variables': variables}
+
+        def day():
+            return self.pick('day')
+
+        def year_of_address():
+            end = day()
+            return graphql(
+                PAGINATED_ORDERS, startDate=(end - timedelta(days=365)).isoformat(),
+                endDate=end.isoformat(), addressId=self.pick('address'),
+            )
+
+        def month_profit():
+            end = day()
+            return graphql(TOTAL_PROFIT, startDate=end.replace(day=1).isoformat(), endDate=end.isoformat())
+
+        return {
+            'exchange-rate': lambda: ('GET', '/api/exchange-rate/', None),
+            'sales-summary': lambda: ('GET', f"/api/order/sales/?year={day().year}", None),
+            'caller-id': lambda: ('GET', f"/api/customer/caller-id/?phone={urllib.parse.quote(self.pick('mobile'))}", None),
+            'stock-at': lambda: ('GET', f"/api/item/stock-at/?at={day().isoformat()}", None),
+            'orders-day': lambda: graphql(PAGINATED_ORDERS, startDate=day().isoformat()),
+            'orders-day-keyset': lambda: graphql(PAGINATED_ORDERS, startDate=day().isoformat(), keyset=True),
+            'orders-address-year': year_of_address,
+            'customers-by-name': lambda: graphql(CUSTOMERS_SEARCH, firstname=self.pick('firstName'), mobile=''),
+            'customers-by-phone': lambda: graphql(CUSTOMERS_SEARCH, firstname='', mobile=self.pick('mobile')[-6:]),
+            'customer-by-id': lambda: graphql(CUSTOMER_BY_ID, id=self.pick('customer')),
+            'all-items': lambda: graphql(ALL_ITEMS),
+            'total-profit-month': month_profit,
+        }
+
+    def send(self, method, path, body):
+        if not hasattr(self.clients, 'client'):
+            self.clients.client = LoadClient(self.token, self.base_url)
+        return self.clients.client.send(method, path, body)
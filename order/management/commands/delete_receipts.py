@@ -1,37 +1,107 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from google.cloud import storage
+from django.utils import timezone
+from helpers.storage import GCSStorage, LocalStorage
 from order.models import Receipt
-from helpers.util import add_to_system_path
+
+# Files handed to a worker at a time; GCSStorage deletes each with its own request
+BATCH_SIZE = 1000
+# Receipt rows deleted per transaction
+ROW_CHUNK = 500
+
 
 class Command(BaseCommand):
-    # add_to_system_path(r"C:\Program Files\MySQL\MySQL Server 8.0\bin")
-    help = "Deletes files from GCS and associated Receipt instances"
+    help = "Deletes receipt files from media storage and the Receipt instances pointing at them"
 
     def add_arguments(self, parser):
-        parser.add_argument('--prefix', type=str, default='media/receipts/', help='Prefix for files in the GCS bucket')
-        parser.add_argument('--bucket', type=str, required=True, help='GCS Bucket name')
+        parser.add_argument('--prefix', type=str, default='receipts/', help='Prefix of the files, relative to the media root')
+        parser.add_argument('--bucket', type=str, help='GCS bucket name, defaults to the media storage (GCS with USE_GCS, else MEDIA_ROOT)')
+        parser.add_argument('--older-than', type=int, metavar='DAYS', help='Only files last written more than this many days ago')
+        parser.add_argument('--workers', type=int, default=4, help='Batches of files deleted at once')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def media_storage(self, bucket):
+        """A storage client for the media files, and where the media root is in it."""
+        if bucket or settings.USE_GCS:
+            location = settings.STORAGES['default'].get('OPTIONS', {}).get('location', 'media')
+            return GCSStorage(bucket or settings.GS_BUCKET_NAME), f"{location}/" if location else ''
+        return LocalStorage(settings.MEDIA_ROOT), ''
 
     def handle(self, *args, **options):
-        prefix = options['prefix']
-        bucket_name = options['bucket']
+        storage, root = self.media_storage(options['bucket'])
+        prefix = root + options['prefix']
+        cutoff = timezone.now() - timedelta(days=options['older_than']) if options['older_than'] is not None else None
+        dry_run = options['dry_run']
+
+        self.stdout.write(f"{'Dry run for' if dry_run else 'Starting delete operation for'} prefix: {prefix}")
+
+        # Each worker gets its own client, and with it its own connection pool
+        own = threading.local()
+
+        def delete_files(names):
+            if not hasattr(own, 'storage'):
+                own.storage = self.media_storage(options['bucket'])[0]
+            return names, own.storage.delete(names)
+
+        files_count = records_count = failed_count = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            pending = set()
 
-        self.stdout.write(f"Starting delete operation for prefix: {prefix}")
+            def finish(done):
+                nonlocal files_count, records_count, failed_count
+                for future in done:
+                    names, deleted = future.result()
+                    files_count += len(deleted)
+                    failed_count += len(names) - len(deleted)
+                    # Only the rows of files that are gone, in small transactions
+                    records_count += self.delete_records([name[len(root):] for name in deleted], dry_run)
+                self.stdout.write(f"Deleted {files_count} files and {records_count} Receipt instances so far")
 
-        # 1️⃣ Delete files from GCS
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
+            for batch in self.batches(storage.list(prefix), cutoff):
+                if dry_run:
+                    files_count += len(batch)
+                    records_count += self.delete_records([name[len(root):] for name in batch], dry_run)
+                    continue
+                pending.add(pool.submit(delete_files, batch))
+                # Keep the listing at most a batch per worker ahead of the deletes
+                if len(pending) >= options['workers']:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    finish(done)
+            if pending:
+                finish(wait(pending).done)
 
-        blobs = list(bucket.list_blobs(prefix=prefix))
-        deleted_files_count = 0
-        for blob in blobs:
-            self.stdout.write(f'Deleting: {blob.name}')
-            blob.delete()
-            deleted_files_count += 1
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {files_count} files from {prefix}'))
+        self.stdout.write(self.style.SUCCESS(f'{verb} {records_count} Receipt instances from the database'))
+        if failed_count:
+            self.stdout.write(self.style.WARNING(
+                f'Could not delete {failed_count} files; their Receipt instances were kept, run again to retry'
+            ))
 
-        # 2️⃣ Delete associated database records
-        with transaction.atomic():
-            deleted_records_count, _ = Receipt.objects.all().delete()
+    def batches(self, files, cutoff):
+        """Names of the listed files older than `cutoff`, BATCH_SIZE at a time, as the listing pages in."""
+        batch = []
+        for file in files:
+            if cutoff is not None and file.updated >= cutoff:
+                continue
+            batch.append(file.name)
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
-        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted_files_count} files from {prefix}'))
-        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted_records_count} Receipt instances from the database'))
+    def delete_records(self, names, dry_run):
+        count = 0
+        for start in range(0, len(names), ROW_CHUNK):
+            receipts = Receipt.objects.filter(file__in=names[start:start + ROW_CHUNK])
+            if dry_run:
+                count += receipts.count()
+                continue
+            with transaction.atomic():
+                count += receipts.delete()[1].get(Receipt._meta.label, 0)
+        return count
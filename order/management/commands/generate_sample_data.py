@@ -0,0 +1,279 @@
+import random
+import time
+from contextlib import contextmanager
+from itertools import accumulate
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from customer.models import Customer, Address, PhoneNumber
+from helpers.phone import normalize_phone, reverse_digits
+from item.models import Item
+from item.stock import snapshot_stock
+from order.models import Order
+from user.models import User
+
+FIRST_NAMES = [
+    'Antoine', 'Boutros', 'Charbel', 'Elie', 'Fadi', 'Georges', 'Hanna', 'Ibrahim', 'Jad', 'Joseph',
+    'Karim', 'Marc', 'Michel', 'Nadim', 'Pierre', 'Rami', 'Sami', 'Tony', 'Youssef', 'Ziad',
+    'Carla', 'Dima', 'Joelle', 'Lara', 'Maya', 'Nada', 'Rita', 'Rola', 'Sandra', 'Zeina',
+]
+LAST_NAMES = [
+    'Abboud', 'Bou Habib', 'Daher', 'Douaihy', 'Estephan', 'Fenianos', 'Frangieh', 'Hanna', 'Karam',
+    'Khoury', 'Makari', 'Moawad', 'Nakhle', 'Rahme', 'Saade', 'Semaan', 'Tannous', 'Yammine', 'Zakhia',
+    'Sleiman',
+]
+# (region, the Customer.residence* flag it falls under, relative weight)
+REGIONS = [
+    ('Zgharta', 'residenceZgharta', 30), ('Miziara', 'residenceZgharta', 6),
+    ('Ardeh', 'residenceZgharta', 5), ('Rachiine', 'residenceZgharta', 4),
+    ('Kfarhata', 'residenceZgharta', 3), ('Arjes', 'residenceZgharta', 3),
+    ('Ehden', 'residenceEhden', 15), ('Kfarsghab', 'residenceEhden', 3),
+    ('Tripoli', 'residenceTripoli', 18), ('Mina', 'residenceTripoli', 5),
+    ('Amioun', 'residenceKoura', 5), ('Kousba', 'residenceKoura', 3),
+]
+MOBILE_PREFIXES = ['3', '70', '71', '76', '78', '79', '81']
+ITEMS = [
+    # name, type, price, buy price, tva
+    ('Gas 10kg', 'Gas', 12.5, 9.0, False),
+    ('Gas 12.5kg', 'Gas', 15.0, 11.0, False),
+    ('Gas 35kg', 'Gas', 42.0, 33.0, False),
+    ('Gas regulator', 'Accessory', 6.0, 3.5, True),
+    ('Gas hose 1.5m', 'Accessory', 4.0, 2.0, True),
+    ('Water gallon', 'Water', 2.0, 1.1, False),
+]
+# L.L per dollar applied by the orders of each year
+LIRA_RATES = {2019: 1507, 2020: 7500, 2021: 17000, 2022: 35000}
+CURRENT_LIRA_RATE = 89500
+
+
+def lira_rate(day):
+    return LIRA_RATES.get(day.year, 1507 if day.year < 2019 else CURRENT_LIRA_RATE)
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the generated dates of auto_now_add fields."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def insert(model, rows, batch_size):
+    """
+    bulk_create `rows` and return their primary keys. MySQL does not return
+    them, so they are read back, which assumes nothing else inserts meanwhile.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        model.objects.bulk_create(rows, batch_size=batch_size)
+        return [row.pk for row in rows]
+
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(rows, batch_size=batch_size)
+    return list(model.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True))
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with realistic customers, addresses, phone numbers and "
+        "years of orders, in chunked bulk inserts, then rebuilds the search index and "
+        "daily sales rollups. Meant for load testing, never for production"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=200000)
+        parser.add_argument('--addresses-per-customer', type=float, default=2.0, help='Average, at least one each')
+        parser.add_argument('--orders', type=int, default=5000000)
+        parser.add_argument('--years', type=int, default=5, help='Orders are spread over this many years up to today')
+        parser.add_argument('--drivers', type=int, default=25)
+        parser.add_argument('--staff', type=int, default=10)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows built in memory and inserted at a time')
+        parser.add_argument('--seed', type=int, default=961, help='Same seed, same data')
+        parser.add_argument('--force', action='store_true', help='Run even though DEBUG is off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("Refusing to generate sample data with DEBUG off, pass --force to do it anyway")
+        # Orders pick their customer, staff member and driver among the generated ones
+        for option in ('customers', 'staff', 'drivers', 'chunk_size'):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be at least 1")
+
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=365 * options['years'])
+
+        with explicit_timestamps(Customer._meta.get_field('createdAt'), Order._meta.get_field('orderedAt')):
+            staff, drivers = self.create_users(options['staff'], options['drivers'])
+            items = self.create_items()
+            addresses = self.create_customers(options['customers'], options['addresses_per_customer'])
+            self.create_orders(options['orders'], addresses, items, staff, drivers)
+
+        # bulk_create sends no signals, so the derived tables are rebuilt at the end
+        self.step('Search index', lambda: call_command('rebuild_search_index', stdout=self.stdout))
+        self.step('Daily sales', lambda: call_command('rebuild_daily_sales', stdout=self.stdout))
+        self.step('Stock snapshot', snapshot_stock)
+
+    def step(self, name, run):
+        started = time.perf_counter()
+        result = run()
+        self.stdout.write(f"{name}: {result if isinstance(result, int) else 'done'} in {time.perf_counter() - started:.1f}s")
+        return result
+
+    def mobile(self):
+        prefix = self.random.choice(MOBILE_PREFIXES)
+        return f"+961{prefix}{self.random.randrange(10 ** (8 - len(prefix))):0{8 - len(prefix)}d}"
+
+    def create_users(self, staff_count, driver_count):
+        taken = set(User.objects.values_list('username', flat=True))
+        users = {'staff': [], 'driver': []}
+        for role, count in (('staff', staff_count), ('driver', driver_count)):
+            for n in range(count):
+                username = f'sample_{role}{n}'
+                if username in taken:
+                    users[role].append(User.objects.get(username=username).pk)
+                    continue
+                user = User(
+                    username=username,
+                    first_name=self.random.choice(FIRST_NAMES),
+                    last_name=self.random.choice(LAST_NAMES),
+                    phone_number=self.mobile(),
+                    region=self.random.choice(REGIONS)[0],
+                    is_staff=role == 'staff',
+                    is_driver=role == 'driver',
+                )
+                user.set_unusable_password()
+                user.save()
+                users[role].append(user.pk)
+        self.stdout.write(f"Users: {staff_count} staff, {driver_count} drivers")
+        return users['staff'], users['driver']
+
+    def create_items(self):
+        items = []
+        for name, kind, price, buy_price, tva in ITEMS:
+            item, _ = Item.objects.get_or_create(
+                name=name, defaults={'type': kind, 'price': price, 'buyPrice': buy_price, 'tva': tva, 'stockQuantity': 500}
+            )
+            items.append(item)
+        return items
+
+    def create_customers(self, count, addresses_per_customer):
+        """Customers with their addresses and phone numbers. Returns (address id, customer id) pairs."""
+        regions, flags, weights = zip(*REGIONS)
+        cum_weights = list(accumulate(weights))
+        # Extra addresses follow a geometric distribution with the requested mean
+        more = 1 - 1 / max(addresses_per_customer, 1)
+        addresses = []
+        started = time.perf_counter()
+
+        for offset in range(0, count, self.chunk_size):
+            size = min(self.chunk_size, count - offset)
+            customers, homes = [], []
+            for _ in range(size):
+                home = self.random.choices(range(len(REGIONS)), cum_weights=cum_weights)[0]
+                customer = Customer(
+                    firstName=self.random.choice(FIRST_NAMES),
+                    middleName=self.random.choice(FIRST_NAMES),
+                    lastName=self.random.choice(LAST_NAMES),
+                    discount=self.random.choice([0] * 8 + [1, 2]),
+                    createdAt=self.start + (self.now - self.start) * self.random.random(),
+                    isActive=self.random.random() > 0.02,
+                )
+                setattr(customer, flags[home], True)
+                customers.append(customer)
+                homes.append(home)
+            customer_ids = insert(Customer, customers, self.chunk_size)
+
+            new_addresses = []
+            for home, customer_id in zip(homes, customer_ids):
+                count_addresses = 1
+                while self.random.random() < more:
+                    count_addresses += 1
+                for n in range(count_addresses):
+                    region = regions[home] if n == 0 else self.random.choices(regions, cum_weights=cum_weights)[0]
+                    landline = f"06 {self.random.randrange(100000, 999999)}" if self.random.random() < 0.3 else ''
+                    digits = normalize_phone(landline)
+                    new_addresses.append(Address(
+                        customer_id=customer_id,
+                        region=region,
+                        street=f"Street {self.random.randrange(1, 60)}",
+                        building=f"{self.random.choice(LAST_NAMES)} building",
+                        floor=self.random.choice(['Ground Floor', '1st Floor', '2nd Floor', '3rd Floor']),
+                        landline=landline,
+                        landlineDigits=digits,
+                        landlineDigitsReversed=reverse_digits(digits),
+                    ))
+            address_ids = insert(Address, new_addresses, self.chunk_size)
+
+            phones = []
+            for address, address_id in zip(new_addresses, address_ids):
+                addresses.append((address_id, address.customer_id))
+                for priority in range(1, self.random.choice([1, 1, 1, 2]) + 1):
+                    mobile = self.mobile()
+                    digits = normalize_phone(mobile)
+                    phones.append(PhoneNumber(
+                        address_id=address_id, mobile=mobile, priority=priority,
+                        mobileDigits=digits, mobileDigitsReversed=reverse_digits(digits),
+                    ))
+            PhoneNumber.objects.bulk_create(phones, batch_size=self.chunk_size)
+
+            self.progress('Customers', offset + size, count, started)
+        return addresses
+
+    def create_orders(self, count, addresses, items, staff, drivers):
+        if not addresses:
+            return
+        item_weights = list(accumulate([40, 30, 5, 4, 3, 18][:len(items)]))
+        span = (self.now - self.start).total_seconds() / count
+        started = time.perf_counter()
+
+        for offset in range(0, count, self.chunk_size):
+            size = min(self.chunk_size, count - offset)
+            # Each chunk covers the next slice of time, so ids grow with orderedAt as in production
+            times = sorted(offset + size * self.random.random() for _ in range(size))
+            orders = []
+            for moment in times:
+                # Squaring skews orders towards the first addresses: regular customers
+                address_id, customer_id = addresses[int(len(addresses) * self.random.random() ** 2)]
+                ordered_at = self.start + timedelta(seconds=span * moment)
+                delivered = ordered_at < self.now - timedelta(days=1) or self.random.random() < 0.5
+                money = Order.LBP if self.random.random() < 0.4 else Order.USD
+                orders.append(Order(
+                    customer_id=customer_id,
+                    address_id=address_id,
+                    user_id=self.random.choice(staff),
+                    driver_id=self.random.choice(drivers),
+                    item=self.random.choices(items, cum_weights=item_weights)[0],
+                    quantity=self.random.choice([1] * 6 + [2, 2, 3]),
+                    discount=self.discount(),
+                    money=money,
+                    liraRate=lira_rate(ordered_at),
+                    orderedAt=ordered_at,
+                    deliveredAt=ordered_at + timedelta(hours=self.random.uniform(0.5, 8)) if delivered else None,
+                    status='D' if delivered else 'P',
+                    isActive=self.random.random() > 0.03,
+                ))
+            Order.objects.bulk_create(orders, batch_size=self.chunk_size)
+            self.progress('Orders', offset + size, count, started)
+
+    def discount(self):
+        """Mostly none. Otherwise in thousands of L.L (<= 1000) or in L.L, as entered by hand."""
+        roll = self.random.random()
+        if roll < 0.8:
+            return 0
+        if roll < 0.9:
+            return self.random.choice([25, 50, 100, 200])
+        return self.random.choice([50000, 100000, 150000, 250000])
+
+    def progress(self, name, done, total, started):
+        if done == total or done % (self.chunk_size * 20) == 0:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{name}: {done}/{total} in {elapsed:.1f}s ({done / max(elapsed, 1e-6):.0f} rows/s)")
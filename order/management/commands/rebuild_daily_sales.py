@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from order.rollups import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = "Recomputes the DailySales rollup table from every order"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rollup rows inserted per query')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding daily sales rollups...")
+        created = rebuild_daily_sales(batch_size=options['batch_size'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {created} DailySales rows'))
@@ -0,0 +1,159 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from helpers.load import LoadClient, header, summarize, summary_line, superuser_token
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def is_write(record):
+    if record.get('graphql') is not None:
+        # Endpoints of GraphQL requests are labelled with their operation type
+        return ' graphql query ' not in record['endpoint']
+    return record['method'] not in READ_METHODS
+
+
+def change(before, after, key):
+    if before.get(key) is None or after.get(key) is None:
+        return '-'
+    percent = f" ({(after[key] - before[key]) / before[key] * 100:+.0f}%)" if before[key] else ''
+    return f"{before[key]:.1f} -> {after[key]:.1f}{percent}"
+
+
+def load_results(path):
+    results = defaultdict(list)
+    with open(path) as lines:
+        for line in lines:
+            result = json.loads(line)
+            results[result['endpoint']].append((result['status'], result['ms'], result['queries']))
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a traffic capture (see backend/traffic.py) against this build in process, "
+        "or against a server with --base-url, and reports latency per endpoint. Save the "
+        "results of two builds with --output, then compare them with --compare"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', nargs='?', help='Capture to replay, defaults to TRAFFIC_CAPTURE_LOG')
+        parser.add_argument('--base-url', help='e.g. http://localhost:8000 to replay against a running server')
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel clients, with --base-url only')
+        parser.add_argument('--speedup', type=float, default=1.0,
+                            help='2 replays twice as fast as recorded, 0 sends every request as soon as possible')
+        parser.add_argument('--include-writes', action='store_true', help='Also replay REST writes and GraphQL mutations')
+        parser.add_argument('--limit', type=int, help='Replay only the first N requests')
+        parser.add_argument('--username', help='Superuser to authenticate as, defaults to the first one')
+        parser.add_argument('--output', help='Write one JSON line per replayed request here')
+        parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'),
+                            help='Compare two --output files instead of replaying')
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self.compare(*options['compare'])
+        if options['concurrency'] > 1 and not options['base_url']:
+            raise CommandError("--concurrency needs --base-url; in process requests run one at a time")
+
+        token = superuser_token(options['username'])
+        if token is None:
+            raise CommandError("A superuser is needed, create one or pass --username")
+        self.token, self.base_url = token, options['base_url']
+        self.clients = threading.local()
+
+        records, skipped = self.load(options['capture'] or settings.TRAFFIC_CAPTURE_LOG, options['include_writes'])
+        if options['limit']:
+            records = records[:options['limit']]
+        self.stdout.write(f"Replaying {len(records)} requests, skipping {skipped}")
+
+        results = self.replay(records, options['speedup'], options['concurrency'])
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                for record, (status, elapsed, queries) in zip(records, results):
+                    output.write(json.dumps({
+                        'endpoint': record['endpoint'], 'status': status, 'ms': round(elapsed, 2), 'queries': queries,
+                    }) + '\n')
+
+        by_endpoint = defaultdict(list)
+        for record, result in zip(records, results):
+            by_endpoint[record['endpoint']].append(result)
+        self.stdout.write(header('endpoint'))
+        for name in sorted(by_endpoint, key=lambda name: -len(by_endpoint[name])):
+            self.stdout.write(summary_line(name, summarize(by_endpoint[name])))
+        self.stdout.write(summary_line('all', summarize(results)))
+
+    def load(self, path, include_writes):
+        records, skipped = [], 0
+        try:
+            lines = open(path)
+        except OSError as error:
+            raise CommandError(f"Cannot read the capture: {error}")
+        with lines:
+            for line in lines:
+                record = json.loads(line)
+                if not record['replayable'] or (is_write(record) and not include_writes):
+                    skipped += 1
+                    continue
+                records.append(record)
+        records.sort(key=lambda record: record['at'])
+        return records, skipped
+
+    def replay(self, records, speedup, concurrency):
+        """Send `records` at their recorded pace divided by `speedup`; returns their results in order."""
+        if not records:
+            return []
+        first = records[0]['at']
+        started = time.perf_counter()
+
+        def wait_for(record):
+            if speedup > 0:
+                delay = (record['at'] - first) / speedup - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+        if concurrency == 1:
+            results = []
+            for record in records:
+                wait_for(record)
+                results.append(self.send(record))
+            return results
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = []
+            for record in records:
+                wait_for(record)
+                futures.append(pool.submit(self.send, record))
+            return [future.result() for future in futures]
+
+    def send(self, record):
+        if not hasattr(self.clients, 'client'):
+            self.clients.client = LoadClient(self.token, self.base_url)
+
+        path = f"{record['path']}?{record['query']}" if record['query'] else record['path']
+        body = record['graphql'] if record.get('graphql') is not None else record['body']
+        return self.clients.client.send(record['method'], path, body)
+
+    def compare(self, baseline_path, candidate_path):
+        baseline, candidate = load_results(baseline_path), load_results(candidate_path)
+        self.stdout.write(
+            f"{'endpoint (baseline -> candidate)':<40}{'requests':>9}{'p50 ms':>24}{'p95 ms':>24}{'p99 ms':>24}{'queries':>20}"
+        )
+        for name in sorted(set(baseline) | set(candidate)):
+            self.write_comparison(name, baseline.get(name, []), candidate.get(name, []))
+        self.write_comparison(
+            'all',
+            [result for results in baseline.values() for result in results],
+            [result for results in candidate.values() for result in results],
+        )
+
+    def write_comparison(self, name, baseline, candidate):
+        before, after = summarize(baseline), summarize(candidate)
+        self.stdout.write(
+            f"{name:<40}{after['ok']:>9}{change(before, after, 'p50'):>24}{change(before, after, 'p95'):>24}"
+            f"{change(before, after, 'p99'):>24}{change(before, after, 'queries'):>20}"
+        )
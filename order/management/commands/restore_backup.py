@@ -0,0 +1,67 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from backend.backups.dump import BackupError
+from backend.backups.jobs import PREFIX, backup_storage
+from backend.backups.restore import Restore, RestoreError, latest_backup
+
+
+class Command(BaseCommand):
+    help = (
+        "Restores a backup, with the full backup and incremental ones it chains onto, "
+        "into a scratch database (DB_RESTORE_NAME, which must exist), verifies it against "
+        "the manifests and reports how long recovery took"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', nargs='?', help=f'e.g. {PREFIX}20250101_020000_42/, defaults to the newest')
+        parser.add_argument('--database', default='restore', help='Scratch database alias; everything in it is replaced')
+        parser.add_argument('--workers', type=int, default=settings.BACKUP_WORKERS, help='Tables loaded at once, on MySQL')
+        parser.add_argument('--rto', type=float, help='Fail when recovery takes longer than this many seconds')
+        parser.add_argument('--report', help='Write the timings and checks here as JSON')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in settings.DATABASES:
+            raise CommandError(f"There is no {alias} database; set DB_RESTORE_NAME to a scratch database")
+        # Every table of the target is emptied, so it must not be the primary or a replica, on any host
+        database = settings.DATABASES[alias]['NAME']
+        shared = [other for other, config in settings.DATABASES.items() if other != alias and config['NAME'] == database]
+        if alias == DEFAULT_DB_ALIAS:
+            raise CommandError("Refusing to restore over the primary database")
+        if shared:
+            raise CommandError(f"Refusing to restore into {alias}: {database} is also the database of {', '.join(shared)}")
+
+        storage = backup_storage()
+        name = options['backup'] or latest_backup(storage, PREFIX)
+        if name is None:
+            raise CommandError("There is no backup to restore")
+        name = name if name.endswith('/') else name + '/'
+
+        self.stdout.write(f"Restoring {name} into {alias}")
+        restore = Restore(storage, name, alias, workers=options['workers'], log=self.stdout.write)
+        try:
+            report = restore.run()
+        except (BackupError, RestoreError) as error:
+            raise CommandError(f"Restore failed: {error}")
+        finally:
+            if options['report']:
+                with open(options['report'], 'w') as output:
+                    json.dump(restore.report, output, indent=1)
+
+        self.stdout.write(f"{'table':<40}{'rows':>10}{'load s':>9}{'index s':>9}  verified")
+        for table, result in sorted(report['tables'].items(), key=lambda item: -item[1]['load']):
+            self.stdout.write(
+                f"{table:<40}{result['rows']:>10}{result['load']:>9.2f}{result['indexes']:>9.2f}  {result['verified']}"
+            )
+        if report['rebuilt']:
+            self.stdout.write(f"Rebuilt: {', '.join(report['rebuilt'])}")
+        for phase, seconds in report['phases'].items():
+            self.stdout.write(f"{phase:<40}{seconds:>10.2f}s")
+
+        recovery = report['recoverySeconds']
+        message = f"Restored and verified {name}; recovery took {recovery:.1f}s"
+        if options['rto'] is not None and recovery > options['rto']:
+            raise CommandError(f"{message}, over the {options['rto']:.0f}s RTO")
+        self.stdout.write(self.style.SUCCESS(message))
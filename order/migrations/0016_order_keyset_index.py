@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0027_alter_customer_middlename'),
+        ('item', '0018_alter_item_stockquantity'),
+        ('order', '0015_order_driver'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['isActive', 'orderedAt', 'id'], name='order_order_isActiv_434724_idx'),
+        ),
+    ]
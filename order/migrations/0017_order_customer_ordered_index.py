@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0029_phone_digits'),
+        ('item', '0018_alter_item_stockquantity'),
+        ('order', '0016_order_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'orderedAt'], name='order_order_custome_d41df1_idx'),
+        ),
+    ]
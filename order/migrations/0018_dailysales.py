@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_daily_sales(apps, schema_editor):
+    from order.rollups import build_rows, daily_buckets
+
+    db = schema_editor.connection.alias
+
+    Order = apps.get_model('order', 'Order')
+    DailySales = apps.get_model('order', 'DailySales')
+    rows = build_rows(DailySales, daily_buckets(Order.objects.using(db).all()))
+    DailySales.objects.using(db).bulk_create(rows, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0030_phone_digits_reversed'),
+        ('item', '0018_alter_item_stockquantity'),
+        ('order', '0017_order_customer_ordered_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('tva', models.BooleanField(default=False)),
+                ('isActive', models.BooleanField(default=True)),
+                ('delivered', models.BooleanField(default=False)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('gross', models.FloatField(default=0)),
+                ('cost', models.FloatField(default=0)),
+                ('discount', models.FloatField(default=0)),
+                ('address', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='customer.address')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='item.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'tva'], name='order_daily_date_4211f1_idx'), models.Index(fields=['address', 'date'], name='order_daily_address_f59375_idx')],
+                'unique_together': {('date', 'item', 'address', 'tva', 'isActive', 'delivered')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_sales, migrations.RunPython.noop),
+    ]
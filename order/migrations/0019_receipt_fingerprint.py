@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0018_dailysales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
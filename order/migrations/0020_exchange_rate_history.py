@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_history(apps, schema_editor):
+    # Only the current rate is known, so it is taken to cover every existing order
+    db = schema_editor.connection.alias
+    ExchangeRate = apps.get_model('order', 'ExchangeRate')
+    ExchangeRateHistory = apps.get_model('order', 'ExchangeRateHistory')
+    Order = apps.get_model('order', 'Order')
+
+    exchange = ExchangeRate.objects.using(db).first()
+    if exchange is None:
+        return
+    first_order = Order.objects.using(db).order_by('orderedAt').values_list('orderedAt', flat=True).first()
+    ExchangeRateHistory.objects.using(db).create(
+        rate=exchange.rate, effectiveFrom=first_order or django.utils.timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0019_receipt_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRateHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rate', models.FloatField()),
+                ('effectiveFrom', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-effectiveFrom'],
+            },
+        ),
+        migrations.RunPython(seed_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0020_exchange_rate_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupdate',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='backupdate',
+            name='message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='backupdate',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='backupdate',
+            name='size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='backupdate',
+            name='status',
+            field=models.CharField(choices=[('running', 'Running'), ('success', 'Succeeded'), ('failed', 'Failed'), ('expired', 'Deleted by retention')], default='success', max_length=10),
+        ),
+    ]
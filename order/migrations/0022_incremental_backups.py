@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0021_backupdate_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupdate',
+            name='base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='incrementals', to='order.backupdate'),
+        ),
+        migrations.AddField(
+            model_name='backupdate',
+            name='kind',
+            field=models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], default='full', max_length=11),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updatedAt',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
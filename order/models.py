@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from customer.models import Customer, Address
 from item.models import Item
 from user.models import User
@@ -28,6 +29,16 @@ class Order(models.Model):
     orderedAt = models.DateTimeField(auto_now_add=True, db_index=True)
     deliveredAt = models.DateTimeField(null=True, blank=True, db_index=True)
     isActive = models.BooleanField(default=True, db_index=True)
+    # Incremental backups copy the rows updated since the previous backup, see backend.backups.dump
+    updatedAt = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination walks (orderedAt, id) among active orders
+            models.Index(fields=['isActive', 'orderedAt', 'id']),
+            # Caller ID shows a customer's latest orders
+            models.Index(fields=['customer', 'orderedAt']),
+        ]
 
     def __str__(self):
         return f"{self.item.name} for address {self.address.id}"
@@ -35,9 +46,71 @@ class Order(models.Model):
 class ExchangeRate(models.Model):
     rate = models.FloatField(default=89000)
 
+class ExchangeRateHistory(models.Model):
+    """Every rate ExchangeRate has held, from the moment it took effect. See order.rates."""
+    rate = models.FloatField()
+    effectiveFrom = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-effectiveFrom']
+
 class BackupDate(models.Model):
+    """One backup run, see backend.backups.jobs. created_at is when it started."""
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    EXPIRED = 'expired'
+    FULL = 'full'
+    INCREMENTAL = 'incremental'
+    KIND_CHOICES = [
+        (FULL, 'Full'),
+        (INCREMENTAL, 'Incremental'),
+    ]
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (SUCCESS, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (EXPIRED, 'Deleted by retention'),
+    ]
+
     created_at = models.DateTimeField(auto_now_add=True)
+    # Rows from before runs were tracked are all successful backups
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=SUCCESS)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Storage prefix holding the backup's files and manifest
+    name = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField(default=0)
+    message = models.TextField(blank=True)
+    kind = models.CharField(max_length=11, choices=KIND_CHOICES, default=FULL)
+    # The full backup an incremental one chains onto
+    base = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='incrementals')
+
 
 class Receipt(models.Model):
     orders = models.ManyToManyField(Order)
-    file = models.FileField(upload_to='receipts')
\ No newline at end of file
+    file = models.FileField(upload_to='receipts')
+    # sha256 of everything printed on the receipt, see GenerateReceiptAPIView.receipt_fingerprint
+    fingerprint = models.CharField(max_length=64, unique=True, null=True, blank=True)
+class DailySales(models.Model):
+    """
+    Per (local date, item, address) totals of orders, split by whether the
+    orders are active and delivered. Kept up to date by order.rollups so
+    reports read a few hundred rows instead of scanning every order.
+    """
+    date = models.DateField()
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='daily_sales')
+    address = models.ForeignKey(Address, on_delete=models.CASCADE, related_name='daily_sales')
+    tva = models.BooleanField(default=False)
+    isActive = models.BooleanField(default=True)
+    delivered = models.BooleanField(default=False)
+    quantity = models.PositiveIntegerField(default=0)
+    gross = models.FloatField(default=0)
+    cost = models.FloatField(default=0)
+    discount = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'item', 'address', 'tva', 'isActive', 'delivered')
+        indexes = [
+            models.Index(fields=['date', 'tva']),
+            models.Index(fields=['address', 'date']),
+        ]
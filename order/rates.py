@@ -0,0 +1,64 @@
+import time
+from django.db import transaction
+from helpers.cache import shared_version, bump_version
+from .models import ExchangeRate, ExchangeRateHistory
+
+VERSION_KEY = 'exchange-rate:version'
+# Upper bound on staleness should the shared cache be unavailable or per-process
+MAX_AGE = 300
+
+# (version, loaded at, rate) of this process
+_cached = None
+
+
+def current_rate():
+    """
+    The ExchangeRate singleton's rate, read from the database only when
+    another process changed it. Checking the shared version key is a cache
+    read, not a query.
+    """
+    global _cached
+
+    version = shared_version(VERSION_KEY)
+    if _cached and _cached[0] == version and time.monotonic() - _cached[1] < MAX_AGE:
+        return _cached[2]
+
+    exchange, _ = ExchangeRate.objects.get_or_create()
+    # Stored under the version read before the query, so a concurrent write
+    # bumps past it and the next call reloads
+    _cached = (version, time.monotonic(), exchange.rate)
+    return exchange.rate
+
+
+def invalidate_rate():
+    """Make every process reload the rate on its next read."""
+    global _cached
+    _cached = None
+    bump_version(VERSION_KEY)
+
+
+def set_rate(rate):
+    """Update the singleton; the history row and invalidation come from order.signals."""
+    with transaction.atomic():
+        exchange, _ = ExchangeRate.objects.select_for_update().get_or_create()
+        exchange.rate = rate
+        exchange.save()
+    return exchange
+
+
+def rate_at(when):
+    """The rate in effect at `when`, or None before the first recorded rate."""
+    return (
+        ExchangeRateHistory.objects
+        .filter(effectiveFrom__lte=when)
+        .order_by('-effectiveFrom')
+        .values_list('rate', flat=True)
+        .first()
+    )
+
+
+def record_rate(rate):
+    """Add a history row if `rate` differs from the one currently in effect."""
+    latest = ExchangeRateHistory.objects.order_by('-effectiveFrom').values_list('rate', flat=True).first()
+    if latest != rate:
+        ExchangeRateHistory.objects.create(rate=rate)
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import F, Q, Sum, Case, When, FloatField, BooleanField, ExpressionWrapper
+from django.db.models.functions import Round
+from django.utils import timezone
+from .models import Order, DailySales
+
+# A discount above 1000 is in L.L, otherwise in thousands of L.L
+DISCOUNT_USD = Case(
+    When(discount__gt=1000,
+        then=ExpressionWrapper(F('discount') / F('liraRate'), output_field=FloatField())),
+    default=ExpressionWrapper((F('discount') * 1000) / F('liraRate'), output_field=FloatField()),
+    output_field=FloatField(),
+)
+
+
+def local_day_range(day):
+    """UTC bounds [start, end) of a local calendar day."""
+    local_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    local_end = local_start + timedelta(days=1)
+    return local_start.astimezone(dt_timezone.utc), local_end.astimezone(dt_timezone.utc)
+
+
+def sales_key(order):
+    """The (local date, item, address) bucket an order is counted in."""
+    return timezone.localdate(order.orderedAt), order.item_id, order.address_id
+
+
+def aggregate_orders(orders):
+    """
+    Group `orders`, all from one local day, into DailySales buckets, computed
+    by the database. The day comes from the caller's orderedAt range rather
+    than TruncDate, which needs MySQL's time zone tables to convert to local
+    time and yields NULL without them.
+    """
+    return (
+        orders
+        .annotate(is_delivered=ExpressionWrapper(Q(deliveredAt__isnull=False), output_field=BooleanField()))
+        .values('item_id', 'address_id', 'item__tva', 'isActive', 'is_delivered')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_gross=Sum(ExpressionWrapper(F('quantity') * F('item__price'), output_field=FloatField())),
+            total_cost=Sum(ExpressionWrapper(F('quantity') * F('item__buyPrice'), output_field=FloatField())),
+            total_discount=Sum(DISCOUNT_USD),
+        )
+        .order_by()
+    )
+
+
+def daily_buckets(orders):
+    """
+    Yields (local date, bucket) for all of `orders`, a day at a time. Days
+    without orders are skipped, so this is two indexed queries per day with
+    orders.
+    """
+    orders = orders.order_by()
+    first = orders.order_by('orderedAt').values_list('orderedAt', flat=True).first()
+    while first is not None:
+        day = timezone.localdate(first)
+        start, end = local_day_range(day)
+        for bucket in aggregate_orders(orders.filter(orderedAt__gte=start, orderedAt__lt=end)):
+            yield day, bucket
+        first = orders.filter(orderedAt__gte=end).order_by('orderedAt').values_list('orderedAt', flat=True).first()
+
+
+def build_rows(model, buckets):
+    """DailySales rows, unsaved, from (local date, bucket) pairs."""
+    return [
+        model(
+            date=day,
+            item_id=bucket['item_id'],
+            address_id=bucket['address_id'],
+            tva=bucket['item__tva'],
+            isActive=bucket['isActive'],
+            delivered=bucket['is_delivered'],
+            quantity=bucket['total_quantity'] or 0,
+            gross=bucket['total_gross'] or 0,
+            cost=bucket['total_cost'] or 0,
+            discount=bucket['total_discount'] or 0,
+        )
+        for day, bucket in buckets
+    ]
+
+
+def refresh_daily_sales(keys):
+    """
+    Recompute the DailySales rows of the given (date, item, address) buckets
+    from their orders. A bucket only holds a handful of orders, so this is a
+    few indexed queries and stays exact across edits and cancellations.
+    """
+    with transaction.atomic():
+        for day, item_id, address_id in set(keys):
+            start, end = local_day_range(day)
+            orders = Order.objects.filter(
+                address_id=address_id, item_id=item_id, orderedAt__gte=start, orderedAt__lt=end
+            )
+            DailySales.objects.filter(date=day, item_id=item_id, address_id=address_id).delete()
+            buckets = ((day, bucket) for bucket in aggregate_orders(orders))
+            DailySales.objects.bulk_create(build_rows(DailySales, buckets))
+
+
+def rebuild_daily_sales(batch_size=2000, using=None):
+    """Drop and recompute every DailySales row. Returns the number of rows written."""
+    with transaction.atomic(using=using):
+        DailySales.objects.db_manager(using).all().delete()
+        rows = build_rows(DailySales, daily_buckets(Order.objects.db_manager(using).all()))
+        DailySales.objects.db_manager(using).bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def sales_summary(year, tva=None, using=None):
+    """Quantity and sales per item name for a year, as read by the sales reports."""
+    rows = DailySales.objects.db_manager(using).filter(date__year=year)
+    if tva is not None:
+        rows = rows.filter(tva=tva)
+
+    return (
+        rows
+        .values(item_name=F('item__name'))
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_sales=Round(Sum('gross'), precision=2),
+        )
+        .order_by('item_name')
+    )
+
+
+def total_profit(start_date, end_date=None, address_id=None, using=None):
+    """Profit of active, delivered orders between two local dates (inclusive)."""
+    rows = DailySales.objects.db_manager(using).filter(
+        date__range=(start_date, end_date or start_date),
+        isActive=True,
+        delivered=True,
+    )
+    if address_id:
+        rows = rows.filter(address_id=address_id)
+
+    profit = rows.aggregate(
+        profit=Sum(F('gross') - F('cost') - F('discount'))
+    )['profit'] or 0.0
+    return round(profit, 2)
@@ -1,9 +1,11 @@
 from rest_framework import serializers
-from item.models import Item
+from item.models import Item, StockMovement
 from item.serializers import ItemSerializer
+from item.stock import take_stock, give_back_stock, record_movements
 from .models import Order, ExchangeRate
 from user.models import User
 from django.utils import timezone
+from django.db import transaction
 
 class OrderSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False)
@@ -26,20 +28,16 @@ class OrderSerializer(serializers.ModelSerializer):
     
     
     def validate(self, attrs):
-        item = attrs['item']
-        quantity = attrs['quantity']
         if 'orderedAt' in attrs:
             attrs['orderedAt'] = timezone.make_aware(
                 attrs['orderedAt'],
                 timezone.get_current_timezone()
             )
 
-        if item.stockQuantity < quantity:
-            raise serializers.ValidationError(
-                {'quantity': f"Only {item.stockQuantity} units available in stock."}
-            )
+        # Stock is checked by the conditional UPDATE in create/update, not by a stale read here
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request')    
         validated_data['user'] = request.user
@@ -49,41 +47,40 @@ class OrderSerializer(serializers.ModelSerializer):
         quantity = validated_data['quantity']
 
         # Deduct stock
-        item.stockQuantity -= quantity
-        item.save()
+        movement = take_stock(item, quantity)
+
+        order = super().create(validated_data)
+        record_movements([movement], order=order)
 
         # Return the created order
-        return super().create(validated_data)
+        return order
 
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # Get new and old quantity
         new_quantity = validated_data.get('quantity', instance.quantity)
         item = validated_data.get('item', instance.item)
 
+        movements = []
+
         # Adjust stock if quantity or item changed
         if item == instance.item:
             quantity_difference = new_quantity - instance.quantity
         else:
             # Restore old item's stock
-            instance.item.stockQuantity += instance.quantity
-            instance.item.save()
+            movements.append(give_back_stock(instance.item, instance.quantity, StockMovement.ORDER, instance))
             quantity_difference = new_quantity
             item = validated_data['item']
 
-        if item.stockQuantity < quantity_difference:
-            raise serializers.ValidationError(
-                {'quantity': f"Only {item.stockQuantity} units available in stock."}
-            )
-        
         if 'orderedAt' in validated_data:
             validated_data['orderedAt'] = timezone.make_aware(
                 validated_data['orderedAt'],
                 timezone.get_current_timezone()
             )
 
-        item.stockQuantity -= quantity_difference
-        item.save()
+        movements.append(take_stock(item, quantity_difference, StockMovement.ORDER, instance))
+        record_movements(movements)
 
         return super().update(instance, validated_data)
 
@@ -0,0 +1,74 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+from item.models import Item
+from .models import Order, DailySales, Receipt, ExchangeRate
+from .rollups import sales_key, refresh_daily_sales
+from .rates import invalidate_rate, record_rate
+
+
+@receiver(pre_save, sender=Order)
+def remember_sales_key(sender, instance, raw=False, **kwargs):
+    # An edit can move the order out of its old bucket, which must be refreshed too
+    instance._previous_sales_key = None
+    if instance.pk and not raw:
+        previous = Order.objects.filter(pk=instance.pk).only('orderedAt', 'item', 'address').first()
+        if previous:
+            instance._previous_sales_key = sales_key(previous)
+
+
+@receiver(post_save, sender=Order)
+def update_daily_sales(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = {sales_key(instance)}
+    if getattr(instance, '_previous_sales_key', None):
+        keys.add(instance._previous_sales_key)
+    refresh_daily_sales(keys)
+
+
+@receiver(post_delete, sender=Order)
+def remove_daily_sales(sender, instance, **kwargs):
+    refresh_daily_sales([sales_key(instance)])
+
+
+@receiver(post_save, sender=Order)
+def invalidate_receipts(sender, instance, created=False, raw=False, **kwargs):
+    # Receipts printed before this change no longer match the order
+    if created or raw:
+        return
+    for receipt in Receipt.objects.filter(orders=instance):
+        receipt.delete()
+        # A file delete cannot be rolled back, so it waits until the rows are surely gone
+        transaction.on_commit(lambda file=receipt.file: file.delete(save=False))
+
+
+@receiver(post_save, sender=Item)
+def update_daily_sales_item(sender, instance, raw=False, **kwargs):
+    # Reports show every order at the item's current prices, like the orders they replace
+    if raw:
+        return
+    # Every order of a bucket has the same item, so its totals are its quantity times the price
+    DailySales.objects.filter(item=instance).exclude(
+        tva=instance.tva, gross=F('quantity') * instance.price, cost=F('quantity') * instance.buyPrice,
+    ).update(
+        tva=instance.tva, gross=F('quantity') * instance.price, cost=F('quantity') * instance.buyPrice,
+    )
+
+
+@receiver(post_save, sender=ExchangeRate)
+def exchange_rate_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    record_rate(instance.rate)
+    # Again once committed, in case another process reloaded the old rate meanwhile
+    invalidate_rate()
+    transaction.on_commit(invalidate_rate)
+
+
+@receiver(post_delete, sender=ExchangeRate)
+def exchange_rate_deleted(sender, instance, **kwargs):
+    invalidate_rate()
+    transaction.on_commit(invalidate_rate)
+
@@ -1,10 +1,27 @@
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 from user.models import User
-from .models import Order, ExchangeRate
+from .models import Order, ExchangeRate, ExchangeRateHistory, DailySales, Receipt
+from .rates import current_rate, rate_at, set_rate
+from .rollups import rebuild_daily_sales
+from django.utils import timezone
+from helpers.storage import LocalStorage
 from helpers.tests import BaseTestCase
-from datetime import date
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import skipUnless
+from django.conf import settings
+from customer.models import Customer, Address, PhoneNumber, CustomerSearchToken
+from item.models import Item
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connections, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+import json
+import os
+import tempfile
+from unittest.mock import patch
 
 class OrderTestCase(BaseTestCase):
     def test_create_order(self):
@@ -127,6 +144,12 @@ class ExchangeRateViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['rate'], 90000)
 
+    def test_get_returns_only_the_stored_rate(self):
+        ExchangeRate.objects.create(rate=90000)
+        response = self.client.get(self.url, **self.auth_header)
+        self.assertEqual(response.data, {'rate': 90000})
+        self.assertEqual(ExchangeRate.objects.count(), 1)
+
     def test_put_updates_exchange_rate(self):
         ExchangeRate.objects.create(rate=88000)
         response = self.client.put(self.url, {'rate': 90000}, format='json',  **self.auth_header)
@@ -136,6 +159,31 @@ class ExchangeRateViewTests(APITestCase):
 
         self.assertEqual(ExchangeRate.objects.get().rate, 90000)
 
+    def test_rate_is_cached_until_changed(self):
+        ExchangeRate.objects.create(rate=88000)
+        self.assertEqual(current_rate(), 88000)
+        with self.assertNumQueries(0):
+            self.assertEqual(current_rate(), 88000)
+
+        self.client.put(self.url, {'rate': 91000}, format='json', **self.auth_header)
+        self.assertEqual(current_rate(), 91000)
+
+    def test_history_records_each_rate_change(self):
+        ExchangeRate.objects.create(rate=88000)
+        before = timezone.now()
+        self.client.put(self.url, {'rate': 90000}, format='json', **self.auth_header)
+        self.client.put(self.url, {'rate': 90000}, format='json', **self.auth_header)
+
+        self.assertEqual(list(ExchangeRateHistory.objects.values_list('rate', flat=True)), [90000, 88000])
+        self.assertEqual(rate_at(before), 88000)
+        self.assertEqual(rate_at(timezone.now()), 90000)
+        self.assertIsNone(rate_at(before - timedelta(days=1)))
+
+        response = self.client.get(self.url, {'at': before.isoformat()}, **self.auth_header)
+        self.assertEqual(response.data['rate'], 88000)
+        response = self.client.get(self.url, {'at': 'soon'}, **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 class MarkOrdersDeliveredTests(BaseTestCase):
     def test_mark_orders_as_delivered(self):
         # Make sure there's at least one pending order for today
@@ -168,4 +216,355 @@ class MarkOrdersDeliveredTests(BaseTestCase):
         self.assertEqual(pending_order.status, 'D')
         self.assertIsNotNone(pending_order.deliveredAt)
         self.assertIn('message', response.data)
-        self.assertIn('order(s) marked as delivered', response.data['message'])
\ No newline at end of file
+        self.assertIn('order(s) marked as delivered', response.data['message'])
+
+class DailySalesTests(BaseTestCase):
+    def rollup(self, **filters):
+        return DailySales.objects.filter(item=self.item2, address=self.address, **filters)
+
+    def test_order_changes_update_rollup(self):
+        self.assertEqual(self.rollup(isActive=True).get().quantity, 5)
+        self.assertEqual(self.rollup(isActive=True).get().gross, 25)
+
+        url = reverse('edit-order', args=[self.order.id])
+        response = self.client.delete(url, **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertFalse(self.rollup(isActive=True).exists())
+        self.assertEqual(self.rollup(isActive=False).get().quantity, 5)
+
+    def test_mark_delivered_moves_rollup(self):
+        url = reverse('mark-orders-delivered')
+        payload = {'date': timezone.localdate(self.order.orderedAt).isoformat(), 'address_id': self.address.id}
+        self.client.post(url, payload, format='json', **self.auth_header)
+
+        row = self.rollup().get()
+        self.assertTrue(row.delivered)
+        self.assertEqual(row.cost, 10)
+
+    def test_sales_summary_reads_rollup(self):
+        url = reverse('item-sales-summary')
+        response = self.client.get(url, {'year': timezone.localdate(self.order.orderedAt).year}, **self.auth_header)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data), [{'item_name': 'item 2', 'total_quantity': 5, 'total_sales': 25.0}])
+
+    def test_item_price_change_reprices_the_rollup(self):
+        self.item2.price, self.item2.buyPrice = 7, 3
+        self.item2.save()
+
+        url = reverse('item-sales-summary')
+        response = self.client.get(url, {'year': timezone.localdate(self.order.orderedAt).year}, **self.auth_header)
+        self.assertEqual(list(response.data), [{'item_name': 'item 2', 'total_quantity': 5, 'total_sales': 35.0}])
+        self.assertEqual(self.rollup().get().cost, 15)
+
+        expected = list(DailySales.objects.values('date', 'item', 'quantity', 'gross', 'cost'))
+        rebuild_daily_sales()
+        self.assertEqual(list(DailySales.objects.values('date', 'item', 'quantity', 'gross', 'cost')), expected)
+
+    def test_rebuild_matches_incremental(self):
+        expected = list(DailySales.objects.values('date', 'item', 'address', 'isActive', 'delivered', 'quantity', 'gross'))
+        rebuild_daily_sales()
+        actual = list(DailySales.objects.values('date', 'item', 'address', 'isActive', 'delivered', 'quantity', 'gross'))
+        self.assertEqual(actual, expected)
+
+    def test_rebuild_buckets_by_local_day(self):
+        # 23:30 UTC is already the next day in Beirut
+        late = timezone.make_aware(datetime(2025, 3, 9, 23, 30), dt_timezone.utc)
+        Order.objects.filter(pk=self.order.pk).update(orderedAt=late)
+        Order.objects.create(
+            customer=self.customer, user=self.admin_user, item=self.item2, quantity=2,
+            address=self.address, liraRate=89500, driver=self.driver,
+        )
+        Order.objects.filter(quantity=2).update(orderedAt=late + timedelta(days=3))
+
+        rebuild_daily_sales()
+        self.assertEqual(
+            list(self.rollup().order_by('date').values_list('date', 'quantity')),
+            [(date(2025, 3, 10), 5), (date(2025, 3, 13), 2)],
+        )
+
+
+class GenerateReceiptTests(BaseTestCase):
+    def receipt_url(self):
+        date_str = timezone.localdate(self.order.orderedAt).isoformat()
+        return reverse('generate_receipt', args=[self.address.id, date_str, self.driver.id])
+
+    def test_unchanged_orders_reuse_receipt(self):
+        first = self.client.get(self.receipt_url(), **self.auth_header)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        second = self.client.get(self.receipt_url(), **self.auth_header)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['receipt_id'], first.data['receipt_id'])
+        self.assertEqual(second.data['file_url'], first.data['file_url'])
+
+        receipt = Receipt.objects.get(id=first.data['receipt_id'])
+        self.assertEqual(list(receipt.orders.all()), [self.order])
+
+    def test_edited_order_invalidates_receipt(self):
+        first = self.client.get(self.receipt_url(), **self.auth_header)
+
+        self.order.quantity = 2
+        self.order.save()
+        self.assertFalse(Receipt.objects.filter(id=first.data['receipt_id']).exists())
+
+        second = self.client.get(self.receipt_url(), **self.auth_header)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(second.data['receipt_id'], first.data['receipt_id'])
+
+    def test_receipt_file_is_kept_when_the_edit_rolls_back(self):
+        first = self.client.get(self.receipt_url(), **self.auth_header)
+        receipt = Receipt.objects.get(id=first.data['receipt_id'])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    self.order.quantity = 2
+                    self.order.save()
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertTrue(Receipt.objects.filter(id=receipt.id).exists())
+        self.assertTrue(receipt.file.storage.exists(receipt.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+        self.assertFalse(receipt.file.storage.exists(receipt.file.name))
+
+
+@skipUnless('replica' in settings.DATABASES, "needs a 'replica' database alias")
+class ReplicaRoutingTests(APITransactionTestCase):
+    # The replica mirrors the test database over its own connection, so rows
+    # are committed for it to see and tests check which alias is queried
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+    read_replica = True
+
+    def setUp(self):
+        BaseTestCase.setUp(self)
+        DailySales.objects.create(
+            date=date(2020, 1, 1), item_id=self.item.id, address_id=self.address.id,
+            tva=False, isActive=True, delivered=True, quantity=7, gross=35, cost=14, discount=0
+        )
+        self.url = reverse('item-sales-summary')
+
+    def report_queries(self):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(self.url, {'year': 2020}, **self.auth_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['total_quantity'] for row in response.data], [7])
+        return len(replica)
+
+    def test_reports_read_from_the_replica(self):
+        self.assertGreater(self.report_queries(), 0)
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        data = {
+            "customer": self.customer.id,
+            "item": self.item.id,
+            "quantity": 1,
+            "address": self.address.id,
+            "liraRate": 89000,
+            "driver": self.driver.id
+        }
+        response = self.client.post(reverse('add-order'), data, format='json', **self.auth_header)
+        self.assertIn('pin_primary', response.cookies)
+
+        self.assertEqual(self.report_queries(), 0)
+
+
+class SampleDataTests(BaseTestCase):
+    def test_orders_need_staff_and_drivers(self):
+        with self.assertRaisesMessage(CommandError, '--drivers must be at least 1'):
+            call_command('generate_sample_data', customers=1, orders=1, drivers=0, force=True, stdout=StringIO())
+
+    def test_generated_data_is_consistent_and_benchmarkable(self):
+        call_command(
+            'generate_sample_data', customers=30, orders=300, years=2, drivers=3, staff=2,
+            chunk_size=50, force=True, stdout=StringIO()
+        )
+
+        generated = Customer.objects.exclude(pk=self.customer.pk)
+        self.assertEqual(generated.count(), 30)
+        self.assertGreaterEqual(Address.objects.filter(customer__in=generated).count(), 30)
+        for customer in generated:
+            self.assertTrue(
+                customer.residenceZgharta or customer.residenceEhden or customer.residenceTripoli or customer.residenceKoura
+            )
+        for phone in PhoneNumber.objects.all():
+            self.assertRegex(phone.mobile, r'^\+961\d{7,8}$')
+            self.assertEqual(phone.mobileDigits, phone.mobile[1:])
+        self.assertTrue(CustomerSearchToken.objects.filter(customer__in=generated).exists())
+
+        orders = Order.objects.exclude(pk=self.order.pk)
+        self.assertEqual(orders.count(), 300)
+        # Dates are spread over the period instead of all being "now"
+        self.assertLess(orders.order_by('orderedAt').first().orderedAt, timezone.now() - timedelta(days=300))
+        self.assertEqual(
+            sum(DailySales.objects.values_list('quantity', flat=True)),
+            sum(Order.objects.values_list('quantity', flat=True)),
+        )
+
+        out = StringIO()
+        call_command('benchmark_endpoints', requests=3, warmup=0, stdout=out)
+        lines = {line.split()[0]: line.split() for line in out.getvalue().splitlines()[1:]}
+        self.assertIn('orders-day', lines)
+        self.assertIn('customers-by-phone', lines)
+        for name, columns in lines.items():
+            # Every request succeeded and reported its query count
+            self.assertEqual(columns[1:3], ['3', '0'], name)
+            self.assertNotEqual(columns[-1], '-', name)
+
+
+class TrafficReplayTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.capture = os.path.join(self.directory.name, 'traffic.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super().tearDown()
+
+    def record_traffic(self):
+        with override_settings(TRAFFIC_CAPTURE=True, TRAFFIC_CAPTURE_LOG=self.capture):
+            # Middleware is loaded on a client's first request
+            self.client = self.client_class()
+            self.client.post(reverse('login'), {'username': 'admin', 'password': 'adminpass'}, format='json')
+            self.client.get(reverse('exchange-rate'), **self.auth_header)
+            self.client.get(reverse('item-sales-summary'), {'year': 2024, 'token': 'abc'}, **self.auth_header)
+            self.client.post(
+                '/graphql/',
+                data={
+                    'query': 'query Orders($startDate: Date!, $keyset: Boolean) '
+                             '{ paginatedOrders(startDate: $startDate, keyset: $keyset) { orders { id } } }',
+                    'variables': {'startDate': timezone.localdate().isoformat(), 'keyset': True},
+                },
+                content_type='application/json', **self.auth_header
+            )
+            self.client.put(reverse('exchange-rate'), {'rate': 95000}, format='json', **self.auth_header)
+        with open(self.capture) as lines:
+            return [json.loads(line) for line in lines]
+
+    def test_capture_is_sanitized(self):
+        records = self.record_traffic()
+        captured = json.dumps(records)
+        self.assertNotIn('adminpass', captured)
+        self.assertNotIn(self.token, captured)
+        self.assertNotIn('abc', captured)
+
+        login, rate, sales, orders, edit = records
+        self.assertEqual(login['body']['password'], '[REDACTED]')
+        self.assertFalse(login['replayable'])
+        self.assertEqual(rate['endpoint'], 'GET api/exchange-rate/')
+        self.assertEqual(rate['status'], 200)
+        self.assertFalse(sales['replayable'])
+        self.assertEqual(orders['endpoint'], 'POST graphql query Orders')
+        self.assertEqual(orders['graphql']['variables']['keyset'], True)
+        self.assertGreater(orders['queries'], 0)
+        self.assertTrue(edit['replayable'])
+        self.assertEqual(edit['body'], {'rate': 95000})
+
+    def test_replay_and_compare(self):
+        self.record_traffic()
+        baseline = os.path.join(self.directory.name, 'baseline.jsonl')
+        candidate = os.path.join(self.directory.name, 'candidate.jsonl')
+
+        out = StringIO()
+        call_command('replay_traffic', self.capture, speedup=0, output=baseline, stdout=out)
+        # Only the reads that kept all their values are replayed
+        self.assertIn('Replaying 2 requests, skipping 3', out.getvalue())
+        with open(baseline) as lines:
+            results = [json.loads(line) for line in lines]
+        self.assertEqual([result['status'] for result in results], [200, 200])
+
+        set_rate(90000)
+        call_command('replay_traffic', self.capture, speedup=0, include_writes=True, output=candidate, stdout=StringIO())
+        self.assertEqual(current_rate(), 95000)
+
+        out = StringIO()
+        call_command('replay_traffic', compare=[baseline, candidate], stdout=out)
+        report = out.getvalue()
+        self.assertIn('POST graphql query Orders', report)
+        self.assertIn('PUT api/exchange-rate/', report)
+        self.assertIn(' -> ', report)
+
+
+
+class DeleteReceiptsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(USE_GCS=False, MEDIA_ROOT=self.directory.name)
+        self.settings_override.enable()
+        self.old = self.make_receipt('receipts/old.pdf', days=40)
+        self.new = self.make_receipt('receipts/new.pdf', days=1)
+        # A receipt whose file is already gone, and a file left without a receipt
+        self.missing = Receipt.objects.create(file='receipts/missing.pdf')
+        self.write_file('receipts/stray.pdf', days=60)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.directory.cleanup()
+        super().tearDown()
+
+    def write_file(self, name, days):
+        path = os.path.join(self.directory.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'%PDF')
+        written = (timezone.now() - timedelta(days=days)).timestamp()
+        os.utime(path, (written, written))
+
+    def make_receipt(self, name, days):
+        self.write_file(name, days)
+        receipt = Receipt.objects.create(file=name)
+        receipt.orders.set([self.order])
+        return receipt
+
+    def remaining_files(self):
+        return sorted(os.listdir(os.path.join(self.directory.name, 'receipts')))
+
+    def test_deletes_old_files_and_their_receipts(self):
+        out = StringIO()
+        call_command('delete_receipts', older_than=30, stdout=out)
+
+        self.assertEqual(self.remaining_files(), ['new.pdf'])
+        self.assertEqual(set(Receipt.objects.all()), {self.new, self.missing})
+        self.assertFalse(Receipt.orders.through.objects.filter(receipt_id=self.old.id).exists())
+        self.assertIn('Deleted 2 files from receipts/', out.getvalue())
+        self.assertIn('Deleted 1 Receipt instances', out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('delete_receipts', dry_run=True, stdout=out)
+
+        self.assertEqual(self.remaining_files(), ['new.pdf', 'old.pdf', 'stray.pdf'])
+        self.assertEqual(Receipt.objects.count(), 3)
+        self.assertIn('Would delete 3 files', out.getvalue())
+        self.assertIn('Would delete 2 Receipt instances', out.getvalue())
+
+    def test_deletes_in_batches(self):
+        with patch('order.management.commands.delete_receipts.BATCH_SIZE', 1):
+            call_command('delete_receipts', workers=2, stdout=StringIO())
+
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, 'receipts')))
+        self.assertEqual(list(Receipt.objects.all()), [self.missing])
+
+    def test_keeps_receipts_whose_files_were_not_deleted(self):
+        delete = LocalStorage.delete
+
+        def refuse_old(storage, names):
+            # As a bucket answering 403 or 503 for that blob
+            return delete(storage, [name for name in names if not name.endswith('old.pdf')])
+
+        out = StringIO()
+        with patch.object(LocalStorage, 'delete', refuse_old):
+            call_command('delete_receipts', older_than=30, stdout=out)
+
+        self.assertEqual(self.remaining_files(), ['new.pdf', 'old.pdf'])
+        self.assertTrue(Receipt.objects.filter(pk=self.old.pk).exists())
+        self.assertIn('Deleted 1 files', out.getvalue())
+        self.assertIn('Deleted 0 Receipt instances', out.getvalue())
+        self.assertIn('Could not delete 1 files', out.getvalue())
@@ -1,17 +1,21 @@
 import io
 import os
+import json
+import hashlib
 
+from backend.db_router import read_alias
 from helpers.permissions import IsSuperUser
-from .models import Order, ExchangeRate, Receipt
-from item.models import Item
+from .models import Order, Receipt
+from item.stock import give_back_stock, record_movements
 from user.models import User
 from .serializers import OrderSerializer, ExchangeRateSerializer
+from .rollups import sales_summary, sales_key, refresh_daily_sales
+from .rates import current_rate, set_rate, rate_at
 from rest_framework.permissions import IsAdminUser
-from django.db.models.functions import Round
 from helpers.views import BaseView
 from customer.models import Address
 from urllib.parse import urlparse, urlunparse
-from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.timezone import now
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -20,12 +24,11 @@ from rest_framework import status
 from django.core.files.base import ContentFile
 from rest_framework.permissions import AllowAny
 from django.utils import timezone
-from django.shortcuts import get_object_or_404
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
-from django.db.models import F, Sum, ExpressionWrapper, FloatField
+from django.db import transaction, IntegrityError
 import arabic_reshaper
 from bidi.algorithm import get_display
 from datetime import datetime, timedelta, timezone as dt_timezone
@@ -39,6 +42,7 @@ class OrderDetailView(BaseView):
     Serializer = OrderSerializer
     Model = Order
 
+    @transaction.atomic
     def delete(self, request, pk):
         if not request.user.is_active:
              return Response({"message": "Access Denied"}, status=status.HTTP_401_UNAUTHORIZED)
@@ -49,32 +53,41 @@ class OrderDetailView(BaseView):
             return Response({"message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
         order.isActive = False
 
-        item = get_object_or_404(Item, pk=order.item.id)
-
-        item.stockQuantity += order.quantity
-        item.save()
+        record_movements([give_back_stock(order.item, order.quantity, order=order)])
         order.save()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
               
 class ExchangeRateView(APIView):
     permission_classes = [IsAdminUser]
-    def get_exchange_instance(self):
-        # Always return the singleton instance, or create if not exists
-        exchange, _ = ExchangeRate.objects.get_or_create()
-        return exchange
 
     def get(self, request):
-        exchange = self.get_exchange_instance()
-        serializer = ExchangeRateSerializer(exchange)
-        return Response(serializer.data)
+        at = request.query_params.get('at')
+        if at:
+            # The rate that was in effect at a past date or datetime
+            try:
+                when = parse_datetime(at)
+                day = None if when else parse_date(at)
+            except ValueError:
+                when = day = None
+            if day:
+                # A bare date means the rate the day closed with
+                when = datetime.combine(day, datetime.max.time())
+            if not when:
+                return Response({"error": "Invalid date format."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(when):
+                when = timezone.make_aware(when)
+            return Response({"rate": rate_at(when), "at": when.isoformat()})
+
+        # current_rate() stores the default rate on first use, so there is always a row behind this
+        return Response({"rate": current_rate()})
 
     def put(self, request):
-        exchange = self.get_exchange_instance()
-        serializer = ExchangeRateSerializer(exchange, data=request.data, partial=True)
+        serializer = ExchangeRateSerializer(data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            rate = serializer.validated_data.get('rate', current_rate())
+            exchange = set_rate(rate)
+            return Response(ExchangeRateSerializer(exchange).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class MarkOrdersDeliveredAPIView(APIView):
@@ -97,16 +110,20 @@ class MarkOrdersDeliveredAPIView(APIView):
             utc_start = local_start.astimezone(dt_timezone.utc)
             utc_end = local_end.astimezone(dt_timezone.utc)
 
-            updated_count = (
-                Order.objects.filter(
-                    orderedAt__gte=utc_start,
-                    orderedAt__lt=utc_end,
-                    address_id=address_id,
-                    status='P'
-                )
-                .update(status='D', deliveredAt=timezone.now())
+            pending = Order.objects.filter(
+                orderedAt__gte=utc_start,
+                orderedAt__lt=utc_end,
+                address_id=address_id,
+                status='P'
             )
 
+            # update() skips the order signals, so refresh the rollups explicitly
+            with transaction.atomic():
+                keys = [sales_key(order) for order in pending.only('orderedAt', 'item', 'address')]
+                now = timezone.now()
+                updated_count = pending.update(status='D', deliveredAt=now, updatedAt=now)
+                refresh_daily_sales(keys)
+
             print(Order.objects.filter(address_id=address_id).count())
 
             return Response(
@@ -142,14 +159,31 @@ class GenerateReceiptAPIView(APIView):
             isActive=True
         )
 
-        if not orders.exists():
+        order_rows = list(
+            orders.order_by('id').values_list('id', 'quantity', 'discount', 'liraRate', 'item__name', 'item__price')
+        )
+        if not order_rows:
             return Response({"error": "No orders found for the given address and date."}, status=status.HTTP_404_NOT_FOUND)
 
-        receipt = Receipt.objects.create()
-        pdf_file = self.create_thermal_pdf(request, orders, address_id, driver_id, local_date)
-        filename = f"receipt_{address_id}_{local_date.strftime('%Y%m%d')}.pdf"
-        receipt.file.save(filename, ContentFile(pdf_file), save=False)
-        receipt.save()
+        # Same content as an earlier receipt: hand back its file without rendering or uploading
+        fingerprint = self.receipt_fingerprint(request, order_rows, address_id, driver_id, local_date)
+        receipt = Receipt.objects.filter(fingerprint=fingerprint).first()
+        created = receipt is None
+
+        if created:
+            pdf_file = self.create_thermal_pdf(request, orders, address_id, driver_id, local_date)
+            filename = f"receipt_{address_id}_{local_date.strftime('%Y%m%d')}.pdf"
+            receipt = Receipt(fingerprint=fingerprint)
+            receipt.file.save(filename, ContentFile(pdf_file), save=False)
+            try:
+                with transaction.atomic():
+                    receipt.save()
+                    receipt.orders.set([row[0] for row in order_rows])
+            except IntegrityError:
+                # A concurrent request stored the same receipt first
+                receipt.file.delete(save=False)
+                receipt = Receipt.objects.get(fingerprint=fingerprint)
+                created = False
 
         # Build the absolute URL
         absolute_url = request.build_absolute_uri(receipt.file.url)
@@ -159,10 +193,31 @@ class GenerateReceiptAPIView(APIView):
         clean_url = urlunparse(parsed._replace(query="", fragment=""))
 
         return Response({
-            "message": "Receipt generated successfully.",
+            "message": "Receipt generated successfully." if created else "Receipt already up to date.",
             "receipt_id": receipt.id,
             "file_url": clean_url
-        }, status=status.HTTP_201_CREATED)
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def receipt_fingerprint(self, request, order_rows, address_id, driver_id, date):
+        """
+        Hash of everything printed on the receipt: the orders as they are now,
+        the customer, the driver, the agent and the date.
+        """
+        customer = Address.objects.filter(id=address_id).values_list(
+            'customer__firstName', 'customer__middleName', 'customer__lastName'
+        ).first()
+        driver = User.objects.filter(id=driver_id).values_list('first_name', 'last_name').first()
+
+        content = json.dumps([
+            address_id,
+            driver_id,
+            date.isoformat(),
+            [request.user.id, request.user.first_name, request.user.last_name],
+            customer,
+            driver,
+            order_rows,
+        ], default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
 
     def prepare_arabic(self, text):
         reshaped_text = arabic_reshaper.reshape(text)
@@ -300,29 +355,12 @@ class ItemSalesSummaryView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Compute the summary
-        orders = Order.objects.filter(orderedAt__year=year)
+        # Compute the summary from the daily rollups
+        tva_flag = None
         if tva is not None:
             tva_flag = tva == "true"  # or bool conversion if needed
-            orders = orders.filter(item__tva=tva_flag)
-
-        summary = (
-            orders
-            .values(item_name=F('item__name'))
-            .annotate(
-                total_quantity=Sum('quantity'),
-                total_sales=Round(
-                    Sum(
-                        ExpressionWrapper(
-                            F('quantity') * F('item__price'),
-                            output_field=FloatField()
-                        )
-                    ),
-                    precision=2  # round to 2 decimal places
-                )
-            )
-            .order_by('item_name')
-        )
+
+        summary = sales_summary(year, tva_flag, using=read_alias())
 
         return Response(summary, status=status.HTTP_200_OK)
 
@@ -341,28 +379,11 @@ class ExportItemSalesSummaryPDFView(APIView):
         except ValueError:
             return Response({"error": "Year must be a valid number"}, status=status.HTTP_400_BAD_REQUEST)
 
-        orders = Order.objects.filter(orderedAt__year=year)
+        tva_flag = None
         if tva is not None:
             tva_flag = tva == "true"
-            orders = orders.filter(item__tva=tva_flag)
-
-        summary = (
-            orders
-            .values(item_name=F('item__name'))
-            .annotate(
-                total_quantity=Sum('quantity'),
-                total_sales=Round(
-                    Sum(
-                        ExpressionWrapper(
-                            F('quantity') * F('item__price'),
-                            output_field=FloatField()
-                        )
-                    ),
-                    precision=2  # round to 2 decimal places
-                )
-            )
-            .order_by('item_name')
-        )
+
+        summary = sales_summary(year, tva_flag, using=read_alias())
 
         if not summary:
             return Response({"error": "No data found for the given year and TVA status."}, status=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,53 @@
+import copy
+import time
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from helpers.cache import shared_version, bump_version
+
+TOKEN_VERSION_CLAIM = 'ver'
+# How long a worker may serve a user without checking the database
+TTL = 60
+
+# user id -> (version stamp, loaded at, user) of this process
+_users = {}
+
+
+def version_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def invalidate_user(user_id):
+    """Drop a user from every worker's cache, e.g. after an admin edited them."""
+    _users.pop(str(user_id), None)
+    bump_version(version_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps authenticated users in a short-lived
+    per-worker cache, so most requests skip the user query.
+
+    A cached user is served while it is younger than TTL and its shared
+    version stamp is unchanged. Tokens carry the user's token_version, and a
+    token with an older version is rejected once the database confirms it.
+    """
+
+    def get_user(self, validated_token):
+        user_id = str(validated_token.get(api_settings.USER_ID_CLAIM))
+        token_version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+
+        cached = _users.get(user_id)
+        if cached and time.monotonic() - cached[1] < TTL and cached[0] == shared_version(version_key(user_id)):
+            user = cached[2]
+            if user.token_version == token_version:
+                # A copy, so a request changing its user cannot touch the cache
+                return copy.copy(user)
+
+        version = shared_version(version_key(user_id))
+        user = super().get_user(validated_token)
+        if user.token_version != token_version:
+            raise AuthenticationFailed("Token has been revoked.", code="token_revoked")
+
+        _users[user_id] = (version, time.monotonic(), user)
+        return copy.copy(user)
@@ -0,0 +1,41 @@
+import re
+from django.db.models import Q, Case, When, Value, IntegerField
+from helpers.phone import normalize_phone
+from .models import User
+
+# Anything else cannot be a phone number, so it is not looked up as one
+PHONE_LIKE = re.compile(r'^[+\d][\d\s()./-]*$')
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def resolve_login_user(identifier):
+    """
+    Find the user a login identifier refers to in one query over indexed
+    columns. When several users match, an email match wins over a phone
+    match, which wins over a username match, then the oldest account.
+    """
+    identifier = (identifier or '').strip()
+    if not identifier:
+        return None
+
+    email = normalize_email(identifier) if '@' in identifier else ''
+    phone = normalize_phone(identifier) if PHONE_LIKE.match(identifier) else ''
+
+    matches = Q(username=identifier)
+    precedence = []
+    if email:
+        matches |= Q(email_normalized=email)
+        precedence.append(When(email_normalized=email, then=Value(0)))
+    if phone:
+        matches |= Q(phone_digits=phone)
+        precedence.append(When(phone_digits=phone, then=Value(1)))
+
+    users = User.objects.filter(matches)
+    if precedence:
+        users = users.annotate(
+            precedence=Case(*precedence, default=Value(2), output_field=IntegerField())
+        ).order_by('precedence', 'id')
+    return users.first()
@@ -0,0 +1,64 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from user.login import resolve_login_user
+from user.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Times login identifier resolution as the user table grows. "
+        "The generated users are rolled back at the end"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,50000', help='Comma separated user counts to measure at')
+        parser.add_argument('--lookups', type=int, default=200, help='Lookups timed per size and identifier kind')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        try:
+            with transaction.atomic():
+                self.run(sizes, options['lookups'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, sizes, lookups):
+        created = 0
+        for size in sizes:
+            # bulk_create skips pre_save, so the lookup keys are set here
+            users = [
+                User(
+                    username=f'bench{n}',
+                    email=f'bench{n}@example.com', email_normalized=f'bench{n}@example.com',
+                    phone_number=f'+9617{n:07d}', phone_digits=f'9617{n:07d}',
+                    password='!',
+                )
+                for n in range(created, size)
+            ]
+            User.objects.bulk_create(users, batch_size=2000)
+            created = size
+
+            for kind, identifier in [
+                ('email', f'BENCH{size // 2}@example.com'),
+                ('phone', f'07{size // 2:07d}'),
+                ('username', f'bench{size // 2}'),
+                ('unknown', 'nobody'),
+            ]:
+                timings = []
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(lookups):
+                        start = time.perf_counter()
+                        resolve_login_user(identifier)
+                        timings.append((time.perf_counter() - start) * 1000)
+                self.stdout.write(
+                    f"{size:>8} users  {kind:<8}  median {statistics.median(timings):.3f} ms  "
+                    f"max {max(timings):.3f} ms  {len(queries) / lookups:.0f} query/lookup"
+                )
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from helpers.search import build_tokens
+
+SEARCH_FIELDS = ('username', 'first_name', 'middle_name', 'last_name', 'email', 'phone_number')
+
+
+def backfill_tokens(apps, schema_editor):
+    db = schema_editor.connection.alias
+    User = apps.get_model('user', 'User')
+    UserSearchToken = apps.get_model('user', 'UserSearchToken')
+
+    tokens = []
+    for user in User.objects.using(db).only('id', *SEARCH_FIELDS).iterator(chunk_size=2000):
+        tokens += build_tokens(UserSearchToken, 'user', user, {
+            field: getattr(user, field) for field in SEARCH_FIELDS
+        })
+    UserSearchToken.objects.using(db).bulk_create(tokens, batch_size=10000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0014_alter_user_region'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('token', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['field', 'token', 'user'], name='user_userse_field_23a08f_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:38
+
+from django.db import migrations, models
+from helpers.phone import normalize_phone
+from user.login import normalize_email
+
+
+def backfill_lookup_keys(apps, schema_editor):
+    db = schema_editor.connection.alias
+    User = apps.get_model('user', 'User')
+    users = list(User.objects.using(db).only('id', 'email', 'phone_number'))
+    for user in users:
+        user.email_normalized = normalize_email(user.email)
+        user.phone_digits = normalize_phone(user.phone_number)
+    User.objects.using(db).bulk_update(users, ['email_normalized', 'phone_digits'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0015_search_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_normalized',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_lookup_keys, migrations.RunPython.noop),
+    ]
@@ -19,4 +19,22 @@ class User(AbstractUser):
     )
 
     is_driver = models.BooleanField(default=False, db_index=True)
-    region = models.CharField(max_length=100, null=False, blank=True, default='')
\ No newline at end of file
+    region = models.CharField(max_length=100, null=False, blank=True, default='')
+
+    # Login lookup keys, filled in by user.signals
+    email_normalized = models.CharField(max_length=254, blank=True, default='', editable=False, db_index=True)
+    phone_digits = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
+
+    # Carried by issued tokens; bumping it revokes them, see user.authentication
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+
+class UserSearchToken(models.Model):
+    """Trigram index over employee names and contact details, kept in sync by user.signals."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_tokens')
+    field = models.CharField(max_length=20)
+    token = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['field', 'token', 'user']),
+        ]
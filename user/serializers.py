@@ -1,30 +1,27 @@
 from rest_framework import serializers
 from .models import User
+from .login import resolve_login_user
+from .authentication import TOKEN_VERSION_CLAIM
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
     def validate(self, attrs):
         identifier = attrs.get("username")
         password = attrs.get("password")
 
-        user = None
-
-        # Try to find user by email or phone number
-        try:
-            user = User.objects.get(email=identifier)
-        except User.DoesNotExist:
-            try:
-                user = User.objects.get(phone_number=identifier)
-            except User.DoesNotExist:
-                try:
-                    user = User.objects.get(username=identifier)
-                except User.DoesNotExist:
-                    pass
+        # Email, phone number or username, in one query
+        user = resolve_login_user(identifier)
 
         if user and user.check_password(password):
             if not user.is_active:
                 raise serializers.ValidationError("User account is disabled.")
-            data = super().get_token(user)
+            data = self.get_token(user)
             return {
                 "refresh": str(data),
                 "access": str(data.access_token),
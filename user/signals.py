@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+from helpers.phone import normalize_phone
+from helpers.search import index_tokens
+from .authentication import invalidate_user
+from .login import normalize_email
+from .models import User, UserSearchToken
+
+SEARCH_FIELDS = ('username', 'first_name', 'middle_name', 'last_name', 'email', 'phone_number')
+# Changing any of these revokes the user's tokens
+ACCESS_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+
+def search_fields(user):
+    return {field: getattr(user, field) for field in SEARCH_FIELDS}
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Logins only touch last_login, which is not searchable
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    index_tokens(UserSearchToken, 'user', instance, search_fields(instance))
+
+
+@receiver(pre_save, sender=User)
+def normalize_login_keys(sender, instance, **kwargs):
+    instance.email_normalized = normalize_email(instance.email)
+    instance.phone_digits = normalize_phone(instance.phone_number)
+
+
+@receiver(pre_save, sender=User)
+def remember_access_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._access_changed = False
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not set(update_fields) & set(ACCESS_FIELDS):
+        return
+    previous = User.objects.filter(pk=instance.pk).values(*ACCESS_FIELDS).first()
+    instance._access_changed = bool(previous) and any(
+        previous[field] != getattr(instance, field) for field in ACCESS_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def uncache_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if getattr(instance, '_access_changed', False):
+        User.objects.filter(pk=instance.pk).update(token_version=F('token_version') + 1)
+        instance.refresh_from_db(fields=['token_version'])
+    # Logins only touch last_login, which the cached copy can do without
+    elif update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
@@ -1,6 +1,7 @@
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
+from .login import resolve_login_user
 from .models import User
 from helpers.tests import BaseTestCase
 
@@ -81,6 +82,55 @@ class UserTestCase(BaseTestCase):
         self.assertFalse(self.user.is_active)
 
 
+class AuthenticationCacheTestCase(BaseTestCase):
+    def login(self, username, password):
+        response = self.client.post(reverse('login'), {'username': username, 'password': password}, format='json')
+        return {'HTTP_AUTHORIZATION': f"Bearer {response.data['access']}"}
+
+    def test_authenticated_requests_skip_the_user_query(self):
+        url = reverse('user-detail')
+        self.client.get(url, **self.auth_header)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, **self.auth_header)
+        self.assertEqual(response.data['username'], 'admin')
+
+    def test_profile_edit_is_seen_by_the_next_request(self):
+        staff_header = self.login('staff', 'staff_password')
+        self.client.get(reverse('user-detail'), **staff_header)
+
+        data = {"username": "staff", "first_name": "Johnny"}
+        self.client.put(reverse('edit-user', args=[self.user.id]), data, format='json', **self.auth_header)
+
+        response = self.client.get(reverse('user-detail'), **staff_header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['first_name'], 'Johnny')
+
+    def test_access_change_revokes_tokens(self):
+        staff_header = self.login('staff', 'staff_password')
+        self.assertEqual(self.client.get(reverse('user-detail'), **staff_header).status_code, status.HTTP_200_OK)
+
+        data = {"username": "staff", "is_staff": False}
+        self.client.put(reverse('edit-user', args=[self.user.id]), data, format='json', **self.auth_header)
+
+        response = self.client.get(reverse('user-detail'), **staff_header)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # A fresh login carries the new version
+        response = self.client.get(reverse('user-detail'), **self.login('staff', 'staff_password'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['is_staff'])
+
+    def test_soft_delete_locks_the_user_out(self):
+        staff_header = self.login('staff', 'staff_password')
+        self.client.get(reverse('user-detail'), **staff_header)
+
+        self.client.delete(reverse('edit-user', args=[self.user.id]), **self.auth_header)
+
+        response = self.client.get(reverse('user-detail'), **staff_header)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
 class LoginTestCase(APITestCase):
     def setUp(self):
         # Create an admin user
@@ -121,4 +171,26 @@ class LoginTestCase(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('access', response.data)
-        self.assertIn('refresh', response.data)
\ No newline at end of file
+        self.assertIn('refresh', response.data)
+
+    def test_login_with_formatted_phone_and_email_case(self):
+        self.admin_user.phone_number = '+96170123456'
+        self.admin_user.save()
+
+        for identifier in ['070 123 456', 'Admin@Example.com ']:
+            response = self.client.post(
+                reverse('login'),
+                {'username': identifier, 'password': 'adminpass'},
+                format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK, identifier)
+
+    def test_identifier_resolves_in_one_query_with_precedence(self):
+        # Another account whose username is the admin's email
+        User.objects.create_user(username='admin@example.com', password='otherpass')
+
+        with self.assertNumQueries(1):
+            user = resolve_login_user('admin@example.com')
+        self.assertEqual(user, self.admin_user)
+        self.assertIsNone(resolve_login_user('nobody'))
+